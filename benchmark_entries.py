@@ -0,0 +1,92 @@
+"""
+列表记录内存基准：比较旧的字典记录与 ClipEntry 在一次刷新中的内存分配
+
+用法: python benchmark_entries.py [记录数] [每次刷新条数]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from clipboard_storage import ClipboardStorage
+
+
+def legacy_row_to_dict(row: tuple) -> dict:
+    """旧版本的列表记录：每行一个 8 键字典"""
+    return {
+        'id': row[0],
+        'content_type': row[1],
+        'timestamp': row[2],
+        'size': row[3],
+        'is_favorite': bool(row[4]),
+        'line_count': row[5] or 0,
+        'preview': row[6] or '',
+        'near_duplicates': row[7] or 0
+    }
+
+
+def legacy_full_dict(row: tuple, storage: ClipboardStorage) -> dict:
+    """最初版本的列表记录：字典中带解码后的元数据和完整正文"""
+    entry = legacy_row_to_dict(row[:8])
+    entry['metadata'] = json.loads(row[8]) if row[8] else {}
+    entry['content'] = storage._resolve_content(*row[9:])
+    return entry
+
+
+def measure(label: str, build):
+    """测量构建并持有一次刷新结果时的内存分配"""
+    tracemalloc.start()
+    items = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} {len(items):>6} 条  持有 {current / 1024:>9.1f} KB  峰值 {peak / 1024:>9.1f} KB  "
+          f"每条 {current / max(len(items), 1):>7.1f} B")
+    return current, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = ClipboardStorage(os.path.join(tmp_dir, 'bench.db'), {'max_entries': 0})
+        storage.import_entries([
+            (f"记录 {i}: " + "示例内容 sample content " * (i % 40 + 1), 'text', {'source': 'benchmark', 'index': i},
+             None, i % 10 == 0)
+            for i in range(count)
+        ])
+        storage.flush()
+        conn = storage._get_connection()
+
+        def fetch_list_rows():
+            return conn.execute(f'''
+                SELECT {storage._LIST_COLUMNS} FROM clipboard_history
+                WHERE collapsed = 0 ORDER BY timestamp DESC, id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+
+        def fetch_full_rows():
+            return conn.execute('''
+                SELECT id, content_type, timestamp, size, is_favorite, line_count, display, near_dups,
+                       metadata, content, blob_hash, content_z, zdict_version
+                FROM clipboard_history ORDER BY timestamp DESC, id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+
+        # 预热语句缓存和页缓存，避免首次查询的开销计入
+        storage.get_clipboard_history(limit)
+        fetch_full_rows()
+
+        print(f"数据库记录 {count} 条，每次刷新 {limit} 条")
+        full = measure("字典 + 元数据 + 正文", lambda: [legacy_full_dict(row, storage) for row in fetch_full_rows()])
+        before = measure("字典（轻量列）", lambda: [legacy_row_to_dict(row) for row in fetch_list_rows()])
+        after = measure("ClipEntry", lambda: storage.get_clipboard_history(limit))
+
+        for label, baseline in (("相对完整字典", full), ("相对轻量字典", before)):
+            print(f"{label}: 持有内存减少 {1 - after[0] / baseline[0]:.0%}，峰值减少 {1 - after[1] / baseline[1]:.0%}")
+
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Iterator, Optional
+
+
+class BlobStore:
+    """内容寻址的大文本存储，按哈希分片保存在磁盘目录中
+
+    每个对象以内容哈希命名，存放在 <root>/<前2位>/<3-4位>/<哈希> 下。
+    写入先落到同目录的临时文件并 fsync，再原子替换为正式文件，
+    进程中途退出也不会留下半个对象。
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    @staticmethod
+    def compute_hash(data: bytes) -> str:
+        """计算内容哈希（SHA-256 十六进制）"""
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, blob_hash: str) -> str:
+        """获取对象的分片存储路径"""
+        return os.path.join(self.root_dir, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def exists(self, blob_hash: str) -> bool:
+        """检查对象是否存在"""
+        return os.path.exists(self.path_for(blob_hash))
+
+    def put(self, data: bytes, blob_hash: Optional[str] = None) -> str:
+        """写入对象并返回其哈希，相同内容只保存一份"""
+        blob_hash = blob_hash or self.compute_hash(data)
+        path = self.path_for(blob_hash)
+        if os.path.exists(path):
+            return blob_hash
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        return blob_hash
+
+    def put_file(self, source_path: str, blob_hash: str) -> str:
+        """从另一个存储中的对象文件导入，优先建立硬链接（对象写入后不再修改），不支持时复制"""
+        path = self.path_for(blob_hash)
+        if os.path.exists(path):
+            return blob_hash
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        tmp_path = os.path.join(directory, f'.tmp-{os.getpid()}-{threading.get_ident()}-{blob_hash}')
+        try:
+            try:
+                os.link(source_path, tmp_path)
+            except OSError:
+                shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        return blob_hash
+
+    def get(self, blob_hash: str) -> bytes:
+        """读取对象内容，不存在时抛出 FileNotFoundError"""
+        with open(self.path_for(blob_hash), 'rb') as f:
+            return f.read()
+
+    def delete(self, blob_hash: str) -> bool:
+        """删除对象，返回是否确实删除了文件"""
+        try:
+            os.remove(self.path_for(blob_hash))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_hashes(self) -> Iterator[str]:
+        """遍历存储中的所有对象哈希（跳过未完成的临时文件）"""
+        if not os.path.isdir(self.root_dir):
+            return
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for filename in filenames:
+                if not filename.startswith('.tmp-'):
+                    yield filename
@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from clipboard_storage import format_timestamp, now_ms
+
+
+class ClipboardBackup:
+    """按代保存的在线备份，每代是备份目录下的一个子目录
+    
+    每代包含主库、归档分区、外部存储对象和清单文件 backup.json。先写入临时目录，
+    复制完成且每个数据库文件都通过 quick_check 后才改名为正式目录，
+    中途失败或校验不通过不会留下看似完整的备份。超出保留代数的旧备份按时间先后删除。
+    """
+    
+    MANIFEST = 'backup.json'
+    TMP_PREFIX = '.tmp-'
+    
+    # 界面和后台线程各自持有实例，同一进程内的备份和恢复依次进行
+    _lock = threading.Lock()
+    
+    def __init__(self, storage, backup_dir: str, keep: int = 5, pages_per_step: int = 256,
+                 step_pause_ms: int = 20):
+        self.storage = storage
+        self.backup_dir = backup_dir
+        self.keep = max(1, keep)
+        self.pages_per_step = max(1, pages_per_step)
+        self.step_pause_ms = max(0, step_pause_ms)
+        self._stem = os.path.splitext(os.path.basename(storage.db_path))[0]
+    
+    @classmethod
+    def from_config(cls, storage, config_manager) -> 'ClipboardBackup':
+        """按 ConfigManager 的 data_management 段创建"""
+        return cls(
+            storage,
+            config_manager.get_backup_dir(),
+            keep=config_manager.get('data_management.backup_keep', 5),
+            pages_per_step=config_manager.get('data_management.backup_pages_per_step', 256),
+            step_pause_ms=config_manager.get('data_management.backup_step_pause_ms', 20)
+        )
+    
+    def list_backups(self) -> List[Dict]:
+        """列出已完成的备份（读取各代的清单），按创建时间倒序"""
+        backups = []
+        if not os.path.isdir(self.backup_dir):
+            return backups
+        
+        for name in os.listdir(self.backup_dir):
+            path = os.path.join(self.backup_dir, name)
+            if name.startswith(self.TMP_PREFIX) or not name.startswith(self._stem + '-'):
+                continue
+            try:
+                with open(os.path.join(path, self.MANIFEST), 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            manifest['name'] = name
+            manifest['path'] = path
+            backups.append(manifest)
+        
+        backups.sort(key=lambda manifest: manifest.get('created_ms', 0), reverse=True)
+        return backups
+    
+    def is_due(self, interval_days: float) -> bool:
+        """距上次备份是否已超过 interval_days 天"""
+        backups = self.list_backups()
+        if not backups:
+            return True
+        return now_ms() - backups[0].get('created_ms', 0) >= interval_days * 86400000
+    
+    def create(self, progress_callback: Optional[Callable[[int, int], None]] = None) -> Optional[Dict]:
+        """创建一代新备份并校验，成功后删除超出保留代数的旧备份，返回新备份的清单
+        
+        progress_callback(已复制页数, 总页数) 在复制过程中调用，会在调用线程中执行。
+        已有备份或恢复在进行时直接返回 None。
+        """
+        if not self._lock.acquire(blocking=False):
+            print("已有备份或恢复正在进行")
+            return None
+        try:
+            return self._create(progress_callback)
+        finally:
+            self._lock.release()
+    
+    def _create(self, progress_callback: Optional[Callable[[int, int], None]]) -> Optional[Dict]:
+        created_ms = now_ms()
+        tmp_path = None
+        
+        try:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            name = self._unique_name(created_ms)
+            final_path = os.path.join(self.backup_dir, name)
+            tmp_path = os.path.join(self.backup_dir, self.TMP_PREFIX + name)
+            
+            started = time.monotonic()
+            manifest = self.storage.backup_database(tmp_path, self.pages_per_step, self.step_pause_ms,
+                                                    progress_callback)
+            
+            problems = self.verify(tmp_path, manifest)
+            if problems:
+                print(f"备份校验失败: {'；'.join(problems)}")
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                return None
+            
+            manifest.update({
+                'created_ms': created_ms,
+                'created_at': format_timestamp(created_ms),
+                'duration_ms': round((time.monotonic() - started) * 1000),
+                'size': self._directory_size(tmp_path)
+            })
+            with open(os.path.join(tmp_path, self.MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            
+            os.replace(tmp_path, final_path)
+            print(f"备份完成: {final_path}（{round(manifest['size'] / (1024 * 1024), 2)} MB，"
+                  f"耗时 {manifest['duration_ms']} ms）")
+            
+            self.rotate()
+            manifest['name'] = name
+            manifest['path'] = final_path
+            return manifest
+        
+        except Exception as e:
+            print(f"备份失败: {e}")
+            if tmp_path is not None:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            return None
+    
+    def _unique_name(self, created_ms: int) -> str:
+        """按创建时间（精确到秒）命名，同一秒内已有同名备份或临时目录时追加序号"""
+        name = f"{self._stem}-{datetime.fromtimestamp(created_ms / 1000).strftime('%Y%m%d-%H%M%S')}"
+        candidate, suffix = name, 1
+        while (os.path.exists(os.path.join(self.backup_dir, candidate))
+               or os.path.exists(os.path.join(self.backup_dir, self.TMP_PREFIX + candidate))):
+            candidate = f"{name}-{suffix}"
+            suffix += 1
+        return candidate
+    
+    def verify(self, path: str, manifest: Optional[Dict] = None) -> List[str]:
+        """对备份中的每个数据库文件执行 PRAGMA quick_check，返回发现的问题（为空表示通过）"""
+        if manifest is None:
+            with open(os.path.join(path, self.MANIFEST), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        
+        files = [manifest['database']] + [os.path.join('partitions', name) for name in manifest.get('partitions', [])]
+        problems = []
+        for file_name in files:
+            file_path = os.path.join(path, file_name)
+            if not os.path.exists(file_path):
+                problems.append(f"{file_name}: 文件不存在")
+                continue
+            # 以只读方式打开，校验不会改动备份文件
+            conn = sqlite3.connect(Path(file_path).resolve().as_uri() + '?mode=ro', uri=True)
+            try:
+                rows = [row[0] for row in conn.execute('PRAGMA quick_check')]
+            except sqlite3.DatabaseError as e:
+                rows = [str(e)]
+            finally:
+                conn.close()
+            if rows != ['ok']:
+                problems.append(f"{file_name}: {'; '.join(rows[:3])}")
+        return problems
+    
+    def rotate(self) -> int:
+        """删除超出保留代数的旧备份和中断留下的临时目录，返回删除的备份数"""
+        removed = 0
+        for manifest in self.list_backups()[self.keep:]:
+            try:
+                shutil.rmtree(manifest['path'])
+                removed += 1
+                print(f"删除旧备份: {manifest['name']}")
+            except OSError as e:
+                print(f"删除旧备份失败: {e}")
+        
+        for name in os.listdir(self.backup_dir) if os.path.isdir(self.backup_dir) else ():
+            if name.startswith(self.TMP_PREFIX + self._stem + '-'):
+                shutil.rmtree(os.path.join(self.backup_dir, name), ignore_errors=True)
+        
+        return removed
+    
+    def restore(self, name: Optional[str] = None) -> bool:
+        """从指定备份（默认最新一代）恢复，恢复前重新校验备份文件"""
+        backups = self.list_backups()
+        if name is not None:
+            backups = [manifest for manifest in backups if manifest['name'] == name]
+        if not backups:
+            print(f"没有可用的备份: {name or self.backup_dir}")
+            return False
+        
+        manifest = backups[0]
+        with self._lock:
+            problems = self.verify(manifest['path'], manifest)
+            if problems:
+                print(f"备份已损坏，无法恢复: {'；'.join(problems)}")
+                return False
+            
+            return self.storage.restore_database(manifest['path'], manifest)
+    
+    @staticmethod
+    def _directory_size(path: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+        return total
@@ -0,0 +1,177 @@
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+from typing import Callable, Optional
+
+from clipboard_storage import format_timestamp
+
+
+class ClipboardExporter:
+    """流式导出剪贴板历史，逐条写入文件，不在内存中汇总全部记录
+    
+    支持 JSON 数组、NDJSON（每行一条 JSON）和 CSV 三种格式，可选 gzip 压缩。
+    先写入同目录下的临时文件，完成后再替换为目标文件，中途失败不会留下残缺的导出。
+    """
+    
+    FORMATS = ('json', 'ndjson', 'csv')
+    # JSON / NDJSON 中每条记录的字段及顺序
+    FIELDS = ('id', 'content_type', 'timestamp', 'size', 'is_favorite', 'metadata', 'content')
+    CSV_FIELDS = ('id', 'timestamp', 'content_type', 'size', 'is_favorite', 'metadata', 'content')
+    
+    # 每写入多少条记录报告一次进度
+    PROGRESS_INTERVAL = 200
+    # 超大正文分块写出时每块的字符数
+    CHUNK_CHARS = 65536
+    
+    def __init__(self, storage):
+        self.storage = storage
+    
+    @classmethod
+    def detect_format(cls, output_file: str, default: str = 'json') -> str:
+        """根据文件扩展名推断导出格式（忽略 .gz 后缀）"""
+        name = output_file.lower()
+        if name.endswith('.gz'):
+            name = name[:-3]
+        extension = os.path.splitext(name)[1].lstrip('.')
+        if extension == 'jsonl':
+            return 'ndjson'
+        return extension if extension in cls.FORMATS else default
+    
+    def export(self, output_file: str, format: str = 'json', compress: Optional[bool] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None,
+               favorites_only: bool = False,
+               progress_callback: Optional[Callable[[int, int], None]] = None) -> int:
+        """导出符合条件的记录，返回导出的条数
+        
+        compress 为 None 时按文件名是否以 .gz 结尾决定是否压缩。
+        start / end 限定时间范围（包含 start，不包含 end），favorites_only 只导出收藏。
+        progress_callback(已导出条数, 总条数) 在导出过程中周期性调用，
+        会在导出线程中执行。
+        """
+        format = format.lower()
+        if format not in self.FORMATS:
+            raise ValueError(f"不支持的导出格式: {format}")
+        if compress is None:
+            compress = output_file.lower().endswith('.gz')
+        
+        total = self.storage.count_entries(start, end, favorites_only)
+        entries = self.storage.iter_entries(start, end, favorites_only)
+        
+        directory = os.path.dirname(os.path.abspath(output_file))
+        tmp_path = os.path.join(directory, f".{os.path.basename(output_file)}.part")
+        try:
+            with self._open(tmp_path, compress) as f:
+                write_entries = getattr(self, f'_write_{format}')
+                count = write_entries(f, entries, total, progress_callback)
+            os.replace(tmp_path, output_file)
+        except BaseException:
+            entries.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        if progress_callback:
+            progress_callback(count, total)
+        return count
+    
+    @staticmethod
+    def _open(path: str, compress: bool):
+        """以文本方式打开输出文件，按需套上 gzip 压缩"""
+        if compress:
+            return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+        return open(path, 'w', encoding='utf-8', newline='')
+    
+    def _report(self, count: int, total: int, progress_callback: Optional[Callable[[int, int], None]]):
+        """按间隔报告进度"""
+        if progress_callback and count % self.PROGRESS_INTERVAL == 0:
+            progress_callback(count, total)
+    
+    def _record(self, entry, fields=None) -> dict:
+        """导出的 JSON 记录，时间戳格式化为带时区偏移的 ISO 8601 时间"""
+        record = entry.to_dict(fields or self.FIELDS)
+        record['timestamp'] = format_timestamp(entry.timestamp)
+        return record
+    
+    def _open_content(self, entry):
+        """超大正文未随记录读入内存时，打开分块读取的文本流；否则返回 None"""
+        if entry.content_loaded:
+            return None
+        return self.storage.open_entry_content(entry.id)
+    
+    def _iter_chunks(self, stream):
+        with stream:
+            while True:
+                chunk = stream.read(self.CHUNK_CHARS)
+                if not chunk:
+                    return
+                yield chunk
+    
+    def _write_record(self, f, entry):
+        """写入一条 JSON 记录；超大正文逐块转义后写出，输出与整条序列化相同（content 为最后一个字段）"""
+        stream = self._open_content(entry)
+        if stream is None:
+            f.write(json.dumps(self._record(entry), ensure_ascii=False, default=str))
+            return
+        
+        head = json.dumps(self._record(entry, self.FIELDS[:-1]), ensure_ascii=False, default=str)
+        f.write(head[:-1] + ', "content": "')
+        for chunk in self._iter_chunks(stream):
+            f.write(json.dumps(chunk, ensure_ascii=False)[1:-1])
+        f.write('"}')
+    
+    def _write_json(self, f, entries, total: int, progress_callback) -> int:
+        """写入 JSON 数组，每条记录单独序列化后追加"""
+        count = 0
+        f.write('[')
+        for entry in entries:
+            f.write(',\n  ' if count else '\n  ')
+            self._write_record(f, entry)
+            count += 1
+            self._report(count, total, progress_callback)
+        f.write('\n]\n' if count else ']\n')
+        return count
+    
+    def _write_ndjson(self, f, entries, total: int, progress_callback) -> int:
+        """写入 NDJSON，每行一条记录"""
+        count = 0
+        for entry in entries:
+            self._write_record(f, entry)
+            f.write('\n')
+            count += 1
+            self._report(count, total, progress_callback)
+        return count
+    
+    def _write_csv(self, f, entries, total: int, progress_callback) -> int:
+        """写入 CSV，元数据以 JSON 字符串保存在一列中"""
+        writer = csv.writer(f)
+        writer.writerow(self.CSV_FIELDS)
+        
+        count = 0
+        for entry in entries:
+            fields = [
+                entry.id,
+                format_timestamp(entry.timestamp),
+                entry.content_type,
+                entry.size,
+                int(entry.is_favorite),
+                json.dumps(entry.metadata, ensure_ascii=False)
+            ]
+            stream = self._open_content(entry)
+            if stream is None:
+                writer.writerow(fields + [entry.content if entry.content is not None else ''])
+            else:
+                # 超大正文加引号分块写出（引号加倍），其余字段仍由 csv 模块格式化
+                line = io.StringIO()
+                csv.writer(line, writer.dialect).writerow(fields + [''])
+                f.write(line.getvalue()[:-len(writer.dialect.lineterminator)] + '"')
+                for chunk in self._iter_chunks(stream):
+                    f.write(chunk.replace('"', '""'))
+                f.write('"' + writer.dialect.lineterminator)
+            count += 1
+            self._report(count, total, progress_callback)
+        return count
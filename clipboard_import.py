@@ -0,0 +1,251 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, Optional
+
+from clipboard_storage import to_epoch_ms
+
+# 旧版本导出的时间戳：SQLite CURRENT_TIMESTAMP 写入的 UTC 文本
+_LEGACY_UTC_RE = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+
+
+class ClipboardImporter:
+    """批量导入剪贴板历史，支持 ClipboardExporter 导出的文件及结构相近的第三方数据
+    
+    文件逐条流式解析，按 batch_size 条一批在单个事务中用 executemany 写入。
+    每条记录至少需要 content 字段；content_type、timestamp、is_favorite、
+    metadata 缺失时使用默认值。内容按摘要去重，与已有记录重复时只合并
+    时间戳和收藏状态。
+    """
+    
+    FORMATS = ('json', 'ndjson', 'csv')
+    
+    # 流式解析 JSON 数组时每次读取的字符数
+    READ_CHUNK_SIZE = 1 << 16
+    # 单条 JSON 记录最多缓冲的字符数（默认最大内容长度的 16 倍），超出时视为文件损坏
+    MAX_RECORD_CHARS = 16 * 1000000
+    # 解析错误距已读文本末尾不超过该字符数时视为记录尚未读完（如被截断的 true 或 \uXXXX）
+    JSON_TAIL_CHARS = 6
+    
+    def __init__(self, storage):
+        self.storage = storage
+    
+    @classmethod
+    def detect_format(cls, path: str, default: str = 'json') -> str:
+        """根据文件扩展名推断格式（忽略 .gz 后缀）"""
+        name = path.lower()
+        if name.endswith('.gz'):
+            name = name[:-3]
+        extension = os.path.splitext(name)[1].lstrip('.')
+        if extension == 'jsonl':
+            return 'ndjson'
+        return extension if extension in cls.FORMATS else default
+    
+    def import_file(self, path: str, format: Optional[str] = None, batch_size: int = 2000,
+                    progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """导入文件，返回导入结果统计
+        
+        progress_callback 在每批提交后调用，参数为包含 processed（已处理条数）、
+        imported（新增条数）、duplicates（重复条数）、skipped（无效条数）、
+        batch_rate（本批每秒条数）和 bytes_read / total_bytes（已读 / 文件字节数）的字典。
+        全部批次提交后按 max_entries 淘汰超出上限的旧记录，条数记在结果的 evicted 中。
+        """
+        format = (format or self.detect_format(path)).lower()
+        if format not in self.FORMATS:
+            raise ValueError(f"不支持的导入格式: {format}")
+        
+        result = {
+            'processed': 0,
+            'imported': 0,
+            'duplicates': 0,
+            'skipped': 0,
+            'evicted': 0,
+            'batch_rate': 0.0,
+            'bytes_read': 0,
+            'total_bytes': os.path.getsize(path)
+        }
+        started = time.perf_counter()
+        
+        with open(path, 'rb') as raw:
+            binary = gzip.GzipFile(fileobj=raw) if self._is_gzip(raw) else raw
+            text = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+            records = getattr(self, f'_read_{format}')(text)
+            
+            batch = []
+            for record in records:
+                entry = self._normalize(record)
+                if entry is None:
+                    result['skipped'] += 1
+                    continue
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    self._flush_batch(batch, result, raw, progress_callback)
+                    batch = []
+            if batch:
+                self._flush_batch(batch, result, raw, progress_callback)
+        
+        result['evicted'] = self.storage.evict_overflow()
+        
+        elapsed = time.perf_counter() - started
+        result['elapsed'] = round(elapsed, 3)
+        result['rate'] = round(result['processed'] / elapsed, 1) if elapsed > 0 else 0.0
+        print(f"导入完成: 新增 {result['imported']} 条，重复 {result['duplicates']} 条，"
+              f"无效 {result['skipped']} 条，淘汰 {result['evicted']} 条，耗时 {result['elapsed']} 秒（{result['rate']} 条/秒）")
+        return result
+    
+    def _flush_batch(self, batch: list, result: Dict, raw, progress_callback: Optional[Callable[[Dict], None]]):
+        """提交一批记录并更新统计"""
+        batch_started = time.perf_counter()
+        imported = self.storage.import_entries(batch)
+        batch_elapsed = time.perf_counter() - batch_started
+        
+        result['processed'] += len(batch)
+        result['imported'] += imported
+        result['duplicates'] += len(batch) - imported
+        result['batch_rate'] = round(len(batch) / batch_elapsed, 1) if batch_elapsed > 0 else 0.0
+        result['bytes_read'] = raw.tell()
+        print(f"导入批次: {len(batch)} 条，{result['batch_rate']} 条/秒")
+        
+        if progress_callback:
+            progress_callback(dict(result))
+    
+    @staticmethod
+    def _is_gzip(raw) -> bool:
+        """根据文件头判断是否为 gzip 压缩文件"""
+        magic = raw.read(2)
+        raw.seek(0)
+        return magic == b'\x1f\x8b'
+    
+    def _read_json(self, f) -> Iterator[Dict]:
+        """流式解析 JSON 数组，逐个产出其中的对象，不把整个文件读入内存
+        
+        解析失败时，只有错误位于已读文本的末尾附近或是未结束的字符串，才视为记录尚未读完而继续读取；
+        其他错误立即报错，单条记录超过 MAX_RECORD_CHARS 个字符时也报错，不会为一处损坏缓冲整个文件。
+        错误信息包含记录序号和该记录在文件中的字符偏移。
+        """
+        decoder = json.JSONDecoder()
+        buffer, position, eof = '', 0, False
+        # 已从缓冲区丢弃的字符数，用于换算记录在文件中的偏移
+        consumed, count = 0, 0
+        
+        # 跳过数组起始的 [
+        while not eof:
+            chunk = f.read(self.READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            stripped = buffer.lstrip()
+            if stripped:
+                if not stripped.startswith('['):
+                    raise ValueError("JSON 导入文件必须是记录数组")
+                consumed = len(buffer) - len(stripped) + 1
+                buffer = stripped[1:]
+                break
+        
+        while True:
+            # 跳过对象之间的空白和逗号
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                location = f"第 {count + 1} 条记录（字符偏移 {consumed + position}）"
+                unfinished = e.msg.startswith('Unterminated string') or len(buffer) - e.pos <= self.JSON_TAIL_CHARS
+                if not unfinished:
+                    raise ValueError(f"JSON 导入文件{location}格式错误: {e.msg}（字符偏移 {consumed + e.pos}）")
+                if eof:
+                    raise ValueError(f"JSON 导入文件格式不完整: {location}未结束")
+                if len(buffer) - position > self.MAX_RECORD_CHARS:
+                    raise ValueError(f"JSON 导入文件{location}超过 {self.MAX_RECORD_CHARS} 个字符，文件可能已损坏")
+                
+                # 丢弃已解析的文本，缓冲区只保留未读完的记录；单条记录很大时每次
+                # 读取的量不少于已缓冲的长度，重新解析的总开销与记录大小成线性关系
+                consumed += position
+                buffer, position = buffer[position:], 0
+                chunk = f.read(max(self.READ_CHUNK_SIZE, len(buffer)))
+                eof = not chunk
+                buffer += chunk
+                continue
+            
+            # 从 raw_decode 返回的偏移继续，已解析的文本在下次读取时丢弃
+            position = end
+            count += 1
+            yield record
+    
+    @staticmethod
+    def _read_ndjson(f) -> Iterator[Dict]:
+        """逐行解析 NDJSON"""
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    
+    @staticmethod
+    def _read_csv(f) -> Iterator[Dict]:
+        """解析 CSV，第一行为列名"""
+        # 大段剪贴板内容可能超过 csv 模块默认的单字段长度限制
+        csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+        yield from csv.DictReader(f)
+    
+    @classmethod
+    def _normalize(cls, record) -> Optional[tuple]:
+        """将一条原始记录转换为 import_entries 需要的元组，无效记录返回 None"""
+        if not isinstance(record, dict):
+            return None
+        content = record.get('content')
+        if not isinstance(content, str) or not content.strip():
+            return None
+        
+        metadata = record.get('metadata') or {}
+        if isinstance(metadata, str):
+            try:
+                metadata = json.loads(metadata)
+            except ValueError:
+                metadata = {'raw': metadata}
+        if not isinstance(metadata, dict):
+            metadata = {}
+        
+        return (
+            content,
+            str(record.get('content_type') or 'text'),
+            metadata,
+            cls._normalize_timestamp(record.get('timestamp')),
+            cls._parse_bool(record.get('is_favorite'))
+        )
+    
+    @staticmethod
+    def _normalize_timestamp(value) -> Optional[int]:
+        """将各种时间格式统一为数据库使用的 Unix 毫秒时间戳，无法识别时返回 None
+        
+        数字按 Unix 时间戳处理（超过 1e11 视为毫秒）；带时区的 ISO 时间按其时区换算，
+        不带时区的按本地时间处理，与导出和界面显示一致。只有旧版本导出的
+        SQLite CURRENT_TIMESTAMP 格式（'YYYY-MM-DD HH:MM:SS'）是 UTC 时间，按 UTC 换算。
+        """
+        if value is None or value == '':
+            return None
+        try:
+            if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+                number = float(value)
+                return round(number if number > 1e11 else number * 1000)
+            text = str(value).strip()
+            moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+            if moment.tzinfo is None and _LEGACY_UTC_RE.fullmatch(text):
+                moment = moment.replace(tzinfo=timezone.utc)
+            return to_epoch_ms(moment)
+        except (ValueError, OverflowError, OSError):
+            return None
+    
+    @staticmethod
+    def _parse_bool(value) -> bool:
+        """解析收藏标记，兼容 CSV 中的字符串"""
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'y')
+        return bool(value)
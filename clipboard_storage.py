@@ -1,304 +1,4682 @@
 import sqlite3
+import base64
+import copy
 import hashlib
+import inspect
+import io
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+import queue
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Dict, Optional, Tuple
 import json
+import re
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache, wraps
+from itertools import islice
+
+from blob_store import BlobStore
+
+try:
+    from re import _parser as _regex_parser  # Python 3.11+
+except ImportError:
+    import sre_parse as _regex_parser
+
+
+# 中日韩文字没有空格分词，建立全文索引前在每个字符两侧插入零宽空格，
+# unicode61 分词器把零宽空格视为分隔符从而逐字切分，查询时再以短语匹配保证字符相邻
+_CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_CJK_RUN_RE = re.compile(f'[{_CJK_RANGES}]+')
+_FTS_SEPARATOR = '\u200b'
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_IDENTIFIER_PART_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+# 摘要高亮标记
+SNIPPET_START = '【'
+SNIPPET_END = '】'
+
+
+def fts_text(text: Optional[str]) -> str:
+    """生成全文索引正文：在中日韩字符两侧插入零宽分隔符"""
+    if not text:
+        return ''
+    # 按连续的中日韩字符段替换，比逐字符展开替换模板快得多
+    return _CJK_RUN_RE.sub(
+        lambda match: _FTS_SEPARATOR + (_FTS_SEPARATOR * 2).join(match.group()) + _FTS_SEPARATOR,
+        text
+    )
+
+
+def fts_identifiers(text: Optional[str]) -> str:
+    """拆分代码标识符（驼峰、下划线命名）得到的子词，供全文索引匹配"""
+    if not text:
+        return ''
+    parts = {}
+    for identifier in _IDENTIFIER_RE.findall(text):
+        words = _IDENTIFIER_PART_RE.findall(identifier)
+        if len(words) > 1:
+            for word in words:
+                parts[word.lower()] = None
+    return ' '.join(parts)
+
+
+def build_fts_query(query: str) -> str:
+    """把用户输入转换为 FTS5 查询：每个词作为前缀短语，多个词之间为 AND"""
+    phrases = []
+    for term in query.split():
+        if not re.search(r'\w', term):
+            continue
+        phrase = fts_text(term).replace('"', '""')
+        phrases.append(f'"{phrase}"*')
+    return ' '.join(phrases)
+
+
+def make_preview(content: str, length: int = 100) -> str:
+    """生成列表显示用的内容预览"""
+    return content[:length] + '...' if len(content) > length else content
+
+
+def make_display(content: str, length: int = 100) -> str:
+    """生成单行显示文本：合并所有空白，截断到指定长度
+
+    只处理凑够长度所需的前缀（不足时逐步扩大），超长内容也不会整体处理。
+    前缀合并后的结果总是完整结果的前缀，因此截断结果与处理全文一致。
+    """
+    limit = length * 2
+    while True:
+        display = ' '.join(content[:limit].split())
+        if len(display) > length or limit >= len(content):
+            break
+        limit *= 4
+    return display[:length] + '...' if len(display) > length else display
+
+
+def count_lines(content: str) -> int:
+    """统计内容行数"""
+    return content.count('\n') + 1 if content else 0
+
+
+# 时间戳以整数 Unix 毫秒保存，与时区无关；按本地日期汇总时在 SQL 中换算
+DAY_MS = 86400000
+
+
+def now_ms() -> int:
+    """当前时间的 Unix 毫秒时间戳"""
+    return time.time_ns() // 1000000
+
+
+def to_epoch_ms(moment: datetime) -> int:
+    """将 datetime 转换为 Unix 毫秒时间戳，不带时区的按本地时间处理"""
+    return round(moment.timestamp() * 1000)
+
+
+def from_epoch_ms(timestamp: int) -> datetime:
+    """将 Unix 毫秒时间戳转换为本地时间（不带时区）"""
+    return datetime.fromtimestamp(timestamp / 1000)
+
+
+def format_timestamp(timestamp: int) -> str:
+    """格式化为带本地时区偏移的 ISO 8601 时间，用于导出"""
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).astimezone().isoformat(timespec='milliseconds')
+
+
+class TimestampFormatter:
+    """将毫秒时间戳格式化为本地时间文本，按天缓存本地零点和日期部分
+
+    同一天内的记录只需整数运算得到时分秒，不必逐行构造 datetime。
+    当天有夏令时切换（不足或超过 24 小时）时不缓存，逐条换算。
+    """
+    
+    def __init__(self, date_format: str = '%m-%d', max_days: int = 64):
+        self.date_format = date_format
+        self.max_days = max_days
+        self._starts = []      # 已缓存日期的本地零点，升序
+        self._prefixes = []    # 对应的日期文本
+    
+    def format(self, timestamp: int) -> str:
+        index = bisect_right(self._starts, timestamp) - 1
+        if index >= 0 and timestamp - self._starts[index] < DAY_MS:
+            start, prefix = self._starts[index], self._prefixes[index]
+        else:
+            moment = from_epoch_ms(timestamp)
+            midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+            start = to_epoch_ms(midnight)
+            prefix = midnight.strftime(self.date_format)
+            if to_epoch_ms(midnight + timedelta(days=1)) - start != DAY_MS:
+                return moment.strftime(f'{self.date_format} %H:%M:%S')
+            if len(self._starts) >= self.max_days:
+                self._starts.clear()
+                self._prefixes.clear()
+            index = bisect_right(self._starts, start)
+            self._starts.insert(index, start)
+            self._prefixes.insert(index, prefix)
+        
+        seconds = (timestamp - start) // 1000
+        return f'{prefix} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+# SimHash 指纹：以去重后的词（中日韩文字按单字）为特征。64 位指纹分为 8 段各 8 位，
+# 由抽屉原理，汉明距离不超过 7 的两个指纹至少有一段完全相同，按段精确查找即可得到全部候选
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8
+SIMHASH_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+SIMHASH_MAX_CHARS = 8192    # 只取开头部分计算指纹，超长内容的开销有上限
+SIMHASH_MIN_FEATURES = 8    # 特征太少的短内容指纹不可靠，不参与相似匹配
+_SIMHASH_TOKEN_RE = re.compile(f'[{_CJK_RANGES}]|[^\\W{_CJK_RANGES}]+')
+
+# 把 64 位哈希的每一位展开到 16 位宽的计数槽中，逐特征累加即可一次得到各位的计数。
+# _SIMHASH_SPREAD[k][b] 为第 k 个字节取值为 b 时对应的展开值
+_SIMHASH_LANE_BITS = 16
+_SIMHASH_SPREAD = [
+    [
+        sum(1 << (_SIMHASH_LANE_BITS * (8 * k + bit)) for bit in range(8) if byte >> bit & 1)
+        for byte in range(256)
+    ]
+    for k in range(SIMHASH_BITS // 8)
+]
+
+
+def normalize_content(content: str) -> str:
+    """合并所有空白，用于识别只有空白差异的内容"""
+    return ' '.join(content.split())
+
+
+@lru_cache(maxsize=65536)
+def _simhash_feature(feature: str) -> int:
+    """计算单个特征的 64 位哈希并展开为计数槽形式"""
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+    return sum(_SIMHASH_SPREAD[k][byte] for k, byte in enumerate(digest))
+
+
+def compute_simhash(content: str) -> Optional[int]:
+    """计算内容的 64 位 SimHash 指纹（有符号整数，便于存入 SQLite）
+    
+    特征不足 SIMHASH_MIN_FEATURES 个时返回 None。
+    """
+    features = set(_SIMHASH_TOKEN_RE.findall(content[:SIMHASH_MAX_CHARS].lower()))
+    if len(features) < SIMHASH_MIN_FEATURES:
+        return None
+    
+    lanes = sum(map(_simhash_feature, features))
+    mask = (1 << _SIMHASH_LANE_BITS) - 1
+    fingerprint = 0
+    for bit in range(SIMHASH_BITS):
+        if (lanes >> (_SIMHASH_LANE_BITS * bit) & mask) * 2 > len(features):
+            fingerprint |= 1 << bit
+    
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >> (SIMHASH_BITS - 1) else fingerprint
+
+
+def simhash_bands(fingerprint: int) -> List[int]:
+    """将指纹切分为 SIMHASH_BANDS 段，返回各段的值"""
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [(fingerprint >> (SIMHASH_BAND_BITS * band)) & mask for band in range(SIMHASH_BANDS)]
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """计算两个 64 位指纹的汉明距离"""
+    return bin((first ^ second) & ((1 << SIMHASH_BITS) - 1)).count('1')
+
+
+# 模糊搜索：三元组索引找候选，再用有界编辑距离确认。
+# 允许 k 处编辑时把查询切成 k+1 段，至少有一段在匹配处原样出现（抽屉原理），逐段用索引查找即可
+FUZZY_GRAM = 3
+FUZZY_MIN_QUERY = 4     # 更短的查询只做精确匹配
+FUZZY_ANCHOR_LIMIT = 3  # 每条候选最多检查的锚点位置数
+
+
+def fuzzy_max_distance(query: str, limit: int = 2) -> int:
+    """按查询长度确定允许的编辑距离：4-7 个字符容许 1 处，更长容许 2 处"""
+    if len(query) < FUZZY_MIN_QUERY:
+        return 0
+    return min(limit, 1 if len(query) < 8 else 2)
+
+
+def fuzzy_pieces(query: str, max_distance: int) -> List[Tuple[int, str]]:
+    """切分查询为若干 (偏移, 片段)，匹配处至少有一个片段原样出现
+
+    查询足够长时切为 max_distance+1 段；否则退回全部三元组，短查询的召回率会略低。
+    """
+    count = max_distance + 1
+    if len(query) >= FUZZY_GRAM * count:
+        bounds = [len(query) * i // count for i in range(count + 1)]
+        return [(bounds[i], query[bounds[i]:bounds[i + 1]]) for i in range(count)]
+    return [(i, query[i:i + FUZZY_GRAM]) for i in range(len(query) - FUZZY_GRAM + 1)]
+
+
+def trigrams(text: str) -> set:
+    """返回文本的三元组集合"""
+    return {text[i:i + FUZZY_GRAM] for i in range(len(text) - FUZZY_GRAM + 1)}
+
+
+def bounded_edit_distance(pattern: str, text: str, max_distance: int) -> Optional[Tuple[int, int]]:
+    """在 text 中查找与 pattern 编辑距离最小的子串
+    
+    返回 (距离, 子串结束位置)，距离超过 max_distance 时返回 None，距离相同时取最靠后的位置。
+    使用 Myers 位并行算法：动态规划表的一整列压缩在整数的各个位中，每个字符只需常数次位运算。
+    """
+    if not pattern:
+        return 0, 0
+    
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    
+    full = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    positive, negative = full, 0
+    score = len(pattern)
+    best = (score, 0) if score <= max_distance else None
+    for j, char in enumerate(text, 1):
+        eq = masks.get(char, 0)
+        vertical = eq | negative
+        horizontal = (((eq & positive) + positive) ^ positive) | eq
+        up = negative | ~(horizontal | positive)
+        down = positive & horizontal
+        if up & last:
+            score += 1
+        elif down & last:
+            score -= 1
+        # 匹配可从 text 任意位置开始，首行恒为 0，移位时不补进位
+        up = (up << 1) & full
+        down = (down << 1) & full
+        positive = (down | ~(vertical | up)) & full
+        negative = up & vertical
+        if score <= max_distance and (best is None or score <= best[0]):
+            best = (score, j)
+    
+    return best
+
+
+# 正则搜索：三元组索引按必需的字面量片段预筛选，再由 REGEXP 函数逐条确认
+REGEX_MAX_FRAGMENTS = 3
+_REGEX_REPEATS = tuple(
+    getattr(_regex_parser, name) for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(_regex_parser, name)
+)
+
+
+def _regex_may_backtrack(items, repeated: bool = False) -> bool:
+    """检查不限次数的重复内是否还有重复，或有开头相同的分支
+
+    这类写法（如 (a+)+、(a|aa)+）在不匹配时会指数级回溯，re 的单次调用无法中途打断。
+    占有量词和原子组不会回溯，不在检查范围内。
+    """
+    for op, av in items:
+        if op is _regex_parser.MAX_REPEAT or op is _regex_parser.MIN_REPEAT:
+            _, high, body = av
+            if repeated and high > 1:
+                return True
+            if _regex_may_backtrack(body, repeated or high == _regex_parser.MAXREPEAT):
+                return True
+        elif op is _regex_parser.SUBPATTERN:
+            if _regex_may_backtrack(av[3], repeated):
+                return True
+        elif op is _regex_parser.BRANCH:
+            branches = av[1]
+            heads = [branch[0] if branch else None for branch in branches]
+            if repeated and (any(head is None or head[0] is not _regex_parser.LITERAL for head in heads)
+                             or len(set(heads)) < len(heads)):
+                return True
+            if any(_regex_may_backtrack(branch, repeated) for branch in branches):
+                return True
+    return False
+
+
+@lru_cache(maxsize=128)
+def compile_regex(pattern: str) -> Tuple[re.Pattern, Tuple[str, ...]]:
+    """编译正则表达式并提取匹配必须包含的字面量片段，结果按模式缓存
+
+    片段用于在三元组索引上预筛选：只取不含空白、至少 3 个字符的连续字面量，
+    忽略大小写时再排除非 ASCII 字符（LIKE 只对 ASCII 忽略大小写）。
+    表达式无效或可能回溯爆炸时抛出 re.error。
+    """
+    regex = re.compile(pattern)
+    parsed = _regex_parser.parse(pattern)
+    if _regex_may_backtrack(parsed):
+        raise re.error('重复内嵌套重复或有歧义的分支，可能导致回溯爆炸，请改写表达式')
+    
+    fragments = []
+    current = []
+    
+    def flush():
+        fragments.extend(part for part in ''.join(current).split() if len(part) >= FUZZY_GRAM)
+        current.clear()
+    
+    def walk(items, ignore_case: bool):
+        for op, av in items:
+            if op is _regex_parser.LITERAL and not (ignore_case and av > 0x7f):
+                current.append(chr(av))
+            elif op is _regex_parser.AT:
+                # 锚点不占字符，前后的字面量仍然相邻
+                continue
+            elif op is _regex_parser.SUBPATTERN:
+                group_flags = av[1]
+                walk(av[3], ignore_case or bool(group_flags & re.IGNORECASE))
+            elif op in _REGEX_REPEATS and av[0] >= 1:
+                flush()
+                walk(av[2], ignore_case)
+                flush()
+            else:
+                flush()
+    
+    walk(parsed, bool(regex.flags & re.IGNORECASE))
+    flush()
+    
+    fragments.sort(key=len, reverse=True)
+    return regex, tuple(fragments[:REGEX_MAX_FRAGMENTS])
+
+
+def _clean_snippet(snippet: str) -> str:
+    """去掉建索引时插入的零宽分隔符，并合并为单行"""
+    return ' '.join(snippet.replace(_FTS_SEPARATOR, '').split())
+
+
+# 延迟字段尚未读取的标记
+_UNLOADED = object()
+
+
+class ClipEntry:
+    """剪贴板记录，存储接口返回的轻量对象
+
+    使用 __slots__，每条记录不再携带一个 __dict__。元数据保存原始 JSON，首次访问时才解码；
+    正文在查询时未读取的，首次访问 content 时再通过存储按 ID 读取。
+    timestamp 为 Unix 毫秒时间戳。
+    为兼容旧代码，也支持 entry['id'] 和 entry.get('id') 形式的访问。
+    """
+    
+    __slots__ = ('id', 'content_type', 'timestamp', 'size', 'is_favorite', 'line_count',
+                 'preview', 'near_duplicates', '_metadata', '_content', '_storage')
+    
+    FIELDS = ('id', 'content_type', 'timestamp', 'size', 'is_favorite', 'line_count',
+              'preview', 'near_duplicates', 'metadata', 'content')
+    
+    def __init__(self, entry_id: int, content_type: str, timestamp: int, size: int, is_favorite: bool,
+                 line_count: int = 0, preview: str = '', near_duplicates: int = 0,
+                 metadata=_UNLOADED, content=_UNLOADED, storage: Optional['ClipboardStorage'] = None):
+        self.id = entry_id
+        self.content_type = content_type
+        self.timestamp = timestamp
+        self.size = size
+        self.is_favorite = is_favorite
+        self.line_count = line_count
+        self.preview = preview
+        self.near_duplicates = near_duplicates
+        self._metadata = metadata
+        self._content = content
+        self._storage = storage
+    
+    @property
+    def metadata(self) -> dict:
+        """元数据字典，首次访问时解码（查询未读取时从存储读取）"""
+        value = self._metadata
+        if value is _UNLOADED:
+            value = self._storage.get_entry_metadata(self.id) if self._storage is not None else None
+        if value is None or isinstance(value, str):
+            value = json.loads(value) if value else {}
+        self._metadata = value
+        return value
+    
+    @metadata.setter
+    def metadata(self, value: dict):
+        self._metadata = value
+    
+    @property
+    def content(self) -> Optional[str]:
+        """完整正文，首次访问时从存储读取；正文缺失时为 None"""
+        if self._content is _UNLOADED:
+            self._content = self._storage.get_entry_content(self.id) if self._storage is not None else None
+        return self._content
+    
+    @content.setter
+    def content(self, value: Optional[str]):
+        self._content = value
+    
+    @property
+    def content_loaded(self) -> bool:
+        """正文是否已读入内存"""
+        return self._content is not _UNLOADED
+    
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+    
+    def to_dict(self, fields: Optional[Tuple[str, ...]] = None) -> Dict:
+        """转换为字典，用于序列化；包含 metadata / content 时会触发延迟加载"""
+        return {field: getattr(self, field) for field in (fields or self.FIELDS)}
+    
+    def copy(self) -> 'ClipEntry':
+        """复制记录；副本各自延迟加载，互不影响
+        
+        已解码的元数据字典深拷贝一份，修改副本的元数据（包括嵌套的值）不会影响原记录。
+        """
+        metadata = self._metadata
+        if isinstance(metadata, dict):
+            metadata = copy.deepcopy(metadata)
+        return ClipEntry(
+            self.id, self.content_type, self.timestamp, self.size, self.is_favorite, self.line_count,
+            self.preview, self.near_duplicates, metadata, self._content, self._storage
+        )
+    
+    def __repr__(self) -> str:
+        return f"ClipEntry(id={self.id}, content_type={self.content_type!r}, timestamp={self.timestamp!r})"
+
+
+class ContentReader(io.RawIOBase):
+    """把按块产出的字节包装为只读的二进制文件对象，关闭时释放底层的 blob 句柄或文件"""
+    
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._view = memoryview(b'')
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not self._view:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._view = memoryview(chunk)
+        size = min(len(buffer), len(self._view))
+        buffer[:size] = self._view[:size]
+        self._view = self._view[size:]
+        return size
+    
+    def close(self):
+        if not self.closed:
+            self._view = memoryview(b'')
+            self._chunks.close()
+        super().close()
+
+
+def _clone_result(value):
+    """复制查询结果，调用方修改返回值（或延迟加载正文）不会影响缓存中的对象"""
+    if isinstance(value, ClipEntry):
+        return value.copy()
+    if isinstance(value, list):
+        return [_clone_result(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_clone_result(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _clone_result(item) for key, item in value.items()}
+    return value
+
+
+def _estimate_size(value) -> int:
+    """粗略估算查询结果占用的内存字节数"""
+    if isinstance(value, ClipEntry):
+        return (sys.getsizeof(value) + sys.getsizeof(value.preview) + sys.getsizeof(value.timestamp)
+                + (sys.getsizeof(value._content) if value.content_loaded else 0))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_size(key) + _estimate_size(item) for key, item in value.items())
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """查询结果的 LRU 缓存，以写入代数判断是否过期
+    
+    每次写事务提交后代数加一，之前缓存的结果全部失效，无需逐条判断哪些查询受影响。
+    查询开始前记下代数，结果按该代数存入：查询期间有写入提交时，结果存入即已过期，
+    不会把旧数据当作新结果返回。按条目数和估算字节数淘汰最久未用的结果。
+    """
+    
+    def __init__(self, max_entries: int = 64, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # 查询键 -> (代数, 结果, 估算字节数)
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+    
+    def invalidate(self):
+        """写入提交后调用：代数加一并清空已缓存的结果"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+    
+    def get(self, key: tuple):
+        """返回缓存结果的副本，未命中时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != self.generation:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = cached[1]
+        return _clone_result(value)
+    
+    def put(self, key: tuple, generation: int, value):
+        """按查询开始时的代数存入结果，返回供调用方使用的副本"""
+        if not self.enabled:
+            return value
+        size = _estimate_size(value)
+        result = _clone_result(value)
+        with self._lock:
+            if generation != self.generation or size > self.max_bytes:
+                return result
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (generation, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return result
+    
+    def get_stats(self) -> Dict:
+        """命中统计，用于调整缓存容量"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'generation': self.generation
+            }
+
+
+# 延迟直方图的桶上界（毫秒），超出最后一个桶的计入 +Inf
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_SQL_SPACE_RE = re.compile(r'\s+')
+_SQL_PLACEHOLDER_LIST_RE = re.compile(r'\?(?:\s*,\s*\?)+')
+_SQL_PARTITION_RE = re.compile(r'\bpart_\d{4}_\d{2}\b')
+_EXPLAINABLE_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def normalize_sql(sql: str) -> str:
+    """归并同一语句的不同写法：压缩空白，合并变长的占位符列表和归档分区模式名"""
+    sql = _SQL_SPACE_RE.sub(' ', sql).strip()
+    sql = _SQL_PLACEHOLDER_LIST_RE.sub('?, ...', sql)
+    return _SQL_PARTITION_RE.sub('part_*', sql)
+
+
+def plan_flags(plan: List[str]) -> List[str]:
+    """从 EXPLAIN QUERY PLAN 的步骤中找出全表扫描、整个索引的遍历和临时排序
+
+    SEARCH 按索引只取一段范围；SCAN 逐行检查整张表，或沿索引顺序逐行检查
+    （带 LIMIT 且很快凑够结果时才廉价）。
+    """
+    flags = []
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE'):
+            flags.append('temp_btree: ' + detail[len('USE TEMP B-TREE FOR '):])
+        elif not detail.startswith('SCAN ') or 'VIRTUAL TABLE' in detail or 'CONSTANT ROW' in detail:
+            continue
+        elif ' USING ' in detail:
+            flags.append('index_scan: ' + detail[len('SCAN '):])
+        else:
+            flags.append('full_scan: ' + detail[len('SCAN '):])
+    return flags
+
+
+def _describe_params(parameters) -> list:
+    """慢查询日志中的参数摘要：文本和二进制只记录长度，报告中不会出现剪贴板内容"""
+    if isinstance(parameters, dict):
+        parameters = list(parameters.values())
+    summary = []
+    for value in parameters or ():
+        if isinstance(value, str):
+            summary.append(f'<text {len(value)}>')
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            summary.append(f'<blob {len(value)}>')
+        else:
+            summary.append(value)
+    return summary
+
+
+class LatencyHistogram:
+    """按固定桶统计耗时分布，百分位数取所在桶的上界（不超过最大值）"""
+    
+    __slots__ = ('count', 'total_ms', 'max_ms', 'buckets')
+    
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    
+    def add(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+    
+    def percentile(self, fraction: float) -> float:
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                bound = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+    
+    def to_dict(self) -> Dict:
+        labels = [str(bound) for bound in LATENCY_BUCKETS_MS] + ['+Inf']
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'max_ms': round(self.max_ms, 3),
+            'buckets': {label: count for label, count in zip(labels, self.buckets) if count}
+        }
+
+
+class QueryProfiler:
+    """存储层的耗时统计：公开方法和每条 SQL 语句各自一份延迟直方图
+    
+    语句从执行开始到结果取完（或游标关闭、重新执行、被回收）为一次，只计 SQLite 内部的耗时，
+    不含调用方处理各行的时间。超过阈值的语句连同 EXPLAIN QUERY PLAN 记入慢查询日志，
+    并标出全表扫描和临时排序。同一语句的查询计划只解析一次。
+    """
+    
+    def __init__(self, slow_query_ms: float = 50, max_slow_queries: int = 100):
+        self.slow_query_ms = max(0.0, float(slow_query_ms))
+        self.started_at = now_ms()
+        self.methods = {}  # 方法名 -> LatencyHistogram
+        self.statements = {}  # 归一化语句 -> {'histogram', 'methods', 'flags'}
+        self.slow_queries = deque(maxlen=max(1, max_slow_queries))
+        self._plans = {}  # 归一化语句 -> 查询计划步骤
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    @property
+    def current_method(self) -> Optional[str]:
+        stack = getattr(self._local, 'methods', None)
+        return stack[-1] if stack else None
+    
+    def wrap_method(self, name: str, method: Callable) -> Callable:
+        """包装存储方法，记录调用耗时；生成器方法只计各次取值的耗时"""
+        if inspect.isgeneratorfunction(method):
+            @wraps(method)
+            def generator_wrapper(*args, **kwargs):
+                iterator = method(*args, **kwargs)
+                elapsed = 0.0
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        self._enter(name)
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        finally:
+                            self._leave()
+                            elapsed += time.perf_counter() - started
+                        yield item
+                finally:
+                    iterator.close()
+                    self._record_method(name, elapsed * 1000)
+            return generator_wrapper
+        
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            self._enter(name)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._leave()
+                self._record_method(name, (time.perf_counter() - started) * 1000)
+        return wrapper
+    
+    def _enter(self, name: str):
+        stack = getattr(self._local, 'methods', None)
+        if stack is None:
+            stack = self._local.methods = []
+        stack.append(name)
+    
+    def _leave(self):
+        self._local.methods.pop()
+    
+    def _record_method(self, name: str, elapsed_ms: float):
+        with self._lock:
+            histogram = self.methods.get(name)
+            if histogram is None:
+                histogram = self.methods[name] = LatencyHistogram()
+            histogram.add(elapsed_ms)
+    
+    def record_statement(self, conn: sqlite3.Connection, sql: str, parameters, elapsed_ms: float,
+                         method: Optional[str], explain: bool = True):
+        """记录一次语句耗时，超过阈值时解析查询计划并写入慢查询日志"""
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = {'histogram': LatencyHistogram(), 'methods': Counter(), 'flags': []}
+            stats['histogram'].add(elapsed_ms)
+            stats['methods'][method or '(internal)'] += 1
+            if elapsed_ms < self.slow_query_ms:
+                return
+            plan = self._plans.get(key)
+        
+        if plan is None and explain:
+            plan = self._explain(conn, sql, parameters)
+            with self._lock:
+                self._plans[key] = plan
+                stats['flags'] = plan_flags(plan)
+        
+        flags = plan_flags(plan) if plan else []
+        entry = {
+            'time': format_timestamp(now_ms()),
+            'elapsed_ms': round(elapsed_ms, 3),
+            'method': method,
+            'sql': _SQL_SPACE_RE.sub(' ', sql).strip(),
+            'params': _describe_params(parameters),
+            'plan': plan or [],
+            'flags': flags
+        }
+        with self._lock:
+            self.slow_queries.append(entry)
+        
+        print(f"慢查询 {elapsed_ms:.1f} ms [{method or '内部调用'}]: {entry['sql'][:200]}")
+        for flag in flags:
+            print(f"  {flag}")
+    
+    @staticmethod
+    def _explain(conn: sqlite3.Connection, sql: str, parameters) -> List[str]:
+        """在同一连接上解析查询计划（可访问已附加的分区），无法解析的语句返回空列表"""
+        words = sql.split(None, 1)
+        if not words or words[0].upper() not in _EXPLAINABLE_STATEMENTS:
+            return []
+        try:
+            cursor = sqlite3.Cursor(conn)
+            try:
+                rows = cursor.execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+            finally:
+                cursor.close()
+            return [row[3] for row in rows]
+        except sqlite3.Error:
+            return []
+    
+    def reset(self):
+        """清空已收集的统计"""
+        with self._lock:
+            self.started_at = now_ms()
+            self.methods.clear()
+            self.statements.clear()
+            self.slow_queries.clear()
+    
+    def get_report(self, limit: int = 50) -> Dict:
+        """生成耗时报告：方法和语句按总耗时降序，慢查询按发生时间"""
+        with self._lock:
+            methods = sorted(self.methods.items(), key=lambda item: item[1].total_ms, reverse=True)
+            statements = sorted(self.statements.items(), key=lambda item: item[1]['histogram'].total_ms,
+                                reverse=True)
+            return {
+                'started_at': format_timestamp(self.started_at),
+                'generated_at': format_timestamp(now_ms()),
+                'slow_query_ms': self.slow_query_ms,
+                'methods': [dict(name=name, **histogram.to_dict()) for name, histogram in methods[:limit]],
+                'statements': [
+                    dict(sql=sql, **stats['histogram'].to_dict(), methods=dict(stats['methods']),
+                         flags=list(stats['flags']))
+                    for sql, stats in statements[:limit]
+                ],
+                'slow_queries': list(self.slow_queries)
+            }
+
+
+class _ProfiledCursor(sqlite3.Cursor):
+    """记录语句耗时的游标，由 _ProfiledConnection 创建"""
+    
+    _pending = None  # [语句, 参数, 已用秒数, 所在方法, 是否解析计划]
+    
+    def _start(self, sql: str, parameters, explain: bool = True):
+        self._finish()
+        self.connection._record_abandoned()
+        profiler = self.connection.profiler
+        self._pending = [sql, parameters, 0.0, profiler.current_method, explain]
+    
+    def _add(self, started: float):
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - started
+    
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, parameters, elapsed, method, explain = pending
+            self.connection.profiler.record_statement(self.connection, sql, parameters, elapsed * 1000,
+                                                      method, explain)
+    
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self._add(started)
+        # 没有结果集的语句（写入、DDL）执行即完成
+        if self.description is None:
+            self._finish()
+        return self
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, (), explain=False)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._add(started)
+            self._finish()
+    
+    def executescript(self, sql_script):
+        self._start(sql_script, (), explain=False)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._add(started)
+            self._finish()
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started)
+        if row is None:
+            self._finish()
+        return row
+    
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(started)
+        if not rows:
+            self._finish()
+        return rows
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started)
+        self._finish()
+        return rows
+    
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(started)
+            self._finish()
+            raise
+        self._add(started)
+        return row
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def __del__(self):
+        # execute(...).fetchone() 之类用完即弃的游标在回收时只把未结束的记录交给连接，
+        # 由所属线程在下一条语句前补记；回收可能发生在任意线程、任意时刻，这里不执行 SQL
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            try:
+                self.connection._abandoned.append(pending)
+            except Exception:
+                pass
+
+
+class _ProfiledConnection(sqlite3.Connection):
+    """所有语句都经由 _ProfiledCursor 执行的连接"""
+    
+    profiler = None
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 回收时尚未结束计时的游标留下的记录，deque 的追加和取出是线程安全的
+        self._abandoned = deque()
+    
+    def _record_abandoned(self):
+        """补记已回收游标的语句耗时（在连接所属线程中调用）"""
+        while self._abandoned:
+            sql, parameters, elapsed, method, explain = self._abandoned.popleft()
+            self.profiler.record_statement(self, sql, parameters, elapsed * 1000, method, explain)
+    
+    def cursor(self, factory=None):
+        return super().cursor(factory or _ProfiledCursor)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
 
 
 class ClipboardStorage:
     """剪贴板数据存储管理器，使用SQLite数据库"""
     
-    def __init__(self, db_path: str = "clipboard_history.db"):
+    # 连接参数默认值，可通过 ConfigManager 的 database 段覆盖
+    DEFAULT_DB_CONFIG = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -8000,        # 负数表示 KB，约 8MB 页缓存
+        "mmap_size": 67108864,      # 64MB 内存映射
+        "busy_timeout": 5000,       # 毫秒
+        "cached_statements": 128,   # 每个连接的预编译语句缓存数量
+        "blob_threshold": 65536,    # 超过该字节数的内容移出主表，0 表示禁用
+        "compression": True,        # 是否压缩存储正文
+        "compression_min_size": 256,  # 小于该字节数的内容不压缩
+        "max_entries": 10000,       # 非收藏记录上限（含归档分区），0 表示不限制
+        "eviction_batch_size": 16,  # 每次写入最多淘汰的旧记录数
+        "cleanup_chunk_size": 500,  # 清理旧记录时每个事务删除的条数
+        "vacuum_pages_per_step": 512,  # 每次增量回收的空闲页数
+        "near_duplicate_policy": "keep",  # 近似重复的处理方式：merge / link / keep
+        "near_duplicate_distance": 6,  # 判定为近似重复的最大指纹汉明距离
+        "near_duplicate_window": 1000,  # 只在最近多少条记录中查找近似重复
+        "fuzzy_max_distance": 2,    # 模糊搜索容许的最大编辑距离
+        "fuzzy_candidate_limit": 200,  # 模糊搜索每个查询片段最多取的候选数
+        "fuzzy_index_chars": 1024,  # 每条记录建立三元组索引的字符数
+        "regex_time_budget_ms": 300,  # 单次正则搜索的时间预算（毫秒）
+        "regex_max_chars": 16384,   # 正则只匹配每条记录开头的字符数
+        "backfill_batch_size": 500,  # 后台回填每批处理的记录 ID 范围
+        "backfill_pause_ms": 50,    # 后台回填每批之间的间隔（毫秒）
+        "partition_by_month": False,  # 是否将当月之前的记录按月份移入归档分区
+        "partition_dir": None,      # 归档分区文件目录，默认为数据库旁的 partitions 目录
+        "partition_attach_limit": 8,  # 每个连接同时附加的归档分区数（SQLite 默认最多 10 个）
+        "query_cache_entries": 64,  # 查询结果缓存的条目数，0 表示禁用
+        "query_cache_bytes": 16777216,  # 查询结果缓存的估算内存上限（字节）
+        "stream_threshold": 262144,  # 超过该字节数的正文在导出等批量读取时分块流式读取，0 表示总是整条读取
+        "stream_chunk_size": 65536,  # 流式读取正文的块大小（字节）
+        "profile_queries": False,   # 是否统计各方法和语句的耗时（有少量额外开销）
+        "slow_query_ms": 50,        # 超过该耗时（毫秒）的语句记入慢查询日志
+        "slow_query_log_size": 100  # 慢查询日志保留的条数
+    }
+    
+    NEAR_DUPLICATE_POLICIES = ('merge', 'link', 'keep')
+    
+    # 结构迁移步骤，按顺序执行，完成的版本号记录在 PRAGMA user_version 中。
+    # 步骤须可重复执行（IF NOT EXISTS、补列前检查），以兼容旧版本程序已建好的部分结构；
+    # 触发器不在此列，每次启动按当前定义重建
+    MIGRATIONS = (
+        (1, '_migrate_base_schema'),
+        (2, '_migrate_storage_columns'),
+        (3, '_migrate_content_digests'),
+        (4, '_migrate_near_duplicates'),
+        (5, '_migrate_list_index'),
+        (6, '_migrate_partitions'),
+        (7, '_migrate_epoch_timestamps'),
+        (8, '_migrate_tags'),
+    )
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+    
+    # 后台回填任务：名称 -> (需要回填的记录条件, 处理一批记录的方法, 是否需要读取正文)
+    BACKFILLS = {
+        'display_columns': ('display IS NULL', '_backfill_display_columns', True),
+        'content_digests': ('digest IS NULL AND content_hash IS NOT NULL', '_backfill_content_digests', True),
+        'fingerprints': ('norm_digest IS NULL', '_backfill_fingerprints', True),
+        'fts': ('1', '_backfill_fts', True),
+        'trigrams': ('1', '_backfill_trigrams', True),
+        'epoch_timestamps': ("typeof(timestamp) = 'text'", '_backfill_epoch_timestamps', False),
+    }
+    # 记录范围处理完后的收尾步骤：名称 -> 方法，返回 True 表示还有剩余，下一批继续
+    BACKFILL_FINALIZERS = {
+        'epoch_timestamps': '_finish_epoch_timestamps',
+    }
+    
+    # 压缩后至少节省的比例，达不到则按原文存储
+    COMPRESSION_MIN_SAVING = 0.1
+    # 训练压缩字典所需的最少样本数
+    ZDICT_MIN_SAMPLES = 50
+    
+    def __init__(self, db_path: str = "clipboard_history.db", db_config: Optional[Dict] = None,
+                 blob_dir: Optional[str] = None):
         self.db_path = db_path
+        self.db_config = dict(self.DEFAULT_DB_CONFIG)
+        self.db_config.update(db_config or {})
+        
+        # 大内容的外部存储，默认放在数据库文件旁的 blobs 目录
+        if blob_dir is None:
+            blob_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), 'blobs')
+        self.blob_store = BlobStore(blob_dir)
+        self.blob_threshold = int(self.db_config['blob_threshold'])
+        
+        # 压缩字典缓存：版本号 -> 字典内容，版本 0 表示不使用预置字典
+        self.compression_enabled = bool(self.db_config['compression'])
+        self.compression_min_size = int(self.db_config['compression_min_size'])
+        self._zdicts = {0: b''}
+        self._zdict_version = 0
+        
+        # 记录数上限，写入时按小批量淘汰最旧的非收藏记录
+        self.max_entries = int(self.db_config['max_entries'])
+        self.eviction_batch_size = max(2, int(self.db_config['eviction_batch_size']))
+        self.cleanup_chunk_size = max(1, int(self.db_config['cleanup_chunk_size']))
+        self.vacuum_pages_per_step = max(1, int(self.db_config['vacuum_pages_per_step']))
+        
+        # 近似重复处理：merge 用新内容替换旧记录，link 折叠为一组，keep 保留为独立记录
+        self.near_duplicate_policy = self.db_config['near_duplicate_policy']
+        if self.near_duplicate_policy not in self.NEAR_DUPLICATE_POLICIES:
+            print(f"未知的近似重复处理方式: {self.near_duplicate_policy}，改用 keep")
+            self.near_duplicate_policy = 'keep'
+        # 分段索引只保证找出距离小于段数的候选
+        self.near_duplicate_distance = max(0, min(int(self.db_config['near_duplicate_distance']), SIMHASH_BANDS - 1))
+        self.near_duplicate_window = max(1, int(self.db_config['near_duplicate_window']))
+        
+        # 模糊搜索只索引每条记录的开头部分，索引体积和候选校验开销都有上限
+        self.fuzzy_max_distance = max(0, int(self.db_config['fuzzy_max_distance']))
+        self.fuzzy_candidate_limit = max(1, int(self.db_config['fuzzy_candidate_limit']))
+        self.fuzzy_index_chars = max(FUZZY_GRAM, int(self.db_config['fuzzy_index_chars']))
+        
+        # Python 的 re 无法中途打断，单条记录的匹配范围必须有上限
+        self.regex_time_budget_ms = max(1, int(self.db_config['regex_time_budget_ms']))
+        self.regex_max_chars = max(1, int(self.db_config['regex_max_chars']))
+        
+        # 超大正文不在批量读取时整条载入，由 open_entry_content 分块读取
+        self.stream_threshold = max(0, int(self.db_config['stream_threshold']))
+        self.stream_chunk_size = max(1024, int(self.db_config['stream_chunk_size']))
+        
+        # 每个线程持有一个长连接，WAL 模式下读写互不阻塞
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._closed = False
+        # 连接代数：恢复备份时关闭其他线程的连接并递增，各线程发现代数变化后重新打开连接
+        self._generation = 0
+        
+        # 后台批量写入线程，由 start_writer 启动
+        self.writer = None
+        
+        # 进行中的备份和恢复数：close 时通知备份中止，等全部结束后再关闭连接
+        self._backup_cancel = threading.Event()
+        self._backup_active = 0
+        self._backup_condition = threading.Condition()
+        
+        # 结构升级后的后台回填线程，由 init_database 按需启动
+        self.backfill_batch_size = max(1, int(self.db_config['backfill_batch_size']))
+        self.backfill_pause_ms = max(0, int(self.db_config['backfill_pause_ms']))
+        self.backfill_thread = None
+        self._backfill_stop = threading.Event()
+        
+        # 旧版本的 UTC 文本时间戳由后台回填换算，换算完成前查询按两种格式取值
+        self.legacy_timestamps = False
+        
+        # 按月分区：主库是接收写入的当前分区，当月之前的记录由 rollover_partitions
+        # 移入按月份命名的归档文件，查询用到时才 ATTACH 到各线程的连接上。
+        # 去重只检查当前分区，归档后再次复制的内容会在当前分区另存一条，
+        # 历史列表中两条都保留，搜索结果按正文摘要去重，只保留最新的一条
+        self.partition_enabled = bool(self.db_config['partition_by_month'])
+        self.partition_dir = self.db_config['partition_dir'] or os.path.join(
+            os.path.dirname(os.path.abspath(db_path)), 'partitions'
+        )
+        self.partition_attach_limit = max(1, int(self.db_config['partition_attach_limit']))
+        self._partition_stem = os.path.splitext(os.path.basename(db_path))[0]
+        
+        # 列表、搜索和统计的查询结果缓存，任何写事务提交后整体失效
+        self.query_cache = QueryCache(int(self.db_config['query_cache_entries']),
+                                      int(self.db_config['query_cache_bytes']))
+        
+        # 可选的耗时统计：公开方法和 SQL 语句的延迟直方图，慢查询附带查询计划
+        self.profiler = None
+        if self.db_config['profile_queries']:
+            self.profiler = QueryProfiler(self.db_config['slow_query_ms'],
+                                          int(self.db_config['slow_query_log_size']))
+            self._install_profiler()
+        
+        # SQLite 未编译 FTS5 时退回 LIKE 搜索
+        self.fts_enabled = False
+        # SQLite 低于 3.34 没有 trigram 分词器，模糊搜索退回普通搜索
+        self.fuzzy_enabled = False
+        
         self.init_database()
     
-    def init_database(self):
-        """初始化数据库，创建必要的表结构"""
+    def _open_connection(self) -> sqlite3.Connection:
+        """创建新的数据库连接并应用 PRAGMA 配置"""
+        config = self.db_config
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config['busy_timeout'] / 1000.0,
+            isolation_level=None,  # 自动提交，写事务由 _transaction 显式管理
+            check_same_thread=False,  # 允许 close() 在关闭线程中统一释放
+            cached_statements=config['cached_statements'],
+            factory=_ProfiledConnection if self.profiler else sqlite3.Connection
+        )
+        if self.profiler:
+            conn.profiler = self.profiler
+        conn.execute(f"PRAGMA busy_timeout = {int(config['busy_timeout'])}")
+        # 新数据库须在切换 WAL 写入文件头之前设置；对已有的数据库不生效，见 enable_incremental_vacuum
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute(f"PRAGMA journal_mode = {config['journal_mode']}")
+        conn.execute(f"PRAGMA synchronous = {config['synchronous']}")
+        conn.execute(f"PRAGMA cache_size = {int(config['cache_size'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(config['mmap_size'])}")
+        
+        # 全文索引触发器依赖的函数，每个连接都需要注册
+        conn.create_function('fts_text', 1, fts_text, deterministic=True)
+        conn.create_function('fts_identifiers', 1, fts_identifiers, deterministic=True)
+        conn.create_function('clip_text', 4, self._resolve_content)
+        conn.create_function('fuzzy_text', 1, self._fuzzy_text, deterministic=True)
+        conn.create_function('regexp', 2, self._regexp)
+        return conn
+    
+    def _install_profiler(self):
+        """用计时包装替换本实例的公开方法，内部方法执行的语句计入调用它的公开方法"""
+        for name, _ in inspect.getmembers(type(self), inspect.isfunction):
+            if not name.startswith('_'):
+                setattr(self, name, self.profiler.wrap_method(name, getattr(self, name)))
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的长连接，不存在时创建"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and not self._closed and self._local.generation == self._generation:
+            return conn
+        
+        with self._connections_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("数据库存储已关闭")
+            conn = self._open_connection()
+            self._connections.append(conn)
+            self._local.generation = self._generation
+        
+        self._local.conn = conn
+        # 本连接已附加的归档分区：模式名 -> 月份，按最近使用排序
+        self._local.attached = OrderedDict()
+        return conn
+    
+    def release_connection(self):
+        """关闭当前线程的连接，供短期工作线程在退出前调用"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        
+        self._local.conn = None
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"关闭数据库连接失败: {e}")
+    
+    def _close_other_connections(self):
+        """关闭当前线程以外的所有连接（连同其附加的归档分区），各线程下次访问时重新打开"""
+        current = self._get_connection()
+        with self._connections_lock:
+            others = [conn for conn in self._connections if conn is not current]
+            self._connections = [current]
+            self._generation += 1
+            self._local.generation = self._generation
+        
+        for conn in others:
+            try:
+                conn.close()
+            except Exception as e:
+                print(f"关闭数据库连接失败: {e}")
+    
+    @contextmanager
+    def _transaction(self):
+        """写事务上下文，使用 BEGIN IMMEDIATE 提前获取写锁，避免锁升级冲突
+        
+        提交后使查询缓存失效；先提交再失效，查询缓存不会存入提交前读到的旧结果。
+        """
+        conn = self._get_connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+            self.query_cache.invalidate()
+    
+    def close(self):
+        """中止进行中的备份、排空写入队列后关闭所有线程的数据库连接，并对 WAL 执行检查点"""
+        # 备份在下一步中止，恢复不可中断；两者都结束后才关闭它们可能用到的连接
+        self._backup_cancel.set()
+        with self._backup_condition:
+            self._backup_condition.wait_for(lambda: self._backup_active == 0)
+        
+        if self.writer is not None:
+            self.writer.close()
+        
+        self._backfill_stop.set()
+        if self.backfill_thread is not None and self.backfill_thread is not threading.current_thread():
+            self.backfill_thread.join(timeout=5)
+        
+        with self._connections_lock:
+            if self._closed:
+                return
+            self._closed = True
+            connections, self._connections = self._connections, []
+        
+        for index, conn in enumerate(connections):
+            try:
+                # 最后一个连接关闭前将 WAL 合并回主库并截断
+                if index == len(connections) - 1:
+                    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                conn.close()
+            except Exception as e:
+                print(f"关闭数据库连接失败: {e}")
+        
+        print(f"数据库连接已关闭: {self.db_path}")
+    
+    
+    def init_database(self):
+        """初始化数据库：按版本执行结构迁移、重建触发器，耗时的回填交给后台线程"""
+        try:
+            self._run_migrations()
+            self.legacy_timestamps = self._get_connection().execute(
+                "SELECT 1 FROM schema_backfills WHERE name = 'epoch_timestamps'"
+            ).fetchone() is not None
+            
+            with self._transaction() as cursor:
+                self._init_blob_refs(cursor)
+                self._init_counters(cursor)
+                self.fts_enabled = self._init_fts(cursor)
+                self.fuzzy_enabled = self._init_trigrams(cursor)
+                self._init_near_duplicates(cursor)
+                self._init_tags(cursor)
+            
+            self._load_compression_dicts()
+            self._sweep_partition_files()
+            print(f"数据库初始化成功: {self.db_path}")
+            
+            self.start_backfill()
+        
+        except Exception as e:
+            print(f"数据库初始化失败: {e}")
+            raise
+    
+    def _run_migrations(self):
+        """按 PRAGMA user_version 依次执行尚未完成的迁移步骤
+        
+        每一步与版本号更新在同一事务中提交，失败时整步回滚，下次启动从这一步重试。
+        """
+        conn = self._get_connection()
+        current = conn.execute('PRAGMA user_version').fetchone()[0]
+        if current > self.SCHEMA_VERSION:
+            print(f"数据库结构版本 {current} 高于当前程序支持的版本 {self.SCHEMA_VERSION}")
+            return
+        
+        for version, method in self.MIGRATIONS:
+            if version <= current:
+                continue
+            with self._transaction() as cursor:
+                getattr(self, method)(cursor)
+                cursor.execute(f'PRAGMA user_version = {version}')
+        
+        if current < self.SCHEMA_VERSION:
+            print(f"数据库结构已升级: 版本 {current} -> {self.SCHEMA_VERSION}")
+    
+    def _migrate_base_schema(self, cursor: sqlite3.Cursor):
+        """版本 1：剪贴板历史表和后台回填任务表"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clipboard_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content TEXT NOT NULL,
+                content_type TEXT DEFAULT 'text',
+                content_hash TEXT UNIQUE,
+                timestamp INTEGER DEFAULT (CAST(ROUND((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+                size INTEGER DEFAULT 0,
+                is_favorite BOOLEAN DEFAULT 0,
+                metadata TEXT DEFAULT '{}'
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_type ON clipboard_history(content_type)')
+        
+        # 每个回填任务记录处理到的位置，中断后从该位置继续；end_id 之后的记录写入时已是新格式
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_backfills (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                end_id INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+    
+    def _migrate_storage_columns(self, cursor: sqlite3.Cursor):
+        """版本 2：外部存储、压缩和列表显示字段，旧记录的显示字段由后台回填"""
+        self._ensure_columns(cursor, 'clipboard_history', {
+            'blob_hash': 'TEXT',
+            'preview': 'TEXT',
+            'content_z': 'BLOB',
+            'zdict_version': 'INTEGER',
+            'byte_size': 'INTEGER',
+            'line_count': 'INTEGER',
+            'display': 'TEXT'
+        })
+        
+        # 压缩字典，按版本保存，旧版本保留用于解压历史记录
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS compression_dicts (
+                version INTEGER PRIMARY KEY,
+                dictionary BLOB NOT NULL,
+                sample_count INTEGER DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self._schedule_backfill(cursor, 'display_columns')
+    
+    def _migrate_content_digests(self, cursor: sqlite3.Cursor):
+        """版本 3：去重改用二进制 BLAKE2b 摘要上的唯一索引（UPSERT 的冲突目标）
+        
+        摘要无法由旧的 MD5 换算，需读取正文重新计算，由后台回填。
+        """
+        self._ensure_columns(cursor, 'clipboard_history', {'digest': 'BLOB'})
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_digest ON clipboard_history(digest)')
+        cursor.execute('DROP INDEX IF EXISTS idx_content_hash')
+        self._schedule_backfill(cursor, 'content_digests')
+    
+    def _migrate_near_duplicates(self, cursor: sqlite3.Cursor):
+        """版本 4：近似重复检测的指纹和分组字段，旧记录的指纹由后台回填"""
+        self._ensure_columns(cursor, 'clipboard_history', {
+            'norm_digest': 'BLOB',
+            'simhash': 'INTEGER',
+            'group_id': 'INTEGER',
+            'collapsed': 'INTEGER DEFAULT 0',
+            'near_dups': 'INTEGER DEFAULT 0'
+        })
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_norm_digest ON clipboard_history(norm_digest)')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_group ON clipboard_history(group_id) WHERE group_id IS NOT NULL'
+        )
+        self._schedule_backfill(cursor, 'fingerprints')
+    
+    def _migrate_list_index(self, cursor: sqlite3.Cursor):
+        """版本 5：列表查询的覆盖索引，按时间倒序翻页只读索引，不触及存放正文的表页"""
+        cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'idx_history_list'")
+        row = cursor.fetchone()
+        if row and 'near_dups' not in row[0]:
+            cursor.execute('DROP INDEX idx_history_list')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_history_list ON clipboard_history(
+                timestamp, id, content_type, size, is_favorite, line_count, display, collapsed, near_dups
+            )
+        ''')
+        cursor.execute('DROP INDEX IF EXISTS idx_timestamp')
+    
+    def _migrate_partitions(self, cursor: sqlite3.Cursor):
+        """版本 6：归档分区清单，记录每个月份分区的文件、ID 和时间范围及汇总统计
+        
+        查询按时间范围和 ID 范围筛选分区，统计直接读取汇总，无需附加分区文件。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS partitions (
+                month TEXT PRIMARY KEY,
+                file_name TEXT NOT NULL,
+                min_id INTEGER,
+                max_id INTEGER,
+                min_ts INTEGER,
+                max_ts INTEGER,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                stats TEXT NOT NULL DEFAULT '{}',
+                sealed INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+    
+    # UTC 文本时间（'YYYY-MM-DD HH:MM:SS'）换算为 Unix 毫秒的 SQL 表达式
+    _TEXT_TO_EPOCH_MS = "CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+    # 同时接受 Unix 毫秒和旧的 UTC 文本的取值表达式，用于换算完成前的查询和触发器
+    _EPOCH_MS_SQL = "CASE WHEN typeof({column}) = 'text' THEN " + _TEXT_TO_EPOCH_MS + " ELSE {column} END"
+    
+    def _migrate_epoch_timestamps(self, cursor: sqlite3.Cursor):
+        """版本 7：时间戳由 UTC 文本改为整数 Unix 毫秒，范围查询、排序和清理直接比较整数
+        
+        已有记录交给后台回填分批换算，不阻塞启动；主表换算完后由收尾步骤继续换算
+        已有的归档分区文件。换算完成前查询和日期统计触发器按两种格式取值。
+        分区清单每月只有一行，在本步直接换算。
+        """
+        # 版本 6 的清单以文本保存时间范围，按新定义重建后换算
+        cursor.execute('PRAGMA table_info(partitions)')
+        if any(row[1] == 'min_ts' and row[2] == 'TEXT' for row in cursor.fetchall()):
+            cursor.execute('ALTER TABLE partitions RENAME TO partitions_v6')
+            self._migrate_partitions(cursor)
+            cursor.execute(f'''
+                INSERT INTO partitions (month, file_name, min_id, max_id, min_ts, max_ts, row_count, stats, sealed)
+                SELECT month, file_name, min_id, max_id, {self._TEXT_TO_EPOCH_MS.format(column='min_ts')},
+                       {self._TEXT_TO_EPOCH_MS.format(column='max_ts')}, row_count, stats, sealed
+                FROM partitions_v6
+            ''')
+            cursor.execute('DROP TABLE partitions_v6')
+        
+        self._schedule_backfill(cursor, 'epoch_timestamps')
+        # 主库没有记录时归档分区仍需换算
+        cursor.execute('''
+            INSERT OR IGNORE INTO schema_backfills (name)
+            SELECT 'epoch_timestamps' WHERE EXISTS (SELECT 1 FROM partitions)
+        ''')
+    
+    def _migrate_tags(self, cursor: sqlite3.Cursor):
+        """版本 8：标签表和记录-标签关联表
+        
+        关联表以 (tag_id, entry_id) 为主键且不带 rowid，按标签取记录 ID 只读主键索引；
+        反向的 (entry_id, tag_id) 索引用于读取记录的标签和删除记录时清理关联。
+        标签 ID 自增不复用，归档分区中残留的旧标签关联不会误配到新标签上。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE COLLATE NOCASE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS entry_tags (
+                tag_id INTEGER NOT NULL,
+                entry_id INTEGER NOT NULL,
+                PRIMARY KEY (tag_id, entry_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_entry_tags_entry ON entry_tags(entry_id, tag_id)')
+    
+    def _schedule_backfill(self, cursor: sqlite3.Cursor, name: str):
+        """登记回填任务，范围为当前已有的全部记录（没有记录时无需登记）；已登记的任务扩展到新的范围"""
+        cursor.execute('''
+            INSERT INTO schema_backfills (name, last_id, end_id)
+            SELECT ?, 0, MAX(id) FROM clipboard_history WHERE true HAVING MAX(id) IS NOT NULL
+            ON CONFLICT(name) DO UPDATE SET end_id = excluded.end_id
+        ''', (name,))
+    
+    def run_backfill_batch(self) -> bool:
+        """执行一批回填，返回是否还有未完成的任务
+        
+        每批处理一段连续 ID 内需要回填的记录，并在同一事务中推进任务位置。
+        """
+        with self._transaction() as cursor:
+            cursor.execute('SELECT name, last_id, end_id FROM schema_backfills ORDER BY rowid LIMIT 1')
+            row = cursor.fetchone()
+            if row is None:
+                return False
+            name, last_id, end_id = row
+            
+            if name not in self.BACKFILLS:
+                print(f"未知的回填任务，已跳过: {name}")
+                cursor.execute('DELETE FROM schema_backfills WHERE name = ?', (name,))
+                return True
+            condition, method, reads_content = self.BACKFILLS[name]
+            
+            # 跳过 ID 空洞，从下一条实际存在的记录开始取一段
+            cursor.execute('SELECT MIN(id) FROM clipboard_history WHERE id > ?', (last_id,))
+            first_id = cursor.fetchone()[0]
+            if first_id is None or first_id > end_id:
+                finalizer = self.BACKFILL_FINALIZERS.get(name)
+                if finalizer and getattr(self, finalizer)(cursor):
+                    return True
+                cursor.execute('DELETE FROM schema_backfills WHERE name = ?', (name,))
+                print(f"后台回填完成: {name}")
+                return True
+            
+            upper = min(first_id + self.backfill_batch_size - 1, end_id)
+            stored_columns = 'content, blob_hash, content_z, zdict_version' if reads_content else 'NULL'
+            cursor.execute(f'''
+                SELECT id, {stored_columns} FROM clipboard_history
+                WHERE id BETWEEN ? AND ? AND ({condition})
+                ORDER BY id
+            ''', (first_id, upper))
+            rows = [(entry_id, self._resolve_content(*stored) if reads_content else None)
+                    for entry_id, *stored in cursor.fetchall()]
+            if rows:
+                getattr(self, method)(cursor, rows)
+            cursor.execute('UPDATE schema_backfills SET last_id = ? WHERE name = ?', (upper, name))
+        
+        return True
+    
+    def start_backfill(self):
+        """有未完成的回填任务时启动后台线程分批处理"""
+        if self.backfill_thread is not None and self.backfill_thread.is_alive():
+            return
+        
+        conn = self._get_connection()
+        if conn.execute('SELECT COUNT(*) FROM schema_backfills').fetchone()[0] == 0:
+            return
+        
+        self._backfill_stop.clear()
+        self.backfill_thread = threading.Thread(target=self._backfill_loop, name="SchemaBackfill", daemon=True)
+        self.backfill_thread.start()
+        print("后台回填已启动")
+    
+    def _backfill_loop(self):
+        """后台回填循环：每批之间暂停片刻，让出写锁给剪贴板写入"""
+        try:
+            while not self._backfill_stop.is_set():
+                if not self.run_backfill_batch():
+                    break
+                self._backfill_stop.wait(self.backfill_pause_ms / 1000.0)
+        except Exception as e:
+            # 任务位置已随每批提交，下次启动从中断处继续
+            print(f"后台回填失败: {e}")
+        finally:
+            self.release_connection()
+    
+    @staticmethod
+    def _ensure_columns(cursor: sqlite3.Cursor, table: str, columns: Dict[str, str]):
+        """为已存在的表补充缺失的列"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, declaration in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {declaration}')
+    
+    def _init_blob_refs(self, cursor: sqlite3.Cursor):
+        """创建外部内容的引用计数表，由触发器随记录增删维护"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blob_refs (
+                blob_hash TEXT PRIMARY KEY,
+                size INTEGER DEFAULT 0,
+                refcount INTEGER DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS blob_refs_insert AFTER INSERT ON clipboard_history
+            WHEN new.blob_hash IS NOT NULL
+            BEGIN
+                INSERT INTO blob_refs(blob_hash, size, refcount) VALUES (new.blob_hash, new.size, 1)
+                ON CONFLICT(blob_hash) DO UPDATE SET refcount = refcount + 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS blob_refs_delete AFTER DELETE ON clipboard_history
+            WHEN old.blob_hash IS NOT NULL
+            BEGIN
+                UPDATE blob_refs SET refcount = refcount - 1 WHERE blob_hash = old.blob_hash;
+            END
+        ''')
+    
+    # 触发器维护的计数器名称，按类型的计数以 'type:' 为前缀
+    _COUNTER_NAMES = ('row_count', 'favorite_count', 'total_bytes',
+                      'compressed_count', 'compressed_raw_bytes', 'compressed_bytes')
+    
+    def _init_counters(self, cursor: sqlite3.Cursor):
+        """创建计数器表和按天汇总表，由触发器随增删、收藏和时间戳变化维护
+        
+        统计信息因此只需按主键读取几行，无需 COUNT(*) 全表扫描。
+        日期按本地时间归档，与界面显示的"今日"一致。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS storage_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                day TEXT PRIMARY KEY,
+                entry_count INTEGER NOT NULL DEFAULT 0,
+                byte_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # 触发器定义随版本变化，每次启动重建
+        for trigger in ('storage_counters_insert', 'storage_counters_delete',
+                        'storage_counters_favorite', 'storage_counters_timestamp'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        
+        # 各计数器在同一条 UPDATE 中按名称分别累加
+        def counter_update(row: str, sign: str) -> str:
+            return f'''
+                UPDATE storage_counters SET value = value {sign} CASE name
+                    WHEN 'row_count' THEN 1
+                    WHEN 'favorite_count' THEN {row}.is_favorite != 0
+                    WHEN 'total_bytes' THEN COALESCE({row}.byte_size, {row}.size, 0)
+                    WHEN 'compressed_count' THEN {row}.content_z IS NOT NULL
+                    WHEN 'compressed_raw_bytes' THEN CASE WHEN {row}.content_z IS NOT NULL
+                        THEN COALESCE({row}.byte_size, 0) ELSE 0 END
+                    WHEN 'compressed_bytes' THEN COALESCE(LENGTH({row}.content_z), 0)
+                END
+                WHERE name IN {self._COUNTER_NAMES};
+                INSERT INTO storage_counters (name, value) VALUES ('type:' || {row}.content_type, {sign}1)
+                ON CONFLICT(name) DO UPDATE SET value = value {sign} 1;
+                INSERT INTO daily_stats (day, entry_count, byte_count)
+                VALUES (DATE(({self._EPOCH_MS_SQL.format(column=row + '.timestamp')}) / 1000, 'unixepoch', 'localtime'),
+                        {sign}1, {sign}COALESCE({row}.byte_size, {row}.size, 0))
+                ON CONFLICT(day) DO UPDATE SET
+                    entry_count = entry_count + excluded.entry_count,
+                    byte_count = byte_count + excluded.byte_count;
+            '''
+        
+        cursor.execute(f'''
+            CREATE TRIGGER storage_counters_insert AFTER INSERT ON clipboard_history
+            BEGIN
+                {counter_update('new', '+')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER storage_counters_delete AFTER DELETE ON clipboard_history
+            BEGIN
+                {counter_update('old', '-')}
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER storage_counters_favorite AFTER UPDATE OF is_favorite ON clipboard_history
+            WHEN (old.is_favorite != 0) != (new.is_favorite != 0)
+            BEGIN
+                UPDATE storage_counters SET value = value + CASE WHEN new.is_favorite != 0 THEN 1 ELSE -1 END
+                WHERE name = 'favorite_count';
+            END
+        ''')
+        # 重复内容更新时间戳后，记录从原来的日期移到新的日期；文本时间戳换算为毫秒时日期不变
+        old_day = f"DATE(({self._EPOCH_MS_SQL.format(column='old.timestamp')}) / 1000, 'unixepoch', 'localtime')"
+        new_day = f"DATE(({self._EPOCH_MS_SQL.format(column='new.timestamp')}) / 1000, 'unixepoch', 'localtime')"
+        cursor.execute(f'''
+            CREATE TRIGGER storage_counters_timestamp AFTER UPDATE OF timestamp ON clipboard_history
+            WHEN {old_day} IS NOT {new_day}
+            BEGIN
+                UPDATE daily_stats SET
+                    entry_count = entry_count - 1,
+                    byte_count = byte_count - COALESCE(old.byte_size, old.size, 0)
+                WHERE day = {old_day};
+                INSERT INTO daily_stats (day, entry_count, byte_count)
+                VALUES ({new_day}, 1, COALESCE(new.byte_size, new.size, 0))
+                ON CONFLICT(day) DO UPDATE SET
+                    entry_count = entry_count + 1,
+                    byte_count = byte_count + excluded.byte_count;
+            END
+        ''')
+        
+        # 计数器不完整（新建或旧版本数据库）时从表数据重建
+        cursor.execute(f'SELECT COUNT(*) FROM storage_counters WHERE name IN {self._COUNTER_NAMES}')
+        if cursor.fetchone()[0] < len(self._COUNTER_NAMES):
+            self._rebuild_counters(cursor)
+    
+    def _rebuild_counters(self, cursor: sqlite3.Cursor):
+        """按表中现有数据重新计算全部计数器和按天汇总"""
+        cursor.execute('DELETE FROM storage_counters')
+        cursor.execute('DELETE FROM daily_stats')
+        cursor.execute('''
+            SELECT COUNT(*),
+                   COALESCE(SUM(is_favorite != 0), 0),
+                   COALESCE(SUM(COALESCE(byte_size, size, 0)), 0),
+                   COALESCE(SUM(content_z IS NOT NULL), 0),
+                   COALESCE(SUM(CASE WHEN content_z IS NOT NULL THEN COALESCE(byte_size, 0) ELSE 0 END), 0),
+                   COALESCE(SUM(LENGTH(content_z)), 0)
+            FROM clipboard_history
+        ''')
+        cursor.executemany(
+            'INSERT INTO storage_counters (name, value) VALUES (?, ?)',
+            zip(self._COUNTER_NAMES, cursor.fetchone())
+        )
+        cursor.execute('''
+            INSERT INTO storage_counters (name, value)
+            SELECT 'type:' || content_type, COUNT(*) FROM clipboard_history GROUP BY content_type
+        ''')
+        cursor.execute(f'''
+            INSERT INTO daily_stats (day, entry_count, byte_count)
+            SELECT DATE(({self._EPOCH_MS_SQL.format(column='timestamp')}) / 1000, 'unixepoch', 'localtime'),
+                   COUNT(*), SUM(COALESCE(byte_size, size, 0))
+            FROM clipboard_history
+            GROUP BY 1
+        ''')
+    
+    def reconcile_statistics(self) -> Dict[str, Tuple[int, int]]:
+        """重建计数器并返回发生偏差的项目 {名称: (原值, 实际值)}
+        
+        触发器在正常使用中保持计数准确；数据库被外部工具修改或
+        由旧版本程序写入后，可调用此方法校正。
+        """
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('SELECT name, value FROM storage_counters')
+                before = dict(cursor.fetchall())
+                cursor.execute("SELECT 'day:' || day, entry_count FROM daily_stats")
+                before.update(cursor.fetchall())
+                
+                self._rebuild_counters(cursor)
+                
+                cursor.execute('SELECT name, value FROM storage_counters')
+                after = dict(cursor.fetchall())
+                cursor.execute("SELECT 'day:' || day, entry_count FROM daily_stats")
+                after.update(cursor.fetchall())
+            
+            drift = {}
+            for name in set(before) | set(after):
+                old_value, new_value = before.get(name, 0), after.get(name, 0)
+                if old_value != new_value:
+                    drift[name] = (old_value, new_value)
+            
+            if drift:
+                print(f"统计计数已校正: {len(drift)} 项存在偏差")
+            return drift
+        
+        except Exception as e:
+            print(f"校正统计计数失败: {e}")
+            return {}
+    
+    def _init_fts(self, cursor: sqlite3.Cursor) -> bool:
+        """创建 FTS5 全文索引及同步触发器，首次创建时登记已有记录的回填"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'clipboard_fts'")
+        exists = cursor.fetchone() is not None
+        
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS clipboard_fts USING fts5(
+                    body,
+                    identifiers,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"当前 SQLite 不支持 FTS5，搜索将使用 LIKE: {e}")
+            return False
+        
+        # 触发器定义随版本变化，每次启动重建
+        for trigger in ('clipboard_fts_insert', 'clipboard_fts_delete', 'clipboard_fts_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        
+        # 外部存储的内容通过 clip_text 读取后再建立索引
+        cursor.execute('''
+            CREATE TRIGGER clipboard_fts_insert AFTER INSERT ON clipboard_history
+            BEGIN
+                INSERT INTO clipboard_fts(rowid, body, identifiers)
+                SELECT new.id, fts_text(text), fts_identifiers(text)
+                FROM (SELECT clip_text(new.content, new.blob_hash, new.content_z, new.zdict_version) AS text);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER clipboard_fts_delete AFTER DELETE ON clipboard_history
+            BEGIN
+                DELETE FROM clipboard_fts WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER clipboard_fts_update AFTER UPDATE OF content, blob_hash, content_z ON clipboard_history
+            BEGIN
+                DELETE FROM clipboard_fts WHERE rowid = old.id;
+                INSERT INTO clipboard_fts(rowid, body, identifiers)
+                SELECT new.id, fts_text(text), fts_identifiers(text)
+                FROM (SELECT clip_text(new.content, new.blob_hash, new.content_z, new.zdict_version) AS text);
+            END
+        ''')
+        
+        if not exists:
+            # 已有记录由后台分批补建索引
+            self._schedule_backfill(cursor, 'fts')
+        
+        return True
+    
+    def _fuzzy_text(self, text: Optional[str]) -> str:
+        """模糊索引的文本：正文开头部分，空白合并为单个空格"""
+        return normalize_content(text[:self.fuzzy_index_chars]) if text else ''
+    
+    def _regexp(self, pattern: Optional[str], text: Optional[str]) -> int:
+        """REGEXP 运算符的实现：text REGEXP pattern
+        
+        超出本线程当前搜索的截止时间后直接返回不匹配，剩余行由进度回调中断。
+        """
+        if pattern is None or text is None:
+            return 0
+        deadline = getattr(self._local, 'regex_deadline', None)
+        if deadline is not None and time.perf_counter() > deadline:
+            return 0
+        regex, _ = compile_regex(pattern)
+        return 1 if regex.search(text, 0, self.regex_max_chars) else 0
+    
+    def _init_trigrams(self, cursor: sqlite3.Cursor) -> bool:
+        """创建模糊搜索的三元组索引及同步触发器，首次创建时登记已有记录的回填
+
+        detail=none 不保存位置信息，体积最小，LIKE 查询仍可用索引筛选候选。
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'clipboard_trigrams'")
+        exists = cursor.fetchone() is not None
+        
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS clipboard_trigrams USING fts5(
+                    text,
+                    tokenize = 'trigram',
+                    detail = none
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"当前 SQLite 不支持 trigram 分词，模糊搜索不可用: {e}")
+            return False
+        
+        for trigger in ('clipboard_trigrams_insert', 'clipboard_trigrams_delete', 'clipboard_trigrams_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        
+        cursor.execute('''
+            CREATE TRIGGER clipboard_trigrams_insert AFTER INSERT ON clipboard_history
+            BEGIN
+                INSERT INTO clipboard_trigrams(rowid, text)
+                VALUES (new.id, fuzzy_text(clip_text(new.content, new.blob_hash, new.content_z, new.zdict_version)));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER clipboard_trigrams_delete AFTER DELETE ON clipboard_history
+            BEGIN
+                DELETE FROM clipboard_trigrams WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER clipboard_trigrams_update AFTER UPDATE OF content, blob_hash, content_z ON clipboard_history
+            BEGIN
+                DELETE FROM clipboard_trigrams WHERE rowid = old.id;
+                INSERT INTO clipboard_trigrams(rowid, text)
+                VALUES (new.id, fuzzy_text(clip_text(new.content, new.blob_hash, new.content_z, new.zdict_version)));
+            END
+        ''')
+        
+        if not exists:
+            self._schedule_backfill(cursor, 'trigrams')
+        
+        return True
+    
+    def _backfill_display_columns(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, Optional[str]]]):
+        """为旧记录补算预览、行数和单行显示文本"""
+        updates = []
+        for entry_id, content in rows:
+            content = content or ''
+            updates.append((make_preview(content), count_lines(content), make_display(content), entry_id))
+        cursor.executemany(
+            'UPDATE clipboard_history SET preview = ?, line_count = ?, display = ? WHERE id = ?',
+            updates
+        )
+    
+    def _backfill_content_digests(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, Optional[str]]]):
+        """将旧记录的十六进制 MD5 哈希转换为二进制 BLAKE2b 摘要
+
+        回填完成前，相同内容可能已按新摘要再次写入；此时旧记录并入新记录（保留收藏标记）后删除。
+        正文已丢失的记录保留原哈希。
+        """
+        for entry_id, content in rows:
+            if content is None:
+                continue
+            digest = self.get_content_hash(content.encode('utf-8'))
+            cursor.execute('SELECT id FROM clipboard_history WHERE digest = ?', (digest,))
+            existing = cursor.fetchone()
+            if existing is None:
+                cursor.execute('UPDATE clipboard_history SET digest = ?, content_hash = NULL WHERE id = ?',
+                               (digest, entry_id))
+                continue
+            
+            cursor.execute('''
+                UPDATE clipboard_history SET is_favorite = 1
+                WHERE id = ? AND EXISTS (SELECT 1 FROM clipboard_history WHERE id = ? AND is_favorite != 0)
+            ''', (existing[0], entry_id))
+            cursor.execute('DELETE FROM clipboard_history WHERE id = ?', (entry_id,))
+    
+    def _backfill_fts(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, Optional[str]]]):
+        """为建立全文索引之前的记录补建索引（先删除，避免与触发器已写入的行重复）"""
+        if not self.fts_enabled:
+            return
+        cursor.executemany('DELETE FROM clipboard_fts WHERE rowid = ?', [(entry_id,) for entry_id, _ in rows])
+        cursor.executemany(
+            'INSERT INTO clipboard_fts(rowid, body, identifiers) VALUES (?, ?, ?)',
+            [(entry_id, fts_text(content), fts_identifiers(content)) for entry_id, content in rows]
+        )
+    
+    def _backfill_trigrams(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, Optional[str]]]):
+        """为建立模糊索引之前的记录补建索引"""
+        if not self.fuzzy_enabled:
+            return
+        cursor.executemany('DELETE FROM clipboard_trigrams WHERE rowid = ?', [(entry_id,) for entry_id, _ in rows])
+        cursor.executemany(
+            'INSERT INTO clipboard_trigrams(rowid, text) VALUES (?, ?)',
+            [(entry_id, self._fuzzy_text(content)) for entry_id, content in rows]
+        )
+    
+    def _init_tags(self, cursor: sqlite3.Cursor):
+        """创建删除记录时清理标签关联的触发器"""
+        cursor.execute('DROP TRIGGER IF EXISTS entry_tags_delete')
+        cursor.execute('''
+            CREATE TRIGGER entry_tags_delete AFTER DELETE ON clipboard_history
+            BEGIN
+                DELETE FROM entry_tags WHERE entry_id = old.id;
+            END
+        ''')
+    
+    def _init_near_duplicates(self, cursor: sqlite3.Cursor):
+        """创建 SimHash 分段索引表，以及维护分段索引和近似重复分组的触发器
+        
+        每条有指纹的记录在 simhash_bands 中按段各占一行，查找时按段精确匹配。
+        分组中只有最新一条（组头）显示在列表中，其余成员标记为 collapsed，
+        组头的 near_dups 记录被折叠的条数。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS simhash_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                entry_id INTEGER NOT NULL,
+                PRIMARY KEY (band, value, entry_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # 触发器定义随版本变化，每次启动重建
+        for trigger in ('simhash_bands_insert', 'simhash_bands_delete', 'simhash_bands_update',
+                        'near_dup_group_delete_head', 'near_dup_group_delete_member'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        
+        mask = (1 << SIMHASH_BAND_BITS) - 1
+        bands = ' UNION ALL '.join(f'SELECT {band} AS band' for band in range(SIMHASH_BANDS))
+        insert_bands = f'''
+            INSERT INTO simhash_bands (band, value, entry_id)
+            SELECT band, (new.simhash >> (band * {SIMHASH_BAND_BITS})) & {mask}, new.id
+            FROM ({bands}) WHERE new.simhash IS NOT NULL;
+        '''
+        delete_bands = ''.join(
+            f'''
+            DELETE FROM simhash_bands
+            WHERE band = {band} AND value = (old.simhash >> {band * SIMHASH_BAND_BITS}) & {mask} AND entry_id = old.id;
+            '''
+            for band in range(SIMHASH_BANDS)
+        )
+        
+        cursor.execute(f'''
+            CREATE TRIGGER simhash_bands_insert AFTER INSERT ON clipboard_history
+            WHEN new.simhash IS NOT NULL
+            BEGIN
+                {insert_bands}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER simhash_bands_delete AFTER DELETE ON clipboard_history
+            WHEN old.simhash IS NOT NULL
+            BEGIN
+                {delete_bands}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER simhash_bands_update AFTER UPDATE OF simhash ON clipboard_history
+            BEGIN
+                {delete_bands}
+                {insert_bands}
+            END
+        ''')
+        
+        # 删除组头时由最新的成员接任；删除成员时组头的折叠计数减一
+        cursor.execute('''
+            CREATE TRIGGER near_dup_group_delete_head AFTER DELETE ON clipboard_history
+            WHEN old.group_id IS NOT NULL AND old.collapsed = 0
+            BEGIN
+                UPDATE clipboard_history SET collapsed = 0, near_dups = MAX(old.near_dups - 1, 0)
+                WHERE id = (SELECT MAX(id) FROM clipboard_history WHERE group_id = old.group_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER near_dup_group_delete_member AFTER DELETE ON clipboard_history
+            WHEN old.group_id IS NOT NULL AND old.collapsed = 1
+            BEGIN
+                UPDATE clipboard_history SET near_dups = MAX(near_dups - 1, 0)
+                WHERE group_id = old.group_id AND collapsed = 0;
+            END
+        ''')
+    
+    def _backfill_fingerprints(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, Optional[str]]]):
+        """为旧记录补算归一化摘要和 SimHash 指纹（分段索引由触发器同步）"""
+        updates = []
+        for entry_id, content in rows:
+            if content is not None:
+                normalized = normalize_content(content)
+                updates.append((self.get_content_hash(normalized.encode('utf-8')), compute_simhash(normalized), entry_id))
+        cursor.executemany(
+            'UPDATE clipboard_history SET norm_digest = ?, simhash = ? WHERE id = ?',
+            updates
+        )
+    
+    def _backfill_epoch_timestamps(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, Optional[str]]]):
+        """将一批记录的 UTC 文本时间戳换算为 Unix 毫秒（日期统计触发器按两种格式取日期，换算前后归属同一天）"""
+        cursor.executemany(
+            f"UPDATE clipboard_history SET timestamp = {self._TEXT_TO_EPOCH_MS.format(column='timestamp')} WHERE id = ?",
+            [(entry_id,) for entry_id, _ in rows]
+        )
+    
+    def _finish_epoch_timestamps(self, cursor: sqlite3.Cursor) -> bool:
+        """换算归档分区文件中的一批文本时间戳，返回是否还有剩余；全部完成后查询改回直接使用时间戳列
+        
+        归档文件不在主库事务中，单独连接换算；换算可重复执行，中断后从剩余的记录继续。
+        """
+        cursor.execute('SELECT file_name FROM partitions ORDER BY month')
+        for (file_name,) in cursor.fetchall():
+            path = os.path.join(self.partition_dir, file_name)
+            if not os.path.exists(path):
+                continue
+            archive = sqlite3.connect(path, timeout=self.db_config['busy_timeout'] / 1000.0)
+            try:
+                if archive.execute("SELECT 1 FROM sqlite_master WHERE name = 'clipboard_history'").fetchone() is None:
+                    continue
+                with archive:
+                    converted = archive.execute(f'''
+                        UPDATE clipboard_history SET timestamp = {self._TEXT_TO_EPOCH_MS.format(column='timestamp')}
+                        WHERE id IN (SELECT id FROM clipboard_history WHERE typeof(timestamp) = 'text' LIMIT ?)
+                    ''', (self.backfill_batch_size,)).rowcount
+            finally:
+                archive.close()
+            if converted:
+                return True
+        
+        self.legacy_timestamps = False
+        return False
+    
+    def _load_compression_dicts(self):
+        """加载全部压缩字典，最新版本用于新记录；尚无字典时尝试训练"""
+        rows = self._get_connection().execute(
+            'SELECT version, dictionary FROM compression_dicts ORDER BY version'
+        ).fetchall()
+        for version, dictionary in rows:
+            self._zdicts[version] = bytes(dictionary)
+            self._zdict_version = version
+        
+        if self.compression_enabled and self._zdict_version == 0:
+            self.train_compression_dictionary()
+    
+    def _get_zdict(self, version: int) -> bytes:
+        """获取指定版本的压缩字典（其他连接新训练的版本按需加载）"""
+        dictionary = self._zdicts.get(version)
+        if dictionary is None:
+            row = self._get_connection().execute(
+                'SELECT dictionary FROM compression_dicts WHERE version = ?', (version,)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"压缩字典版本不存在: {version}")
+            dictionary = self._zdicts[version] = bytes(row[0])
+        return dictionary
+    
+    def _compress(self, data: bytes) -> Optional[Tuple[bytes, int]]:
+        """用当前字典压缩内容，压缩收益不足时返回 None"""
+        if not self.compression_enabled or len(data) < self.compression_min_size:
+            return None
+        
+        version = self._zdict_version
+        dictionary = self._zdicts[version]
+        compressor = zlib.compressobj(6, zdict=dictionary) if dictionary else zlib.compressobj(6)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) > len(data) * (1 - self.COMPRESSION_MIN_SAVING):
+            return None
+        return compressed, version
+    
+    def _decompress(self, content_z: bytes, version: int) -> str:
+        """解压内容"""
+        dictionary = self._get_zdict(version)
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return (decompressor.decompress(content_z) + decompressor.flush()).decode('utf-8')
+    
+    def train_compression_dictionary(self, sample_size: int = 2000, dict_size: int = 32768) -> Optional[int]:
+        """从近期历史记录中训练新的压缩字典，返回新版本号
+        
+        统计样本中重复出现的行和词，按 出现次数 × 长度 评分拼接成字典。
+        zlib 优先匹配距离较近的数据，因此得分最高的片段放在字典末尾。
+        已有记录保持原字典版本，新版本只用于之后写入的记录。
+        """
+        try:
+            conn = self._get_connection()
+            rows = conn.execute('''
+                SELECT content, content_z, zdict_version FROM clipboard_history
+                WHERE blob_hash IS NULL
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (sample_size,)).fetchall()
+            
+            samples = [self._resolve_content(content, None, content_z, version) for content, content_z, version in rows]
+            samples = [sample for sample in samples if sample]
+            if len(samples) < self.ZDICT_MIN_SAMPLES:
+                return None
+            
+            # 统计在多个样本中出现的行和词
+            fragments = Counter()
+            for sample in samples:
+                pieces = set(line.strip() for line in sample.splitlines())
+                pieces.update(re.findall(r'\S{4,}', sample))
+                fragments.update(piece for piece in pieces if 4 <= len(piece) <= 256)
+            
+            scored = sorted(
+                ((count * len(piece.encode('utf-8')), piece) for piece, count in fragments.items() if count > 1),
+                reverse=True
+            )
+            chosen, total = [], 0
+            for _, piece in scored:
+                encoded = piece.encode('utf-8') + b'\n'
+                if total + len(encoded) > dict_size:
+                    continue
+                chosen.append(encoded)
+                total += len(encoded)
+            if not chosen:
+                return None
+            
+            dictionary = b''.join(reversed(chosen))
+            with self._transaction() as cursor:
+                cursor.execute(
+                    'INSERT INTO compression_dicts (dictionary, sample_count) VALUES (?, ?)',
+                    (dictionary, len(samples))
+                )
+                version = cursor.lastrowid
+            
+            self._zdicts[version] = dictionary
+            self._zdict_version = version
+            print(f"压缩字典训练完成: 版本 {version}, {len(dictionary)} 字节, {len(samples)} 个样本")
+            return version
+        
+        except Exception as e:
+            print(f"训练压缩字典失败: {e}")
+            return None
+    
+    @staticmethod
+    def get_content_hash(data: bytes) -> bytes:
+        """计算内容的 BLAKE2b 摘要（16 字节二进制），用于去重"""
+        return hashlib.blake2b(data, digest_size=16).digest()
+    
+    # 写入新记录的列顺序，与 _prepare_entry 返回的元组对应
+    _ENTRY_COLUMNS = ('content, content_type, digest, size, metadata, blob_hash, preview, '
+                      'content_z, zdict_version, byte_size, line_count, display, norm_digest, simhash')
+    _ENTRY_PLACEHOLDERS = ', '.join('?' * 14)
+    
+    def _prepare_entry(self, content: str, content_type: str, metadata: dict) -> tuple:
+        """计算一条记录写入主表所需的各列值（须在写事务中调用）
+        
+        正文只编码一次，摘要、字节数和存储都复用同一份 UTF-8 数据。
+        大内容写入外部存储，主表只保留哈希、大小和预览；写入在事务内完成，
+        与垃圾回收串行，避免刚写入的对象被回收。相同内容的对象已存在时
+        put 不会重复写盘。
+        """
+        data = content.encode('utf-8')
+        digest = self.get_content_hash(data)
+        normalized = normalize_content(content)
+        
+        stored_content, blob_hash, content_z, zdict_version = content, None, None, None
+        if 0 < self.blob_threshold <= len(data):
+            blob_hash = self.blob_store.put(data)
+            stored_content = ''
+        else:
+            compressed = self._compress(data)
+            if compressed:
+                content_z, zdict_version = compressed
+                stored_content = ''
+        
+        return (
+            stored_content,
+            content_type,
+            digest,
+            len(content),
+            json.dumps(metadata or {}),
+            blob_hash,
+            make_preview(content),
+            content_z,
+            zdict_version,
+            len(data),
+            count_lines(content),
+            make_display(content),
+            self.get_content_hash(normalized.encode('utf-8')),
+            compute_simhash(normalized)
+        )
+    
+    def _insert_entry(self, cursor: sqlite3.Cursor, content: str, content_type: str, metadata: dict) -> int:
+        """在已打开的写事务中写入一条记录，内容重复时只更新时间戳
+        
+        完全相同的内容由唯一摘要索引上的单条 UPSERT 去重；近似重复的内容
+        按 near_duplicate_policy 合并或折叠。返回被删除的外部存储记录数。
+        """
+        entry = self._prepare_entry(content, content_type, metadata)
+        match = None
+        if self.near_duplicate_policy != 'keep':
+            match = self._find_near_duplicate(cursor, entry[2], entry[12], entry[13])
+        
+        cursor.execute(f'''
+            INSERT INTO clipboard_history ({self._ENTRY_COLUMNS}, timestamp)
+            VALUES ({self._ENTRY_PLACEHOLDERS}, ?)
+            ON CONFLICT(digest) DO UPDATE SET timestamp = excluded.timestamp
+        ''', entry + (now_ms(),))
+        print(f"保存剪贴板记录: {len(content)} 字符")
+        
+        removed_blobs = 0
+        if match is not None:
+            # UPSERT 走更新分支时 lastrowid 仍是此前插入的行，按摘要取实际写入的记录
+            cursor.execute('SELECT id FROM clipboard_history WHERE digest = ?', (entry[2],))
+            entry_id = cursor.fetchone()[0]
+            if entry_id != match[0]:
+                removed_blobs = self._resolve_near_duplicate(cursor, entry_id, match)
+        return removed_blobs + self._evict_overflow(cursor)
+    
+    def _find_near_duplicate(self, cursor: sqlite3.Cursor, digest: bytes, norm_digest: bytes,
+                             fingerprint: Optional[int]) -> Optional[tuple]:
+        """在最近的记录中查找新内容的近似重复
+        
+        先按归一化摘要查找只有空白差异的记录，再通过 SimHash 分段索引取候选并校验
+        汉明距离，两者都只考虑最近 near_duplicate_window 条记录。返回匹配记录的
+        (id, group_id, collapsed, near_dups, is_favorite, 是否外部存储)；
+        存在完全相同的记录（交给 UPSERT 处理，不受窗口限制）或没有近似记录时返回 None。
+        完全相同的记录按摘要查找，不依赖归一化摘要和指纹：升级后回填完成前这两列可能为空。
+        """
+        cursor.execute('SELECT id, group_id, collapsed FROM clipboard_history WHERE digest = ?', (digest,))
+        row = cursor.fetchone()
+        if row is not None:
+            # 再次复制了组内已折叠的内容时，让它重新成为组头
+            if row[2]:
+                self._promote_group_member(cursor, row[0], row[1])
+            return None
+        
+        cursor.execute('SELECT MAX(id) FROM clipboard_history')
+        min_id = (cursor.fetchone()[0] or 0) - self.near_duplicate_window
+        
+        cursor.execute('''
+            SELECT id FROM clipboard_history
+            WHERE norm_digest = ? AND id > ?
+            ORDER BY id DESC
+            LIMIT 1
+        ''', (norm_digest, min_id))
+        row = cursor.fetchone()
+        if row is not None:
+            match_id = row[0]
+        elif fingerprint is not None:
+            lookups = ' UNION '.join(
+                'SELECT entry_id FROM simhash_bands WHERE band = ? AND value = ? AND entry_id > ?'
+                for _ in range(SIMHASH_BANDS)
+            )
+            params = []
+            for band, value in enumerate(simhash_bands(fingerprint)):
+                params.extend((band, value, min_id))
+            cursor.execute(f'SELECT id, simhash FROM clipboard_history WHERE id IN ({lookups})', params)
+            
+            candidates = [
+                (hamming_distance(fingerprint, candidate_hash), -candidate_id)
+                for candidate_id, candidate_hash in cursor.fetchall()
+            ]
+            candidates = [candidate for candidate in candidates if candidate[0] <= self.near_duplicate_distance]
+            if not candidates:
+                return None
+            match_id = -min(candidates)[1]
+        else:
+            return None
+        
+        cursor.execute('''
+            SELECT id, group_id, collapsed, near_dups, is_favorite, blob_hash IS NOT NULL
+            FROM clipboard_history WHERE id = ?
+        ''', (match_id,))
+        return cursor.fetchone()
+    
+    def _promote_group_member(self, cursor: sqlite3.Cursor, entry_id: int, group_id: int):
+        """将组内已折叠的成员设为组头，原组头折叠"""
+        cursor.execute(
+            'SELECT id, near_dups FROM clipboard_history WHERE group_id = ? AND collapsed = 0',
+            (group_id,)
+        )
+        head = cursor.fetchone()
+        near_dups = 0
+        if head is not None:
+            near_dups = head[1]
+            cursor.execute('UPDATE clipboard_history SET collapsed = 1, near_dups = 0 WHERE id = ?', (head[0],))
+        cursor.execute(
+            'UPDATE clipboard_history SET collapsed = 0, near_dups = ? WHERE id = ?',
+            (near_dups, entry_id)
+        )
+    
+    def _resolve_near_duplicate(self, cursor: sqlite3.Cursor, new_id: int, match: tuple) -> int:
+        """按策略处理新记录与近似重复记录的关系，返回被删除的外部存储记录数
+        
+        merge：新记录取代旧记录（保留收藏状态和标签）；
+        link：新记录成为组头，原组头折叠到组内，列表中只显示一行并附带组内条数。
+        """
+        match_id, group_id, collapsed, near_dups, is_favorite, has_blob = match
+        
+        if self.near_duplicate_policy == 'merge':
+            if is_favorite:
+                cursor.execute('UPDATE clipboard_history SET is_favorite = 1 WHERE id = ?', (new_id,))
+            cursor.execute(
+                'INSERT OR IGNORE INTO entry_tags (tag_id, entry_id) SELECT tag_id, ? FROM entry_tags WHERE entry_id = ?',
+                (new_id, match_id)
+            )
+            cursor.execute('DELETE FROM clipboard_history WHERE id = ?', (match_id,))
+            print(f"合并近似重复记录: ID {match_id} -> ID {new_id}")
+            return int(has_blob)
+        
+        # 匹配到的是已折叠的成员时，实际被替换的是该组当前的组头
+        head_id = match_id
+        if collapsed:
+            cursor.execute(
+                'SELECT id, near_dups FROM clipboard_history WHERE group_id = ? AND collapsed = 0',
+                (group_id,)
+            )
+            head = cursor.fetchone()
+            if head is not None:
+                head_id, near_dups = head
+        
+        root_id = group_id or head_id
+        cursor.execute(
+            'UPDATE clipboard_history SET collapsed = 1, group_id = ?, near_dups = 0 WHERE id = ?',
+            (root_id, head_id)
+        )
+        cursor.execute(
+            'UPDATE clipboard_history SET group_id = ?, near_dups = ? WHERE id = ?',
+            (root_id, near_dups + 1, new_id)
+        )
+        print(f"折叠近似重复记录: ID {head_id} 并入 ID {new_id} 所在的组")
+        return 0
+    
+    def import_entries(self, entries: List[Tuple[str, str, dict, Optional[int], bool]]) -> int:
+        """在单个事务中批量导入记录，返回新增的条数
+        
+        entries 为 (content, content_type, metadata, timestamp, is_favorite) 元组列表，
+        timestamp 为 Unix 毫秒时间戳，为 None 时使用当前时间。与已有记录内容重复时保留较新的时间戳，
+        任一方为收藏则保持收藏。导入不触发记录数上限淘汰，整个文件导入完成后由
+        ClipboardImporter 调用 evict_overflow 一次淘汰到上限以内。
+        """
+        rows = []
+        imported_at = now_ms()
+        with self._transaction() as cursor:
+            for content, content_type, metadata, timestamp, is_favorite in entries:
+                timestamp = imported_at if timestamp is None else timestamp
+                rows.append(self._prepare_entry(content, content_type, metadata) + (timestamp, int(bool(is_favorite))))
+            
+            cursor.execute("SELECT value FROM storage_counters WHERE name = 'row_count'")
+            before = cursor.fetchone()[0]
+            cursor.executemany(f'''
+                INSERT INTO clipboard_history ({self._ENTRY_COLUMNS}, timestamp, is_favorite)
+                VALUES ({self._ENTRY_PLACEHOLDERS}, ?, ?)
+                ON CONFLICT(digest) DO UPDATE SET
+                    timestamp = MAX({self._EPOCH_MS_SQL.format(column='timestamp')}, excluded.timestamp),
+                    is_favorite = is_favorite OR excluded.is_favorite
+            ''', rows)
+            cursor.execute("SELECT value FROM storage_counters WHERE name = 'row_count'")
+            return cursor.fetchone()[0] - before
+    
+    def _count_overflow(self, cursor: sqlite3.Cursor) -> int:
+        """非收藏记录（当前分区和全部归档分区合计）超出 max_entries 的条数，未超出时为 0 或负数"""
+        cursor.execute('''
+            SELECT (SELECT value FROM storage_counters WHERE name = 'row_count')
+                 - (SELECT value FROM storage_counters WHERE name = 'favorite_count')
+                 + (SELECT COALESCE(SUM(row_count), 0) FROM partitions)
+        ''')
+        return cursor.fetchone()[0] - self.max_entries
+    
+    def _evict_overflow(self, cursor: sqlite3.Cursor) -> int:
+        """记录数超过上限时淘汰最旧的非收藏记录，返回其中引用外部存储的条数
+        
+        max_entries 限制的是当前分区和归档分区合计的非收藏记录数，收藏不计入也不淘汰。
+        每次最多删除 eviction_batch_size 条，单次写入的开销有上限；
+        上限调低后多出的记录会在后续写入中逐批淘汰。归档分区中的记录更旧，应先淘汰，
+        而附加分区不能在事务中进行，有归档记录时留给 evict_overflow。时间戳换算完成前
+        无法按时间走索引找出最旧的记录，暂不淘汰，换算完成后由 evict_overflow 补齐。
+        """
+        if self.max_entries <= 0 or self.legacy_timestamps:
+            return 0
+        
+        excess = self._count_overflow(cursor)
+        if excess <= 0:
+            return 0
+        cursor.execute('SELECT 1 FROM partitions WHERE row_count > 0 LIMIT 1')
+        if cursor.fetchone():
+            return 0
+        
+        cursor.execute('''
+            SELECT id, blob_hash IS NOT NULL FROM clipboard_history
+            WHERE is_favorite = 0
+            ORDER BY timestamp, id
+            LIMIT ?
+        ''', (min(excess, self.eviction_batch_size),))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        
+        cursor.executemany('DELETE FROM clipboard_history WHERE id = ?', [(row[0],) for row in rows])
+        print(f"超出记录上限，淘汰旧记录: {len(rows)} 条")
+        return sum(row[1] for row in rows)
+    
+    def evict_overflow(self, time_budget_ms: Optional[int] = None) -> int:
+        """将非收藏记录淘汰到 max_entries 以内，返回删除的条数
+        
+        先按月份从旧到新淘汰归档分区：整个分区都在超出范围内时直接删除文件，否则分批删除
+        其中最旧的记录后压缩；仍超出时再按 eviction_batch_size 条分批淘汰当前分区。
+        导入完成后和清理任务中调用；给定 time_budget_ms 时超出预算即停止，剩余的留待下次。
+        """
+        if self.max_entries <= 0 or self.legacy_timestamps:
+            return 0
+        
+        try:
+            conn = self._get_connection()
+            deadline = time.monotonic() + time_budget_ms / 1000.0 if time_budget_ms else None
+            
+            removed = 0
+            for month, file_name, _, _, _, _, row_count in reversed(self._list_partitions()):
+                excess = self._count_overflow(conn.cursor())
+                if excess <= 0:
+                    break
+                if row_count <= excess:
+                    self._drop_partition(month, file_name)
+                    removed += row_count
+                    continue
+                
+                alias = self._attach_partition(month, file_name)
+                while excess > 0:
+                    with self._transaction() as cursor:
+                        cursor.execute(f'''
+                            DELETE FROM {alias}.clipboard_history WHERE id IN (
+                                SELECT id FROM {alias}.clipboard_history
+                                ORDER BY timestamp, id
+                                LIMIT ?
+                            )
+                        ''', (min(excess, self.cleanup_chunk_size),))
+                        chunk = cursor.rowcount
+                        self._regroup_partition(cursor, alias)
+                        self._refresh_partition(cursor, alias)
+                    removed += chunk
+                    excess -= chunk
+                    if chunk == 0 or (deadline is not None and time.monotonic() >= deadline):
+                        break
+                self._seal_partition(month)
+                break
+            
+            while deadline is None or time.monotonic() < deadline:
+                with self._transaction() as cursor:
+                    before = self._count_overflow(cursor)
+                    self._evict_overflow(cursor)
+                    evicted = before - self._count_overflow(cursor)
+                removed += evicted
+                if evicted == 0:
+                    break
+            
+            if removed:
+                self.collect_blob_garbage()
+            return removed
+        
+        except Exception as e:
+            print(f"淘汰超出上限的记录失败: {e}")
+            return 0
+    
+    def add_clipboard_entry(self, content: str, content_type: str = 'text', metadata: dict = None) -> bool:
+        """添加剪贴板记录到数据库"""
+        if not content or not content.strip():
+            return False
+        
+        try:
+            with self._transaction() as cursor:
+                evicted_blobs = self._insert_entry(cursor, content, content_type, metadata)
+            
+            if evicted_blobs:
+                self.collect_blob_garbage()
+            return True
+        
+        except Exception as e:
+            print(f"添加剪贴板记录失败: {e}")
+            return False
+    
+    def add_clipboard_entries(self, entries: List[Tuple[str, str, dict]]) -> int:
+        """在单个事务中批量添加记录，返回成功写入的条数
+        
+        entries 为 (content, content_type, metadata) 元组列表。整批提交失败时
+        逐条重试，避免一条坏数据拖累同批的其他记录。
+        """
+        entries = [entry for entry in entries if entry[0] and entry[0].strip()]
+        if not entries:
+            return 0
+        
+        try:
+            evicted_blobs = 0
+            with self._transaction() as cursor:
+                for content, content_type, metadata in entries:
+                    evicted_blobs += self._insert_entry(cursor, content, content_type, metadata)
+            
+            if evicted_blobs:
+                self.collect_blob_garbage()
+            return len(entries)
+        
+        except Exception as e:
+            print(f"批量添加剪贴板记录失败，改为逐条写入: {e}")
+            return sum(1 for entry in entries if self.add_clipboard_entry(*entry))
+    
+    def start_writer(self, on_committed: Optional[Callable[[List[Tuple[str, str, dict]]], None]] = None):
+        """启动后台写入线程，之后可通过 enqueue_clipboard_entry 异步写入"""
+        if self.writer is None:
+            self.writer = self._create_writer(on_committed)
+            self.writer.start()
+        return self.writer
+    
+    def _create_writer(self, on_committed: Optional[Callable[[List[Tuple[str, str, dict]]], None]]) -> 'ClipboardWriter':
+        """按配置创建（尚未启动的）写入线程"""
+        config = self.db_config
+        return ClipboardWriter(
+            self,
+            batch_size=config.get('write_batch_size', 64),
+            flush_interval_ms=config.get('write_flush_interval_ms', 200),
+            queue_size=config.get('write_queue_size', 1000),
+            on_committed=on_committed
+        )
+    
+    def enqueue_clipboard_entry(self, content: str, content_type: str = 'text', metadata: dict = None) -> bool:
+        """将记录交给后台写入线程（队列满时丢弃并返回 False）；未启动写入线程时直接同步写入"""
+        if not content or not content.strip():
+            return False
+        
+        if self.writer is None:
+            return self.add_clipboard_entry(content, content_type, metadata)
+        return self.writer.submit(content, content_type, metadata or {})
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待写入队列中已提交的记录全部落盘"""
+        if self.writer is None:
+            return True
+        return self.writer.flush(timeout)
+    
+    # 列表查询只读取覆盖索引中的轻量列，与 _row_to_entry 对应
+    _LIST_FIELDS = ('id', 'content_type', 'timestamp', 'size', 'is_favorite', 'line_count', 'display', 'near_dups')
+    _LIST_COLUMNS = ', '.join(_LIST_FIELDS)
+    _LIST_COLUMNS_H = ', '.join(f'h.{field}' for field in _LIST_FIELDS)
+    
+    def _ts(self, column: str = 'timestamp') -> str:
+        """查询中时间戳列的写法：换算回填完成前同时接受旧的文本格式（无法走索引），之后直接使用列"""
+        return self._EPOCH_MS_SQL.format(column=column) if self.legacy_timestamps else column
+    
+    def _list_columns(self, prefix: str = '') -> str:
+        """列表查询的列，prefix 为空或表别名前缀 'h.'"""
+        if not self.legacy_timestamps:
+            return self._LIST_COLUMNS_H if prefix else self._LIST_COLUMNS
+        return ', '.join(self._ts(prefix + field) if field == 'timestamp' else prefix + field
+                         for field in self._LIST_FIELDS)
+    
+    def _row_to_entry(self, row: tuple, preview: Optional[str] = None) -> ClipEntry:
+        """将列表查询结果行转换为轻量记录（正文和元数据在首次访问时读取）"""
+        return ClipEntry(
+            row[0], row[1], row[2], row[3], bool(row[4]), row[5] or 0,
+            preview if preview is not None else (row[6] or ''),
+            row[7] or 0,
+            storage=self
+        )
+    
+    def _resolve_content(self, content: Optional[str], blob_hash: Optional[str],
+                         content_z: Optional[bytes] = None, zdict_version: Optional[int] = None) -> Optional[str]:
+        """返回记录的完整正文：外部存储的内容从磁盘读取，压缩的内容解压"""
+        if content_z is not None:
+            return self._decompress(content_z, zdict_version or 0)
+        if not blob_hash:
+            return content
+        try:
+            return self.blob_store.get(blob_hash).decode('utf-8')
+        except FileNotFoundError:
+            print(f"外部存储内容缺失: {blob_hash}")
+            return None
+    
+    def _fetch_entry_row(self, select: str, entry_id: int) -> Optional[tuple]:
+        """按 ID 读取一行：先查当前分区，未找到时再查 ID 范围覆盖该记录的归档分区
+        
+        select 中的 {schema} 替换为分区的模式名，记录 ID 为唯一的参数。
+        """
+        conn = self._get_connection()
+        row = conn.execute(select.format(schema='main'), (entry_id,)).fetchone()
+        if row is None:
+            schema = self._find_archived(entry_id)
+            if schema is not None:
+                row = conn.execute(select.format(schema=schema), (entry_id,)).fetchone()
+        return row
+    
+    def get_entry_content(self, entry_id: int) -> Optional[str]:
+        """按 ID 读取记录的完整正文"""
+        try:
+            row = self._fetch_entry_row(
+                'SELECT content, blob_hash, content_z, zdict_version FROM {schema}.clipboard_history WHERE id = ?',
+                entry_id
+            )
+            return self._resolve_content(*row) if row else None
+        
+        except Exception as e:
+            print(f"读取记录内容失败: {e}")
+            return None
+    
+    def open_entry_content(self, entry_id: int, binary: bool = False, chunk_size: Optional[int] = None):
+        """以只读文件对象分块读取记录正文，内存占用只与块大小有关；记录不存在或正文丢失时返回 None
+        
+        默认返回文本流（不转换换行符），binary 时返回 UTF-8 字节流。库中的正文通过增量 blob I/O
+        （Python 3.11+ 的 Connection.blobopen，更早的版本按字节偏移分段查询）读取，
+        压缩的正文边读边解压，外部存储的正文直接读文件。读取须在当前线程进行，
+        用完后关闭（支持 with）；打开期间所在分区无法分离。
+        """
+        chunk_size = chunk_size or self.stream_chunk_size
+        try:
+            conn = self._get_connection()
+            select = 'SELECT content_z IS NOT NULL, zdict_version, blob_hash FROM {schema}.clipboard_history WHERE id = ?'
+            schema = 'main'
+            row = conn.execute(select.format(schema=schema), (entry_id,)).fetchone()
+            if row is None:
+                schema = self._find_archived(entry_id)
+                if schema is None:
+                    return None
+                row = conn.execute(select.format(schema=schema), (entry_id,)).fetchone()
+            
+            compressed, zdict_version, blob_hash = row
+            if compressed:
+                chunks = self._iter_decompressed(
+                    self._iter_column_bytes(conn, schema, 'content_z', entry_id, chunk_size),
+                    zdict_version or 0, chunk_size
+                )
+            elif blob_hash:
+                try:
+                    f = open(self.blob_store.path_for(blob_hash), 'rb')
+                except FileNotFoundError:
+                    print(f"外部存储内容缺失: {blob_hash}")
+                    return None
+                chunks = self._iter_file(f, chunk_size)
+            else:
+                chunks = self._iter_column_bytes(conn, schema, 'content', entry_id, chunk_size)
+            
+            stream = io.BufferedReader(ContentReader(chunks), chunk_size)
+            return stream if binary else io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        
+        except Exception as e:
+            print(f"打开记录内容失败: {e}")
+            return None
+    
+    @staticmethod
+    def _iter_column_bytes(conn: sqlite3.Connection, schema: str, column: str, entry_id: int, chunk_size: int):
+        """分块读取一行中文本或二进制列的原始字节（文本为 UTF-8 编码）"""
+        if hasattr(conn, 'blobopen'):
+            with conn.blobopen('clipboard_history', column, entry_id, readonly=True, name=schema) as blob:
+                while True:
+                    data = blob.read(chunk_size)
+                    if not data:
+                        return
+                    yield data
+        
+        # Python 3.10 没有 blobopen：按字节偏移逐段取出，每段都是独立的短语句
+        offset = 1
+        while True:
+            row = conn.execute(
+                f'SELECT substr(CAST({column} AS BLOB), ?, ?) FROM {schema}.clipboard_history WHERE id = ?',
+                (offset, chunk_size, entry_id)
+            ).fetchone()
+            if row is None or not row[0]:
+                return
+            yield row[0]
+            offset += len(row[0])
+    
+    def _iter_decompressed(self, chunks, version: int, chunk_size: int):
+        """边读边解压，每次产出不超过 chunk_size 字节"""
+        dictionary = self._get_zdict(version)
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        try:
+            for data in chunks:
+                while data:
+                    output = decompressor.decompress(data, chunk_size)
+                    if output:
+                        yield output
+                    data = decompressor.unconsumed_tail
+            output = decompressor.flush()
+            if output:
+                yield output
+        finally:
+            chunks.close()
+    
+    @staticmethod
+    def _iter_file(f, chunk_size: int):
+        with f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    return
+                yield data
+    
+    def hash_entry_content(self, entry_id: int) -> Optional[bytes]:
+        """分块计算记录正文的摘要，与写入时用于去重的 get_content_hash 结果一致"""
+        stream = self.open_entry_content(entry_id, binary=True)
+        if stream is None:
+            return None
+        
+        try:
+            digest = hashlib.blake2b(digest_size=16)
+            with stream:
+                while True:
+                    data = stream.read(self.stream_chunk_size)
+                    if not data:
+                        break
+                    digest.update(data)
+            return digest.digest()
+        
+        except Exception as e:
+            print(f"计算记录摘要失败: {e}")
+            return None
+    
+    def get_entry_metadata(self, entry_id: int) -> Optional[str]:
+        """按 ID 读取记录元数据的原始 JSON"""
+        try:
+            row = self._fetch_entry_row('SELECT metadata FROM {schema}.clipboard_history WHERE id = ?', entry_id)
+            return row[0] if row else None
+        
+        except Exception as e:
+            print(f"读取记录元数据失败: {e}")
+            return None
+    
+    def get_entry(self, entry_id: int) -> Optional[ClipEntry]:
+        """按 ID 读取包含正文和元数据的完整记录"""
+        try:
+            row = self._fetch_entry_row(f'''
+                SELECT id, content_type, {self._ts()}, size, is_favorite, line_count, preview, near_dups,
+                       metadata, content, blob_hash, content_z, zdict_version
+                FROM {schema}.clipboard_history
+                WHERE id = ?
+            ''', entry_id)
+            if row is None:
+                return None
+            
+            entry = self._row_to_entry(row[:8])
+            entry.metadata = row[8]
+            entry.content = self._resolve_content(*row[9:])
+            return entry
+        
+        except Exception as e:
+            print(f"读取记录失败: {e}")
+            return None
+    
+    def get_near_duplicates(self, entry_id: int) -> List[ClipEntry]:
+        """获取与指定记录同组的全部近似重复记录（含组头），按时间倒序
+        
+        分组只在记录所在的分区内查找；跨月的组在归档时按分区各自成组。
+        """
+        try:
+            conn = self._get_connection()
+            schema = 'main'
+            if conn.execute('SELECT 1 FROM clipboard_history WHERE id = ?', (entry_id,)).fetchone() is None:
+                schema = self._find_archived(entry_id)
+                if schema is None:
+                    return []
+            
+            cursor = conn.execute(f'''
+                SELECT {self._list_columns()}
+                FROM {schema}.clipboard_history
+                WHERE group_id = (SELECT group_id FROM {schema}.clipboard_history WHERE id = ?)
+                ORDER BY {self._ts()} DESC, id DESC
+            ''', (entry_id,))
+            return [self._row_to_entry(row) for row in cursor]
+        
+        except Exception as e:
+            print(f"获取近似重复记录失败: {e}")
+            return []
+    
+    @staticmethod
+    def encode_page_token(timestamp: int, entry_id: int) -> str:
+        """将分页位置编码为不透明的续页令牌"""
+        raw = json.dumps([timestamp, entry_id], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+    
+    @staticmethod
+    def decode_page_token(token: str) -> Tuple[int, int]:
+        """解析续页令牌，格式无效时抛出 ValueError"""
+        try:
+            timestamp, entry_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            return int(timestamp), int(entry_id)
+        except Exception as e:
+            raise ValueError(f"无效的分页令牌: {token}") from e
+    
+    def _iter_partitioned(self, columns: str, condition: str, params: list, partitions: List[tuple],
+                          after: Optional[Tuple[int, int]] = None, batch_size: int = 256):
+        """按 (timestamp, id) 倒序合并当前分区和归档分区中符合 condition 的记录
+        
+        每个分区按键集分批读取，每批读完即结束语句，不会有语句在产出期间保持活动，
+        最久未用的分区因此总能被分离。归档分区（月份倒序）的时间范围互不重叠，依次打开即可；
+        当前分区中尚未归档的旧记录（如收藏）与其归并。下一条当前分区记录比某个归档分区的
+        全部记录都新时，不会打开该分区。columns 须以 id 为第 0 列、timestamp 为第 2 列，
+        condition 中的 {schema} 替换为各分区的模式名。
+        """
+        conn = self._get_connection()
+        timestamp = self._ts()
+        
+        def rows_of(schema: str):
+            position = after
+            while True:
+                keyset = f'AND ({timestamp}, id) < (?, ?)' if position else ''
+                rows = conn.execute(f'''
+                    SELECT {columns} FROM {schema}.clipboard_history
+                    WHERE {condition.format(schema=schema)} {keyset}
+                    ORDER BY {timestamp} DESC, id DESC
+                    LIMIT ?
+                ''', params + list(position or ()) + [batch_size]).fetchall()
+                yield from rows
+                if len(rows) < batch_size:
+                    return
+                position = (rows[-1][2], rows[-1][0])
+        
+        current = rows_of('main')
+        current_row = next(current, None)
+        pending = list(partitions)
+        archive, archive_row = None, None
+        while True:
+            while archive_row is None and pending and (current_row is None or current_row[2] <= pending[0][5]):
+                month, file_name = pending.pop(0)[:2]
+                archive = rows_of(self._attach_partition(month, file_name))
+                archive_row = next(archive, None)
+            
+            if current_row is None and archive_row is None:
+                return
+            if archive_row is None or (current_row is not None
+                                       and (current_row[2], current_row[0]) > (archive_row[2], archive_row[0])):
+                yield current_row
+                current_row = next(current, None)
+            else:
+                yield archive_row
+                archive_row = next(archive, None)
+    
+    def get_clipboard_history(self, limit: int = 100, offset: int = 0) -> List[ClipEntry]:
+        """获取剪贴板历史记录（跨当前分区和归档分区）
+        
+        OFFSET 需要逐行跳过，深度翻页请使用 get_history_page。
+        """
+        key = ('history', limit, offset)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
+        try:
+            rows = self._iter_partitioned(self._list_columns(), 'collapsed = 0', [], self._list_partitions(),
+                                          batch_size=max(1, min(offset + limit, 1000)))
+            entries = [self._row_to_entry(row) for row in islice(rows, offset, offset + limit)]
+            return self.query_cache.put(key, generation, entries)
+        
+        except Exception as e:
+            print(f"获取历史记录失败: {e}")
+            return []
+    
+    def get_history_page(self, after: Optional[str] = None, page_size: int = 100,
+                         tags: Optional[List[str]] = None, favorites_only: bool = False,
+                         start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> Tuple[List[ClipEntry], Optional[str]]:
+        """按时间倒序获取一页历史记录（键集分页）
+        
+        after 为上一页返回的续页令牌，为空时从最新记录开始。借助时间戳索引
+        直接定位到上一页最后一行之后，每页开销与翻到第几页无关；翻过当前分区后
+        按月份依次进入归档分区，只会打开令牌位置之前的分区。
+        tags（须同时带有其中全部标签）、favorites_only 和 start / end 可组合筛选，
+        续页时须传入相同的条件。标签条件按标签的常见程度选择走关联表主键还是时间索引，
+        不含这些标签的归档分区不会打开。
+        返回 (记录列表, 下一页令牌)，没有更多记录时令牌为 None。
+        """
+        key = ('page', after, page_size, tuple(tags or ()), favorites_only, start, end)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
+        tag_ids = []
+        if tags:
+            tag_ids = self._find_tag_ids(tags)
+            if tag_ids is None:
+                return self.query_cache.put(key, generation, ([], None))
+        
+        position = self.decode_page_token(after) if after else None
+        start, end = self._epoch_range(start, end)
+        tag_scan = bool(tag_ids) and self._prefer_tag_scan(tag_ids, page_size)
+        condition, params = self._entry_filter(start, end, favorites_only, tag_ids, tag_scan, self._ts())
+        upper = end if position is None else (position[0] if end is None else min(end, position[0]))
+        partitions = [] if favorites_only else self._list_partitions(start, upper, tag_ids)
+        rows = self._iter_partitioned(self._list_columns(), f'collapsed = 0 AND {condition}', params, partitions,
+                                      position, page_size)
+        
+        # 逐行转换，不同时持有全部结果元组
+        entries = [self._row_to_entry(row) for row in islice(rows, page_size)]
+        next_token = None
+        if len(entries) == page_size:
+            last = entries[-1]
+            next_token = self.encode_page_token(last.timestamp, last.id)
+        
+        return self.query_cache.put(key, generation, (entries, next_token))
+    
+    def _prefer_tag_scan(self, tag_ids: List[int], page_size: int) -> bool:
+        """判断按标签筛选时是否沿时间索引逐行检查关联
+        
+        先取出带标签记录 ID 的开销与带标签的记录数成正比；逐行检查找够一页约需检查
+        每页条数 / 带标签比例 行。以当前分区中最少见的标签估算，常见标签逐行检查更快。
+        """
+        conn = self._get_connection()
+        total = conn.execute("SELECT value FROM storage_counters WHERE name = 'row_count'").fetchone()[0]
+        tagged = min(
+            conn.execute('SELECT COUNT(*) FROM entry_tags WHERE tag_id = ?', (tag_id,)).fetchone()[0]
+            for tag_id in tag_ids
+        )
+        return tagged * tagged > page_size * total
+    
+    def iter_history(self, page_size: int = 500):
+        """逐页遍历全部历史记录，按时间倒序逐条产出"""
+        token = None
+        while True:
+            items, token = self.get_history_page(token, page_size)
+            yield from items
+            if token is None:
+                break
+    
+    @staticmethod
+    def _epoch_range(start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[int], Optional[int]]:
+        """将时间范围转换为毫秒时间戳，不带时区的 datetime 按本地时间处理"""
+        return (to_epoch_ms(start) if start is not None else None,
+                to_epoch_ms(end) if end is not None else None)
+    
+    @staticmethod
+    def _entry_filter(start: Optional[int] = None, end: Optional[int] = None,
+                      favorites_only: bool = False, tag_ids: Optional[List[int]] = None,
+                      tag_scan: bool = False, timestamp: str = 'timestamp') -> Tuple[str, list]:
+        """根据时间范围（毫秒时间戳）、收藏和标签条件生成 WHERE 条件及参数
+        
+        时间条件走时间戳索引的范围扫描，timestamp 为时间戳列的写法（见 _ts）。标签条件有两种写法：默认由关联表主键取出带标签的
+        记录 ID 再按时间排序；tag_scan 时沿时间索引逐行在关联表主键上检查，找够一页即停。
+        标签条件中的 {schema} 须替换为分区的模式名。
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append(f'{timestamp} >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append(f'{timestamp} < ?')
+            params.append(end)
+        if favorites_only:
+            conditions.append('is_favorite = 1')
+        if tag_ids and tag_scan:
+            conditions.extend(
+                'EXISTS (SELECT 1 FROM {schema}.entry_tags WHERE tag_id = ? AND entry_id = clipboard_history.id)'
+                for _ in tag_ids
+            )
+            params.extend(tag_ids)
+        elif tag_ids:
+            placeholders = ', '.join('?' * len(tag_ids))
+            conditions.append(f'''id IN (
+                SELECT entry_id FROM {{schema}}.entry_tags WHERE tag_id IN ({placeholders})
+                GROUP BY entry_id HAVING COUNT(*) = {len(tag_ids)}
+            )''')
+            params.extend(tag_ids)
+        return ' AND '.join(conditions) or '1', params
+    
+    def count_entries(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      favorites_only: bool = False) -> int:
+        """统计符合条件的记录数，无过滤条件时直接读取计数器
+        
+        整个落在时间范围内的归档分区直接使用清单中的记录数，只有跨越边界的分区才需附加后计数；
+        收藏的记录不会归档，只统计收藏时不涉及归档分区。
+        """
+        if start is None and end is None and not favorites_only:
+            return self.get_entry_count()
+        start, end = self._epoch_range(start, end)
+        condition, params = self._entry_filter(start, end, favorites_only, timestamp=self._ts())
+        conn = self._get_connection()
+        total = conn.execute(f'SELECT COUNT(*) FROM clipboard_history WHERE {condition}', params).fetchone()[0]
+        if favorites_only:
+            return total
+        
+        for month, file_name, _, _, min_ts, max_ts, row_count in self._list_partitions(start, end):
+            if (start is None or min_ts >= start) and (end is None or max_ts < end):
+                total += row_count
+            else:
+                alias = self._attach_partition(month, file_name)
+                total += conn.execute(
+                    f'SELECT COUNT(*) FROM {alias}.clipboard_history WHERE {condition}', params
+                ).fetchone()[0]
+        return total
+    
+    def iter_entries(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     favorites_only: bool = False, batch_size: int = 256):
+        """按时间倒序流式产出包含正文和元数据的完整记录
+        
+        各分区按键集分批读取，内存占用只与 batch_size 有关；只打开与时间范围重叠的归档分区。
+        外部存储和压缩的内容逐条解析；超过 stream_threshold 字节的正文不随批读取，
+        记录的 content_loaded 为 False，可用 open_entry_content 分块读取（访问 content 时整条读取）。
+        start 包含、end 不包含。
+        """
+        start, end = self._epoch_range(start, end)
+        condition, params = self._entry_filter(start, end, favorites_only, timestamp=self._ts())
+        partitions = [] if favorites_only else self._list_partitions(start, end)
+        large = f'COALESCE(byte_size, size) > {self.stream_threshold}' if self.stream_threshold else '0'
+        rows = self._iter_partitioned(
+            f'id, content_type, {self._ts()}, size, is_favorite, metadata, {large}, '
+            f'CASE WHEN {large} THEN NULL ELSE content END, blob_hash, '
+            f'CASE WHEN {large} THEN NULL ELSE content_z END, zdict_version',
+            condition, params, partitions, batch_size=batch_size
+        )
+        for row in rows:
+            yield ClipEntry(
+                row[0], row[1], row[2], row[3], bool(row[4]),
+                metadata=row[5],
+                content=_UNLOADED if row[6] else self._resolve_content(*row[7:]),
+                storage=self
+            )
+    
+    def _search_schemas(self):
+        """依次产出当前分区和各归档分区（月份倒序）的模式名，归档分区在用到时才附加"""
+        yield 'main'
+        for month, file_name, *_ in self._list_partitions():
+            yield self._attach_partition(month, file_name)
+    
+    def _drop_repeated(self, schema: str, entries: List[ClipEntry], seen: set) -> List[ClipEntry]:
+        """去掉正文摘要已在 seen 中的搜索结果，并记下其余结果的摘要
+        
+        归档后再次复制的内容在多个分区各有一条，各分区按从新到旧的顺序传入，只保留最新的一条。
+        """
+        if not entries:
+            return entries
+        ids = [entry.id for entry in entries]
+        placeholders = ','.join('?' * len(ids))
+        digests = dict(self._get_connection().execute(f'''
+            SELECT id, digest FROM {schema}.clipboard_history WHERE id IN ({placeholders})
+        ''', ids).fetchall())
+        
+        kept = []
+        for entry in entries:
+            digest = digests.get(entry.id)
+            if digest is not None:
+                if digest in seen:
+                    continue
+                seen.add(digest)
+            kept.append(entry)
+        return kept
+    
+    def search_clipboard_history(self, query: str, limit: int = 50) -> List[ClipEntry]:
+        """搜索剪贴板历史记录
+        
+        先搜索当前分区，结果不足 limit 条时按月份倒序继续搜索归档分区。
+        同一内容在多个分区各有一条时只返回最新的一条。
+        """
+        if not query.strip():
+            return self.get_clipboard_history(limit)
+        
+        key = ('search', query, limit)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
+        try:
+            conn = self._get_connection()
+            
+            fts_query = build_fts_query(query) if self.fts_enabled else ''
+            results, seen = [], set()
+            snippet_index = len(self._LIST_FIELDS)
+            for schema in self._search_schemas():
+                if fts_query:
+                    # 全文索引检索，按 bm25 相关度排序，预览为高亮摘要
+                    cursor = conn.execute(f'''
+                        SELECT {self._list_columns('h.')},
+                               snippet(clipboard_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…', 24)
+                        FROM {schema}.clipboard_fts
+                        JOIN {schema}.clipboard_history h ON h.id = clipboard_fts.rowid
+                        WHERE clipboard_fts MATCH ? AND h.collapsed = 0
+                        ORDER BY bm25(clipboard_fts, 1.0, 0.5)
+                        LIMIT ?
+                    ''', (fts_query, limit))
+                else:
+                    search_pattern = f"%{query}%"
+                    cursor = conn.execute(f'''
+                        SELECT {self._list_columns()}, NULL
+                        FROM {schema}.clipboard_history
+                        WHERE collapsed = 0 AND clip_text(content, blob_hash, content_z, zdict_version) LIKE ?
+                        ORDER BY {self._ts()} DESC
+                        LIMIT ?
+                    ''', (search_pattern, limit))
+                
+                # 每个分区都取 limit 条：去掉的重复不多于已有结果数，剩下的仍足以补满
+                entries = []
+                for row in cursor.fetchall():
+                    snippet = row[snippet_index]
+                    preview = _clean_snippet(snippet) if snippet is not None else None
+                    entries.append(self._row_to_entry(row, preview))
+                results.extend(self._drop_repeated(schema, entries, seen)[:limit - len(results)])
+                if len(results) >= limit:
+                    break
+            
+            return self.query_cache.put(key, generation, results)
+        
+        except Exception as e:
+            print(f"搜索历史记录失败: {e}")
+            return []
+    
+    def fuzzy_search_clipboard_history(self, query: str, limit: int = 50) -> List[ClipEntry]:
+        """容错搜索：按三元组相似度排序候选，再用有界编辑距离确认
+
+        结果按编辑距离、三元组相似度、时间依次排序，预览为匹配处附近的摘要。
+        当前分区的结果不足 limit 条时按月份倒序继续搜索归档分区，同一内容只返回最新的一条。
+        """
+        needle = normalize_content(query).lower()
+        max_distance = fuzzy_max_distance(needle, self.fuzzy_max_distance)
+        if not self.fuzzy_enabled or max_distance == 0:
+            return self.search_clipboard_history(query, limit)
+        
+        key = ('fuzzy', needle, limit)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
+        try:
+            results, seen = [], set()
+            for schema in self._search_schemas():
+                entries = self._fuzzy_search_schema(schema, needle, max_distance, limit)
+                results.extend(self._drop_repeated(schema, entries, seen)[:limit - len(results)])
+                if len(results) >= limit:
+                    break
+            return self.query_cache.put(key, generation, results)
+        
+        except Exception as e:
+            print(f"模糊搜索失败: {e}")
+            return []
+    
+    def _fuzzy_search_schema(self, schema: str, needle: str, max_distance: int, limit: int) -> List[ClipEntry]:
+        """在一个分区中执行模糊搜索，返回按编辑距离、三元组相似度、时间排序的结果"""
+        conn = self._get_connection()
+        
+        # 先取完整查询的精确命中，再按片段各取最新的若干条候选；
+        # % 换成单字符通配符只会放宽条件，最终由编辑距离校验
+        pieces = fuzzy_pieces(needle, max_distance)
+        candidates = {}
+        for piece in [needle] + [piece for _, piece in pieces]:
+            cursor = conn.execute(f'''
+                SELECT rowid, text FROM {schema}.clipboard_trigrams
+                WHERE text LIKE ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            ''', (f"%{piece.replace('%', '_')}%", self.fuzzy_candidate_limit))
+            candidates.update(cursor.fetchall())
+        
+        # 三元组过滤：k 处编辑最多破坏 3k 个三元组，共有数不足的窗口不可能匹配
+        query_grams = trigrams(needle)
+        min_shared = len(query_grams) - FUZZY_GRAM * max_distance
+        ranked = []
+        for entry_id, text in candidates.items():
+            lowered = text.lower()
+            best = None
+            for offset, piece in pieces:
+                position = lowered.find(piece)
+                anchors = 0
+                while position >= 0 and anchors < FUZZY_ANCHOR_LIMIT:
+                    start = max(0, position - offset - max_distance)
+                    window = lowered[start:position - offset + len(needle) + max_distance]
+                    shared = len(query_grams & trigrams(window))
+                    if shared >= min_shared and (best is None or shared > best[0]):
+                        best = (shared, start, window)
+                    anchors += 1
+                    position = lowered.find(piece, position + 1)
+            if best is not None:
+                ranked.append((best[0], entry_id, best[1], best[2], text))
+        ranked.sort(reverse=True)
+        
+        # 按共有三元组从多到少校验。缺少 n 个三元组意味着至少 ceil(n/3) 处编辑，
+        # 已有 limit 条结果不差于这一下界时，后面的候选不可能进入结果，提前结束
+        matches = {}
+        found_by_distance = [0] * (max_distance + 1)
+        for shared, entry_id, start, window, text in ranked:
+            lower_bound = -(-(len(query_grams) - shared) // FUZZY_GRAM)
+            if sum(found_by_distance[:lower_bound + 1]) >= limit:
+                break
+            found = bounded_edit_distance(needle, window, max_distance)
+            if found is None:
+                continue
+            distance, end = found
+            found_by_distance[distance] += 1
+            # 反向再匹配一次得到匹配的起点，用于高亮
+            _, length = bounded_edit_distance(needle[::-1], window[:end][::-1], distance)
+            begin, end = start + end - length, start + end
+            preview = (('…' if begin > 20 else '') + text[max(0, begin - 20):begin]
+                       + SNIPPET_START + text[begin:end] + SNIPPET_END + text[end:end + 60])
+            matches[entry_id] = (distance, -shared, -entry_id, preview)
+        
+        if not matches:
+            return []
+        
+        # 被折叠的近似重复成员不单独显示
+        ids = sorted(matches, key=matches.get)[:limit * 2]
+        placeholders = ','.join('?' * len(ids))
+        cursor = conn.execute(f'''
+            SELECT {self._list_columns()} FROM {schema}.clipboard_history
+            WHERE collapsed = 0 AND id IN ({placeholders})
+        ''', ids)
+        rows = sorted(cursor.fetchall(), key=lambda row: matches[row[0]])[:limit]
+        return [self._row_to_entry(row, matches[row[0]][3]) for row in rows]
+    
+    def regex_search_clipboard_history(self, pattern: str, limit: int = 50,
+                                       time_budget_ms: Optional[int] = None) -> List[ClipEntry]:
+        """正则表达式搜索，按时间倒序返回
+        
+        从表达式中提取的字面量片段先在三元组索引上筛出候选；超出索引长度的记录无法预筛，
+        总是交给 REGEXP 确认。超出时间预算时中断查询，返回已找到的结果；
+        这样的不完整结果不进入查询缓存。同一内容在多个分区各有一条时只返回最新的一条。
+        """
+        if not pattern:
+            return self.get_clipboard_history(limit)
+        
+        try:
+            _, fragments = compile_regex(pattern)
+        except re.error as e:
+            print(f"正则表达式无效: {e}")
+            return []
+        
+        key = ('regex', pattern, limit)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
+        conn = self._get_connection()
+        prefilter, params = '', [pattern]
+        if fragments and self.fuzzy_enabled:
+            likes = ' AND '.join('text LIKE ?' for _ in fragments)
+            prefilter = f'AND (size > ? OR id IN (SELECT rowid FROM {{schema}}.clipboard_trigrams WHERE {likes}))'
+            params = [self.fuzzy_index_chars] + [f"%{fragment.replace('%', '_')}%" for fragment in fragments] + params
+        
+        budget = time_budget_ms if time_budget_ms is not None else self.regex_time_budget_ms
+        deadline = time.perf_counter() + budget / 1000.0
+        self._local.regex_deadline = deadline
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        
+        results, seen = [], set()
+        try:
+            # 各分区共用同一个截止时间，当前分区的结果不足时按月份倒序继续
+            for schema in self._search_schemas():
+                cursor = conn.execute(f'''
+                    SELECT {self._list_columns()}
+                    FROM {schema}.clipboard_history
+                    WHERE collapsed = 0 {prefilter.format(schema=schema)}
+                      AND clip_text(content, blob_hash, content_z, zdict_version) REGEXP ?
+                    ORDER BY {self._ts()} DESC
+                    LIMIT ?
+                ''', params + [limit])
+                while len(results) < limit:
+                    rows = cursor.fetchmany(50)
+                    if not rows:
+                        break
+                    entries = [self._row_to_entry(row) for row in rows]
+                    results.extend(self._drop_repeated(schema, entries, seen)[:limit - len(results)])
+                if len(results) >= limit:
+                    break
+        
+        except sqlite3.OperationalError as e:
+            if 'interrupted' not in str(e):
+                print(f"正则搜索失败: {e}")
+                return []
+            print(f"正则搜索超出时间预算 {budget}ms，返回已找到的 {len(results)} 条")
+        
+        except Exception as e:
+            print(f"正则搜索失败: {e}")
+            return []
+        
+        finally:
+            conn.set_progress_handler(None, 0)
+            self._local.regex_deadline = None
+        
+        # 截止时间之后检查的记录一律视为不匹配，超时的结果即使未被中断也不完整
+        if time.perf_counter() > deadline:
+            return results
+        return self.query_cache.put(key, generation, results)
+    
+    def delete_clipboard_entry(self, entry_id: int) -> bool:
+        """删除指定的剪贴板记录"""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('DELETE FROM clipboard_history WHERE id = ?', (entry_id,))
+                deleted = cursor.rowcount > 0
+            
+            if not deleted:
+                schema = self._find_archived(entry_id)
+                if schema is not None:
+                    with self._transaction() as cursor:
+                        cursor.execute(f'DELETE FROM {schema}.clipboard_history WHERE id = ?', (entry_id,))
+                        deleted = cursor.rowcount > 0
+                        self._regroup_partition(cursor, schema)
+                        self._refresh_partition(cursor, schema)
+            
+            if deleted:
+                print(f"删除记录成功: ID {entry_id}")
+                self.collect_blob_garbage()
+            else:
+                print(f"未找到要删除的记录: ID {entry_id}")
+            return deleted
+        
+        except Exception as e:
+            print(f"删除记录失败: {e}")
+            return False
+    
+    def toggle_favorite(self, entry_id: int) -> bool:
+        """切换记录的收藏状态
+        
+        归档分区只保存非收藏的记录，收藏归档中的记录时将其移回当前分区。
+        """
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(
+                    'UPDATE clipboard_history SET is_favorite = NOT is_favorite WHERE id = ?',
+                    (entry_id,)
+                )
+                toggled = cursor.rowcount > 0
+            
+            if not toggled:
+                toggled = self._restore_archived(entry_id)
+            
+            if toggled:
+                print(f"切换收藏状态成功: ID {entry_id}")
+            return toggled
+        
+        except Exception as e:
+            print(f"切换收藏状态失败: {e}")
+            return False
+    
+    @staticmethod
+    def _normalize_tags(names: List[str]) -> List[str]:
+        """去掉标签名首尾空白和空标签，不区分大小写去重并保持顺序"""
+        result = {}
+        for name in names:
+            name = name.strip()
+            if name:
+                result.setdefault(name.lower(), name)
+        return list(result.values())
+    
+    def _find_tag_ids(self, names: List[str]) -> Optional[List[int]]:
+        """按名称（不区分大小写）查找标签 ID，任一标签不存在时返回 None"""
+        names = self._normalize_tags(names)
+        if not names:
+            return []
+        placeholders = ', '.join('?' * len(names))
+        rows = self._get_connection().execute(
+            f'SELECT id FROM tags WHERE name IN ({placeholders})', names
+        ).fetchall()
+        return [row[0] for row in rows] if len(rows) == len(names) else None
+    
+    def _group_by_partition(self, entry_ids: List[int]) -> Dict[Optional[str], List[int]]:
+        """按所在分区分组记录 ID，当前分区的键为 None，归档分区的键为月份；找不到的记录忽略
+        
+        当前分区的记录分块一次查出，其余逐条在归档分区中查找。
+        """
+        conn = self._get_connection()
+        entry_ids = list(dict.fromkeys(entry_ids))
+        groups = {None: []}
+        for index in range(0, len(entry_ids), 500):
+            chunk = entry_ids[index:index + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            groups[None].extend(
+                row[0] for row in conn.execute(f'SELECT id FROM clipboard_history WHERE id IN ({placeholders})', chunk)
+            )
+        
+        present = set(groups[None])
+        for entry_id in entry_ids:
+            if entry_id not in present:
+                schema = self._find_archived(entry_id)
+                if schema is not None:
+                    groups.setdefault(self._local.attached[schema], []).append(entry_id)
+        return groups
+    
+    def _update_entry_tags(self, entry_ids: List[int], tag_ids: List[int], statement: str) -> int:
+        """对各分区中的记录与每个标签执行 statement（{schema}.entry_tags 上的插入或删除），返回影响的关联数
+        
+        事务中不能附加分区，每个分区附加后单独一个事务写入并更新分区汇总。
+        """
+        conn = self._get_connection()
+        files = dict(conn.execute('SELECT month, file_name FROM partitions').fetchall())
+        changed = 0
+        for month, ids in self._group_by_partition(entry_ids).items():
+            schema = 'main' if month is None else self._attach_partition(month, files[month])
+            with self._transaction() as cursor:
+                if month is not None:
+                    self._ensure_partition_schema(cursor, schema)
+                cursor.executemany(
+                    statement.format(schema=schema),
+                    [(tag_id, entry_id) for tag_id in tag_ids for entry_id in ids]
+                )
+                changed += cursor.rowcount
+                if month is not None:
+                    self._refresh_partition(cursor, schema)
+        return changed
+    
+    def tag_entries(self, entry_ids: List[int], tags: List[str]) -> int:
+        """为一批记录添加标签（不存在的标签自动创建），返回新增的关联数
+        
+        当前分区的关联在一个事务中批量写入；归档分区中的记录在其分区内建立关联并更新分区汇总。
+        """
+        names = self._normalize_tags(tags)
+        if not names or not entry_ids:
+            return 0
+        
+        try:
+            with self._transaction() as cursor:
+                cursor.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', [(name,) for name in names])
+                placeholders = ', '.join('?' * len(names))
+                cursor.execute(f'SELECT id FROM tags WHERE name IN ({placeholders})', names)
+                tag_ids = [row[0] for row in cursor.fetchall()]
+            
+            added = self._update_entry_tags(
+                entry_ids, tag_ids, 'INSERT OR IGNORE INTO {schema}.entry_tags (tag_id, entry_id) VALUES (?, ?)'
+            )
+            print(f"添加标签 {', '.join(names)}: 新增 {added} 个关联")
+            return added
+        
+        except Exception as e:
+            print(f"添加标签失败: {e}")
+            return 0
+    
+    def untag_entries(self, entry_ids: List[int], tags: List[str]) -> int:
+        """移除一批记录上的标签，返回删除的关联数；标签本身保留"""
+        names = self._normalize_tags(tags)
+        if not names or not entry_ids:
+            return 0
+        
+        try:
+            placeholders = ', '.join('?' * len(names))
+            tag_ids = [row[0] for row in self._get_connection().execute(
+                f'SELECT id FROM tags WHERE name IN ({placeholders})', names
+            )]
+            if not tag_ids:
+                return 0
+            
+            removed = self._update_entry_tags(
+                entry_ids, tag_ids, 'DELETE FROM {schema}.entry_tags WHERE tag_id = ? AND entry_id = ?'
+            )
+            print(f"移除标签 {', '.join(names)}: 删除 {removed} 个关联")
+            return removed
+        
+        except Exception as e:
+            print(f"移除标签失败: {e}")
+            return 0
+    
+    def get_tags(self) -> List[Dict]:
+        """获取全部标签及各自的记录数（含归档分区，读取分区汇总），按名称排序"""
+        key = ('tags',)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
+        try:
+            conn = self._get_connection()
+            counts = dict(conn.execute('SELECT tag_id, COUNT(*) FROM entry_tags GROUP BY tag_id').fetchall())
+            for (stats,) in conn.execute('SELECT stats FROM partitions').fetchall():
+                for tag_id, count in json.loads(stats).get('tags', {}).items():
+                    counts[int(tag_id)] = counts.get(int(tag_id), 0) + count
+            
+            return self.query_cache.put(key, generation, [
+                {'id': tag_id, 'name': name, 'count': counts.get(tag_id, 0)}
+                for tag_id, name in conn.execute('SELECT id, name FROM tags ORDER BY name COLLATE NOCASE')
+            ])
+        
+        except Exception as e:
+            print(f"获取标签失败: {e}")
+            return []
+    
+    def get_entry_tags(self, entry_id: int) -> List[str]:
+        """获取记录的标签名，按名称排序"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 创建剪贴板历史表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS clipboard_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    content TEXT NOT NULL,
-                    content_type TEXT DEFAULT 'text',
-                    content_hash TEXT UNIQUE,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    size INTEGER DEFAULT 0,
-                    is_favorite BOOLEAN DEFAULT 0,
-                    metadata TEXT DEFAULT '{}'
-                )
-            ''')
-            
-            # 创建索引以提高查询性能
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON clipboard_history(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_hash ON clipboard_history(content_hash)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_type ON clipboard_history(content_type)')
-            
-            conn.commit()
-            conn.close()
-            print(f"数据库初始化成功: {self.db_path}")
+            conn = self._get_connection()
+            schema = 'main'
+            if conn.execute('SELECT 1 FROM clipboard_history WHERE id = ?', (entry_id,)).fetchone() is None:
+                schema = self._find_archived(entry_id)
+                if schema is None or conn.execute(
+                    f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'entry_tags'"
+                ).fetchone() is None:
+                    return []
             
+            return [row[0] for row in conn.execute(f'''
+                SELECT t.name FROM {schema}.entry_tags AS e JOIN main.tags AS t ON t.id = e.tag_id
+                WHERE e.entry_id = ?
+                ORDER BY t.name COLLATE NOCASE
+            ''', (entry_id,))]
+        
         except Exception as e:
-            print(f"数据库初始化失败: {e}")
-            raise
-    
-    def get_content_hash(self, content: str) -> str:
-        """计算内容的MD5哈希值，用于去重"""
-        return hashlib.md5(content.encode('utf-8')).hexdigest()
+            print(f"获取记录标签失败: {e}")
+            return []
     
-    def add_clipboard_entry(self, content: str, content_type: str = 'text', metadata: dict = None) -> bool:
-        """添加剪贴板记录到数据库"""
-        if not content or not content.strip():
+    def rename_tag(self, name: str, new_name: str) -> bool:
+        """重命名标签，新名称已被其他标签使用时失败"""
+        new_name = new_name.strip()
+        if not new_name:
             return False
-            
-        content_hash = self.get_content_hash(content)
-        metadata = metadata or {}
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._transaction() as cursor:
+                cursor.execute('UPDATE tags SET name = ? WHERE name = ?', (new_name, name.strip()))
+                renamed = cursor.rowcount > 0
+            if renamed:
+                print(f"重命名标签: {name} -> {new_name}")
+            return renamed
+        
+        except sqlite3.IntegrityError:
+            print(f"标签已存在: {new_name}")
+            return False
+        except Exception as e:
+            print(f"重命名标签失败: {e}")
+            return False
+    
+    def delete_tag(self, name: str) -> bool:
+        """删除标签及其全部关联（包括归档分区中的关联）"""
+        try:
+            tag_ids = self._find_tag_ids([name])
+            if not tag_ids:
+                return False
+            tag_id = tag_ids[0]
             
-            # 检查是否已存在相同内容
-            cursor.execute(
-                'SELECT id, timestamp FROM clipboard_history WHERE content_hash = ?',
-                (content_hash,)
-            )
-            existing = cursor.fetchone()
+            with self._transaction() as cursor:
+                cursor.execute('DELETE FROM tags WHERE id = ?', (tag_id,))
+                cursor.execute('DELETE FROM entry_tags WHERE tag_id = ?', (tag_id,))
             
-            if existing:
-                # 如果已存在，更新时间戳
-                cursor.execute(
-                    'UPDATE clipboard_history SET timestamp = CURRENT_TIMESTAMP WHERE id = ?',
-                    (existing[0],)
-                )
-                print(f"更新已存在记录的时间戳: ID {existing[0]}")
-            else:
-                # 添加新记录
-                cursor.execute('''
-                    INSERT INTO clipboard_history 
-                    (content, content_type, content_hash, size, metadata)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    content,
-                    content_type,
-                    content_hash,
-                    len(content),
-                    json.dumps(metadata)
-                ))
-                print(f"添加新的剪贴板记录: {len(content)} 字符")
-            
-            conn.commit()
-            conn.close()
-            return True
+            # 标签 ID 不复用，归档分区中的关联即使未能清理也不会误配；逐个分区清理并更新汇总
+            partitions = self._get_connection().execute('SELECT month, file_name, stats FROM partitions').fetchall()
+            for month, file_name, stats in partitions:
+                if str(tag_id) not in json.loads(stats).get('tags', {}):
+                    continue
+                schema = self._attach_partition(month, file_name)
+                with self._transaction() as cursor:
+                    cursor.execute(f'DELETE FROM {schema}.entry_tags WHERE tag_id = ?', (tag_id,))
+                    self._refresh_partition(cursor, schema)
             
+            print(f"删除标签: {name}")
+            return True
+        
         except Exception as e:
-            print(f"添加剪贴板记录失败: {e}")
+            print(f"删除标签失败: {e}")
             return False
     
-    def get_clipboard_history(self, limit: int = 100, offset: int = 0) -> List[Dict]:
-        """获取剪贴板历史记录"""
+    def clear_old_entries(self, days: int = 30, time_budget_ms: Optional[int] = None) -> int:
+        """清理指定天数之前的记录（保留收藏的记录）
+        
+        按 cleanup_chunk_size 条分批删除，每批一个短事务，批次之间写入线程
+        仍可提交新记录。给定 time_budget_ms 时超出预算即停止，剩余记录留待
+        下次清理。释放的文件空间由 reclaim_free_pages 逐步回收。
+        整月都已过期的归档分区直接删除文件。截止时间以毫秒时间戳计算，与时区无关。
+        时间戳换算的后台回填完成前暂不清理。
+        """
+        if self.legacy_timestamps:
+            return 0
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, content, content_type, timestamp, size, is_favorite, metadata
-                FROM clipboard_history
-                ORDER BY timestamp DESC
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
-            
-            results = []
-            for row in cursor.fetchall():
-                results.append({
-                    'id': row[0],
-                    'content': row[1],
-                    'content_type': row[2],
-                    'timestamp': row[3],
-                    'size': row[4],
-                    'is_favorite': bool(row[5]),
-                    'metadata': json.loads(row[6]) if row[6] else {},
-                    'preview': row[1][:100] + '...' if len(row[1]) > 100 else row[1]
-                })
+            cutoff = now_ms() - days * DAY_MS
+            deadline = time.monotonic() + time_budget_ms / 1000.0 if time_budget_ms else None
             
-            conn.close()
-            return results
+            deleted_count = 0
+            while True:
+                with self._transaction() as cursor:
+                    cursor.execute('''
+                        DELETE FROM clipboard_history WHERE id IN (
+                            SELECT id FROM clipboard_history
+                            WHERE timestamp < ? AND is_favorite = 0
+                            ORDER BY timestamp
+                            LIMIT ?
+                        )
+                    ''', (cutoff, self.cleanup_chunk_size))
+                    chunk = cursor.rowcount
+                deleted_count += chunk
+                
+                if chunk < self.cleanup_chunk_size:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
             
+            deleted_count += self._clear_old_partitions(cutoff)
+            if deleted_count:
+                print(f"清理了 {deleted_count} 条超过 {days} 天的记录")
+                self.collect_blob_garbage()
+            return deleted_count
+        
         except Exception as e:
-            print(f"获取历史记录失败: {e}")
-            return []
+            print(f"清理旧记录失败: {e}")
+            return 0
     
-    def search_clipboard_history(self, query: str, limit: int = 50) -> List[Dict]:
-        """搜索剪贴板历史记录"""
-        if not query.strip():
-            return self.get_clipboard_history(limit)
-            
+    @staticmethod
+    def _partition_month(timestamp: int) -> str:
+        """毫秒时间戳所属的分区月份（UTC），格式 YYYY-MM"""
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime('%Y-%m')
+    
+    @staticmethod
+    def _month_bounds(month: str) -> Tuple[int, int]:
+        """分区月份的起止毫秒时间戳（包含起点，不包含终点）"""
+        year, number = int(month[:4]), int(month[5:7])
+        start = datetime(year, number, 1, tzinfo=timezone.utc)
+        end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+        return to_epoch_ms(start), to_epoch_ms(end)
+    
+    @staticmethod
+    def _partition_alias(month: str) -> str:
+        """归档分区附加到连接时使用的模式名"""
+        return f"part_{month.replace('-', '_')}"
+    
+    def _attach_partition(self, month: str, file_name: str) -> str:
+        """将归档分区附加到当前线程的连接并返回其模式名
+        
+        每个连接最多同时附加 partition_attach_limit 个分区，超出时分离最久未用的分区；
+        仍有语句在读取的分区无法分离，暂时保留。
+        """
+        conn = self._get_connection()
+        attached = self._local.attached
+        alias = self._partition_alias(month)
+        if alias in attached:
+            attached.move_to_end(alias)
+            return alias
+        
+        for oldest in list(attached):
+            if len(attached) < self.partition_attach_limit:
+                break
+            try:
+                conn.execute(f'DETACH DATABASE {oldest}')
+                del attached[oldest]
+            except sqlite3.OperationalError:
+                continue
+        
+        os.makedirs(self.partition_dir, exist_ok=True)
+        conn.execute(f'ATTACH DATABASE ? AS {alias}', (os.path.join(self.partition_dir, file_name),))
+        attached[alias] = month
+        return alias
+    
+    def _detach_partition(self, month: str):
+        """从当前线程的连接上分离归档分区（未附加时忽略）"""
+        alias = self._partition_alias(month)
+        if self._local.attached.pop(alias, None) is not None:
+            self._get_connection().execute(f'DETACH DATABASE {alias}')
+    
+    def _list_partitions(self, start: Optional[int] = None, end: Optional[int] = None,
+                         tag_ids: Optional[List[int]] = None) -> List[tuple]:
+        """读取归档分区清单，按月份倒序返回 (month, file_name, min_id, max_id, min_ts, max_ts, row_count)
+        
+        给定时间范围（毫秒时间戳）时只返回与之重叠的分区；给定标签时只返回汇总中
+        带有全部这些标签的分区。
+        """
+        conditions, params = ['row_count > 0'], []
+        if start is not None:
+            conditions.append('max_ts >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('min_ts <= ?')
+            params.append(end)
+        rows = self._get_connection().execute(f'''
+            SELECT month, file_name, min_id, max_id, min_ts, max_ts, row_count, stats FROM partitions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY month DESC
+        ''', params).fetchall()
+        if tag_ids:
+            rows = [row for row in rows if all(str(tag_id) in json.loads(row[7]).get('tags', {}) for tag_id in tag_ids)]
+        return [row[:7] for row in rows]
+    
+    def _find_archived(self, entry_id: int) -> Optional[str]:
+        """在 ID 范围覆盖该记录的归档分区中查找记录，返回所在分区的模式名"""
+        conn = self._get_connection()
+        rows = conn.execute('''
+            SELECT month, file_name FROM partitions
+            WHERE ? BETWEEN min_id AND max_id
+            ORDER BY month DESC
+        ''', (entry_id,)).fetchall()
+        for month, file_name in rows:
+            alias = self._attach_partition(month, file_name)
+            if conn.execute(f'SELECT 1 FROM {alias}.clipboard_history WHERE id = ?', (entry_id,)).fetchone():
+                return alias
+        return None
+    
+    def _ensure_partition_schema(self, cursor: sqlite3.Cursor, alias: str) -> str:
+        """在归档分区中建立与主表列一致的历史表、列表索引和检索索引，返回列名列表
+        
+        归档分区不再接收新记录，只保留读取需要的索引；删除记录时由分区内的触发器
+        同步清理全文和模糊索引以及标签关联。标签名只保存在主库中，分区内的关联引用其 ID。
+        """
+        cursor.execute('PRAGMA main.table_info(clipboard_history)')
+        columns = [(row[1], row[2], row[4]) for row in cursor.fetchall()]
+        cursor.execute(f'PRAGMA {alias}.table_info(clipboard_history)')
+        existing = {row[1] for row in cursor.fetchall()}
+        
+        definitions = []
+        for name, declared_type, default in columns:
+            if name == 'id':
+                definitions.append('id INTEGER PRIMARY KEY')
+            elif name not in existing:
+                definitions.append(f"{name} {declared_type}" + (f" DEFAULT ({default})" if default is not None else ''))
+        if not existing:
+            cursor.execute(f"CREATE TABLE {alias}.clipboard_history ({', '.join(definitions)})")
+        else:
+            for definition in definitions[1:]:
+                cursor.execute(f'ALTER TABLE {alias}.clipboard_history ADD COLUMN {definition}')
+        
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS {alias}.idx_history_list ON clipboard_history(
+                timestamp, id, content_type, size, is_favorite, line_count, display, collapsed, near_dups
+            )
+        ''')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {alias}.idx_group ON clipboard_history(group_id) WHERE group_id IS NOT NULL'
+        )
+        
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {alias}.entry_tags (
+                tag_id INTEGER NOT NULL,
+                entry_id INTEGER NOT NULL,
+                PRIMARY KEY (tag_id, entry_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {alias}.idx_entry_tags_entry ON entry_tags(entry_id, tag_id)')
+        
+        cleanup = ['DELETE FROM entry_tags WHERE entry_id = old.id;']
+        if self.fts_enabled:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {alias}.clipboard_fts USING fts5(
+                    body,
+                    identifiers,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+            cleanup.append('DELETE FROM clipboard_fts WHERE rowid = old.id;')
+        if self.fuzzy_enabled:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {alias}.clipboard_trigrams USING fts5(
+                    text,
+                    tokenize = 'trigram',
+                    detail = none
+                )
+            ''')
+            cleanup.append('DELETE FROM clipboard_trigrams WHERE rowid = old.id;')
+        cursor.execute(f'DROP TRIGGER IF EXISTS {alias}.partition_index_delete')
+        cursor.execute(f'''
+            CREATE TRIGGER {alias}.partition_index_delete AFTER DELETE ON clipboard_history
+            BEGIN
+                {' '.join(cleanup)}
+            END
+        ''')
+        
+        return ', '.join(name for name, _, _ in columns)
+    
+    def _regroup_partition(self, cursor: sqlite3.Cursor, alias: str):
+        """重新计算归档分区内近似重复分组的组头和折叠计数
+        
+        跨月的组在归档时分属不同分区，每个分区内由 ID 最大的成员担任组头。
+        """
+        cursor.execute(f'''
+            UPDATE {alias}.clipboard_history AS h SET
+                collapsed = h.id != g.head,
+                near_dups = CASE WHEN h.id = g.head THEN g.members - 1 ELSE 0 END
+            FROM (
+                SELECT group_id, MAX(id) AS head, COUNT(*) AS members
+                FROM {alias}.clipboard_history
+                WHERE group_id IS NOT NULL
+                GROUP BY group_id
+            ) AS g
+            WHERE h.group_id = g.group_id
+        ''')
+    
+    def _refresh_partition(self, cursor: sqlite3.Cursor, alias: str):
+        """重新汇总归档分区的 ID 和时间范围、记录数及统计，写入分区清单"""
+        timestamp = self._EPOCH_MS_SQL.format(column='timestamp')
+        cursor.execute(f'''
+            SELECT MIN(id), MAX(id), MIN({timestamp}), MAX({timestamp}), COUNT(*),
+                   COALESCE(SUM(COALESCE(byte_size, size, 0)), 0),
+                   COALESCE(SUM(content_z IS NOT NULL), 0),
+                   COALESCE(SUM(CASE WHEN content_z IS NOT NULL THEN COALESCE(byte_size, 0) ELSE 0 END), 0),
+                   COALESCE(SUM(LENGTH(content_z)), 0)
+            FROM {alias}.clipboard_history
+        ''')
+        min_id, max_id, min_ts, max_ts, row_count, *totals = cursor.fetchone()
+        stats = dict(zip(('total_bytes', 'compressed_count', 'compressed_raw_bytes', 'compressed_bytes'), totals))
+        
+        cursor.execute(f'SELECT content_type, COUNT(*) FROM {alias}.clipboard_history GROUP BY content_type')
+        stats['types'] = dict(cursor.fetchall())
+        cursor.execute(f'''
+            SELECT DATE(({timestamp}) / 1000, 'unixepoch', 'localtime'), COUNT(*), SUM(COALESCE(byte_size, size, 0))
+            FROM {alias}.clipboard_history
+            GROUP BY 1
+        ''')
+        stats['days'] = {day: [count, size] for day, count, size in cursor.fetchall()}
+        
+        # 按标签的记录数，列出标签和按标签筛选时据此跳过不含该标签的分区（早期的分区可能没有关联表）
+        stats['tags'] = {}
+        cursor.execute(f"SELECT 1 FROM {alias}.sqlite_master WHERE name = 'entry_tags'")
+        if cursor.fetchone():
+            cursor.execute(f'SELECT tag_id, COUNT(*) FROM {alias}.entry_tags GROUP BY tag_id')
+            stats['tags'] = {str(tag_id): count for tag_id, count in cursor.fetchall()}
+        
+        cursor.execute('''
+            UPDATE partitions SET min_id = ?, max_id = ?, min_ts = ?, max_ts = ?, row_count = ?, stats = ?
+            WHERE month = ?
+        ''', (min_id, max_id, min_ts, max_ts, row_count, json.dumps(stats), self._local.attached[alias]))
+    
+    def rollover_partitions(self, time_budget_ms: Optional[int] = None) -> int:
+        """将当月（UTC）之前的非收藏记录按月份移入归档分区，返回移动的条数
+        
+        按 cleanup_chunk_size 条分批进行，给定 time_budget_ms 时超出预算即停止，
+        剩余记录留待下次。一个月份的记录全部移出后压缩归档文件并标记为已封存。
+        有未完成的后台回填时暂不归档，避免索引不完整的记录进入归档分区。
+        已归档的内容再次复制时不会与归档中的记录合并，而是在当前分区新增一条。
+        """
+        if not self.partition_enabled:
+            return 0
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            conn = self._get_connection()
+            if conn.execute('SELECT COUNT(*) FROM schema_backfills').fetchone()[0]:
+                return 0
+            
+            cutoff = self._month_bounds(self._partition_month(now_ms()))[0]
+            deadline = time.monotonic() + time_budget_ms / 1000.0 if time_budget_ms else None
+            
+            moved, pending = 0, None
+            while True:
+                row = conn.execute(
+                    'SELECT MIN(timestamp) FROM clipboard_history WHERE timestamp < ? AND is_favorite = 0',
+                    (cutoff,)
+                ).fetchone()
+                if row[0] is None:
+                    pending = None
+                    break
+                
+                pending = self._partition_month(row[0])
+                chunk = self._archive_month_chunk(pending)
+                moved += chunk
+                if chunk == 0 or (deadline is not None and time.monotonic() >= deadline):
+                    break
             
-            search_pattern = f"%{query}%"
+            # 已全部移出的月份封存，因时间预算中断的月份留到下次
+            for (month,) in conn.execute('SELECT month FROM partitions WHERE sealed = 0').fetchall():
+                if month != pending:
+                    self._seal_partition(month)
+            
+            if moved:
+                print(f"归档了 {moved} 条当月之前的记录")
+                self.collect_blob_garbage()
+            return moved
+        
+        except Exception as e:
+            print(f"归档旧记录失败: {e}")
+            return 0
+    
+    def _archive_month_chunk(self, month: str) -> int:
+        """将指定月份的一批记录移入归档分区，返回从主库移出的条数
+        
+        先在一个事务中把记录连同全文和模糊索引行复制到分区文件，再在另一个事务中从主库删除。
+        两个文件的提交不保证原子性：中途中断时记录会同时存在于两边，读取时以主库为准，
+        下次归档该批时覆盖分区中的副本。复制之后被更新时间戳或收藏的记录留在主库，
+        分区中的副本随之删除。外部存储的大内容写回分区的记录中，归档文件不依赖 blobs 目录。
+        """
+        start, end = self._month_bounds(month)
+        file_name = f'{self._partition_stem}-{month}.db'
+        
+        # 先登记分区再创建文件，启动时不会把尚未登记的新文件当作残留删除
+        with self._transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO partitions (month, file_name) VALUES (?, ?)
+                ON CONFLICT(month) DO UPDATE SET sealed = 0
+            ''', (month, file_name))
+        alias = self._attach_partition(month, file_name)
+        
+        with self._transaction() as cursor:
+            columns = self._ensure_partition_schema(cursor, alias)
             cursor.execute('''
-                SELECT id, content, content_type, timestamp, size, is_favorite, metadata
-                FROM clipboard_history
-                WHERE content LIKE ?
-                ORDER BY timestamp DESC
+                SELECT id, blob_hash FROM clipboard_history
+                WHERE timestamp >= ? AND timestamp < ? AND is_favorite = 0
+                ORDER BY timestamp, id
                 LIMIT ?
-            ''', (search_pattern, limit))
-            
-            results = []
-            for row in cursor.fetchall():
-                results.append({
-                    'id': row[0],
-                    'content': row[1],
-                    'content_type': row[2],
-                    'timestamp': row[3],
-                    'size': row[4],
-                    'is_favorite': bool(row[5]),
-                    'metadata': json.loads(row[6]) if row[6] else {},
-                    'preview': row[1][:100] + '...' if len(row[1]) > 100 else row[1]
-                })
+            ''', (start, end, self.cleanup_chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+            ids = [(entry_id,) for entry_id, _ in rows]
             
-            conn.close()
-            return results
+            cursor.executemany(f'DELETE FROM {alias}.clipboard_history WHERE id = ?', ids)
+            cursor.executemany(f'''
+                INSERT INTO {alias}.clipboard_history ({columns})
+                SELECT {columns} FROM main.clipboard_history WHERE id = ?
+            ''', ids)
             
-        except Exception as e:
-            print(f"搜索历史记录失败: {e}")
-            return []
+            for entry_id, blob_hash in rows:
+                content = self._resolve_content(None, blob_hash) if blob_hash else None
+                if content is None:
+                    continue
+                stored_content, content_z, zdict_version = content, None, None
+                compressed = self._compress(content.encode('utf-8'))
+                if compressed:
+                    stored_content = ''
+                    content_z, zdict_version = compressed
+                cursor.execute(f'''
+                    UPDATE {alias}.clipboard_history
+                    SET content = ?, content_z = ?, zdict_version = ?, blob_hash = NULL
+                    WHERE id = ?
+                ''', (stored_content, content_z, zdict_version, entry_id))
+            
+            # 索引行直接从主库复制，不必重新解析正文
+            if self.fts_enabled:
+                cursor.executemany(f'''
+                    INSERT INTO {alias}.clipboard_fts (rowid, body, identifiers)
+                    SELECT rowid, body, identifiers FROM main.clipboard_fts WHERE rowid = ?
+                ''', ids)
+            if self.fuzzy_enabled:
+                cursor.executemany(f'''
+                    INSERT INTO {alias}.clipboard_trigrams (rowid, text)
+                    SELECT rowid, text FROM main.clipboard_trigrams WHERE rowid = ?
+                ''', ids)
+            cursor.executemany(f'''
+                INSERT OR IGNORE INTO {alias}.entry_tags (tag_id, entry_id)
+                SELECT tag_id, entry_id FROM main.entry_tags WHERE entry_id = ?
+            ''', ids)
+        
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                DELETE FROM clipboard_history
+                WHERE id = ? AND timestamp >= ? AND timestamp < ? AND is_favorite = 0
+            ''', [(entry_id, start, end) for entry_id, _ in rows])
+            moved = cursor.rowcount
+            cursor.executemany(f'''
+                DELETE FROM {alias}.clipboard_history
+                WHERE id = ?1 AND EXISTS (SELECT 1 FROM main.clipboard_history WHERE id = ?1)
+            ''', ids)
+            self._regroup_partition(cursor, alias)
+            self._refresh_partition(cursor, alias)
+        
+        return moved
     
-    def delete_clipboard_entry(self, entry_id: int) -> bool:
-        """删除指定的剪贴板记录"""
+    def _seal_partition(self, month: str):
+        """压缩已全部移入的归档分区并标记为已封存；分区中已没有记录时直接删除"""
+        conn = self._get_connection()
+        row = conn.execute('SELECT file_name, row_count FROM partitions WHERE month = ?', (month,)).fetchone()
+        if row is None:
+            return
+        file_name, row_count = row
+        if row_count == 0:
+            self._drop_partition(month, file_name)
+            return
+        
+        alias = self._attach_partition(month, file_name)
+        conn.execute(f'VACUUM {alias}')
+        with self._transaction() as cursor:
+            cursor.execute('UPDATE partitions SET sealed = 1 WHERE month = ?', (month,))
+        print(f"归档分区已封存: {month}（{row_count} 条）")
+    
+    def _drop_partition(self, month: str, file_name: str):
+        """从清单中移除归档分区并删除其文件
+        
+        文件仍被其他连接占用而无法删除时保留，下次启动时由 _sweep_partition_files 清理。
+        """
+        self._detach_partition(month)
+        with self._transaction() as cursor:
+            cursor.execute('DELETE FROM partitions WHERE month = ?', (month,))
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            os.remove(os.path.join(self.partition_dir, file_name))
+            print(f"删除归档分区: {month}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"归档分区文件暂时无法删除，将在下次启动时清理: {e}")
+    
+    def _sweep_partition_files(self):
+        """删除分区目录中未登记在清单里的归档文件（上次删除分区时未能删除的残留）"""
+        if not os.path.isdir(self.partition_dir):
+            return
+        
+        known = {row[0] for row in self._get_connection().execute('SELECT file_name FROM partitions')}
+        pattern = re.compile(re.escape(self._partition_stem) + r'-\d{4}-\d{2}\.db')
+        for file_name in os.listdir(self.partition_dir):
+            if pattern.fullmatch(file_name) and file_name not in known:
+                try:
+                    os.remove(os.path.join(self.partition_dir, file_name))
+                    print(f"清理残留的归档分区文件: {file_name}")
+                except OSError as e:
+                    print(f"清理归档分区文件失败: {e}")
+    
+    def _clear_old_partitions(self, cutoff: int) -> int:
+        """清理归档分区中早于 cutoff 的记录，返回删除的条数
+        
+        整个月份都早于 cutoff 的分区直接删除文件；跨越 cutoff 的分区分批删除后压缩。
+        """
+        removed = 0
+        for month, file_name, _, _, _, max_ts, row_count in self._list_partitions(end=cutoff):
+            if max_ts < cutoff:
+                self._drop_partition(month, file_name)
+                removed += row_count
+                continue
             
-            cursor.execute('DELETE FROM clipboard_history WHERE id = ?', (entry_id,))
+            alias = self._attach_partition(month, file_name)
+            partition_removed = 0
+            while True:
+                with self._transaction() as cursor:
+                    cursor.execute(f'''
+                        DELETE FROM {alias}.clipboard_history WHERE id IN (
+                            SELECT id FROM {alias}.clipboard_history
+                            WHERE timestamp < ?
+                            ORDER BY timestamp
+                            LIMIT ?
+                        )
+                    ''', (cutoff, self.cleanup_chunk_size))
+                    chunk = cursor.rowcount
+                    self._regroup_partition(cursor, alias)
+                    self._refresh_partition(cursor, alias)
+                partition_removed += chunk
+                if chunk < self.cleanup_chunk_size:
+                    break
+            if partition_removed:
+                removed += partition_removed
+                self._seal_partition(month)
+        return removed
+    
+    def _restore_archived(self, entry_id: int) -> bool:
+        """将归档分区中的记录移回当前分区并设为收藏，返回是否找到该记录
+        
+        当前分区已有相同内容的记录时只收藏该记录，归档中的副本删除。标签关联随记录移回。
+        """
+        schema = self._find_archived(entry_id)
+        if schema is None:
+            return False
+        
+        with self._transaction() as cursor:
+            self._ensure_partition_schema(cursor, schema)
+            cursor.execute(f'SELECT digest FROM {schema}.clipboard_history WHERE id = ?', (entry_id,))
+            digest = cursor.fetchone()[0]
+            cursor.execute('UPDATE clipboard_history SET is_favorite = 1 WHERE digest = ?', (digest,))
+            if cursor.rowcount == 0:
+                cursor.execute('PRAGMA main.table_info(clipboard_history)')
+                columns = ', '.join(row[1] for row in cursor.fetchall())
+                cursor.execute(f'''
+                    INSERT INTO main.clipboard_history ({columns})
+                    SELECT {columns} FROM {schema}.clipboard_history WHERE id = ?
+                ''', (entry_id,))
+                cursor.execute(f'''
+                    UPDATE clipboard_history SET is_favorite = 1, group_id = NULL, collapsed = 0, near_dups = 0,
+                        timestamp = {self._EPOCH_MS_SQL.format(column='timestamp')}
+                    WHERE id = ?
+                ''', (entry_id,))
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO main.entry_tags (tag_id, entry_id)
+                SELECT a.tag_id, h.id FROM {schema}.entry_tags AS a, main.clipboard_history AS h
+                WHERE a.entry_id = ? AND h.digest = ?
+            ''', (entry_id, digest))
+            cursor.execute(f'DELETE FROM {schema}.clipboard_history WHERE id = ?', (entry_id,))
+            self._regroup_partition(cursor, schema)
+            self._refresh_partition(cursor, schema)
+        
+        print(f"归档记录已移回当前分区: ID {entry_id}")
+        return True
+    
+    def reclaim_free_pages(self, max_pages: Optional[int] = None) -> int:
+        """通过 incremental_vacuum 将空闲页归还给文件系统，返回回收的页数
+        
+        每次最多回收 max_pages（默认 vacuum_pages_per_step）页，
+        多次调用逐步收缩数据库文件，避免长时间持有写锁。
+        """
+        try:
+            conn = self._get_connection()
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return 0
             
-            if cursor.rowcount > 0:
-                conn.commit()
-                print(f"删除记录成功: ID {entry_id}")
-                result = True
-            else:
-                print(f"未找到要删除的记录: ID {entry_id}")
-                result = False
-                
-            conn.close()
-            return result
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            pages = min(free_pages, max_pages or self.vacuum_pages_per_step)
+            if pages <= 0:
+                return 0
             
+            # execute 只会执行一步（回收一页），executescript 才会把语句执行完毕
+            conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+            reclaimed = free_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if reclaimed:
+                print(f"回收数据库空闲页: {reclaimed} 页")
+            return reclaimed
+        
         except Exception as e:
-            print(f"删除记录失败: {e}")
-            return False
+            print(f"回收数据库空间失败: {e}")
+            return 0
     
-    def toggle_favorite(self, entry_id: int) -> bool:
-        """切换记录的收藏状态"""
+    def enable_incremental_vacuum(self) -> bool:
+        """将旧版本创建的数据库切换为 auto_vacuum=INCREMENTAL，返回数据库是否已处于该模式
+        
+        新数据库创建时即为增量模式。已有的数据库需要执行一次 VACUUM 重写整个文件，
+        期间持有写锁，并临时占用约两倍文件大小的磁盘空间，因此不在启动时进行，
+        由调用方在空闲时按需执行（见配置 database.incremental_vacuum_upgrade）；磁盘空间不足时放弃。
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                'UPDATE clipboard_history SET is_favorite = NOT is_favorite WHERE id = ?',
-                (entry_id,)
-            )
+            conn = self._get_connection()
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return True
             
-            if cursor.rowcount > 0:
-                conn.commit()
-                print(f"切换收藏状态成功: ID {entry_id}")
-                result = True
-            else:
-                result = False
-                
-            conn.close()
-            return result
+            db_size = os.path.getsize(self.db_path)
+            free = shutil.disk_usage(os.path.dirname(os.path.abspath(self.db_path))).free
+            if free < db_size * 2:
+                print(f"磁盘剩余空间不足，暂不启用增量回收空间（约需 {round(db_size * 2 / (1024 * 1024), 1)} MB）")
+                return False
             
+            print(f"正在重建数据库以启用增量回收空间（{round(db_size / (1024 * 1024), 1)} MB）...")
+            started = time.monotonic()
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            print(f"已启用增量回收空间，耗时 {round(time.monotonic() - started, 1)} 秒")
+            return True
+        
         except Exception as e:
-            print(f"切换收藏状态失败: {e}")
+            print(f"启用增量回收空间失败: {e}")
             return False
     
-    def clear_old_entries(self, days: int = 30) -> int:
-        """清理指定天数之前的记录（保留收藏的记录）"""
+    def collect_blob_garbage(self) -> int:
+        """删除引用计数归零的外部存储对象，返回删除的对象数
+        
+        在写事务中完成，与写入新对象的事务串行，不会误删正在被引用的内容。
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cutoff_date = datetime.now() - timedelta(days=days)
-            
-            cursor.execute('''
-                DELETE FROM clipboard_history 
-                WHERE timestamp < ? AND is_favorite = 0
-            ''', (cutoff_date,))
-            
-            deleted_count = cursor.rowcount
-            conn.commit()
-            conn.close()
+            removed = 0
+            with self._transaction() as cursor:
+                cursor.execute('SELECT blob_hash FROM blob_refs WHERE refcount <= 0')
+                for (blob_hash,) in cursor.fetchall():
+                    self.blob_store.delete(blob_hash)
+                    removed += 1
+                cursor.execute('DELETE FROM blob_refs WHERE refcount <= 0')
             
-            print(f"清理了 {deleted_count} 条超过 {days} 天的记录")
-            return deleted_count
+            if removed:
+                print(f"回收外部存储对象: {removed} 个")
+            return removed
+        
+        except Exception as e:
+            print(f"回收外部存储对象失败: {e}")
+            return 0
+    
+    def sweep_orphan_blobs(self, batch_size: int = 256) -> int:
+        """清理磁盘上没有任何引用记录的对象（例如写入后事务回滚或进程中途退出留下的文件）
+        
+        先在事务外遍历目录，再按 batch_size 个一批在短写事务中核对并删除：写入新对象
+        同样在写事务中进行，核对时未被引用的对象不会被并发的写入用到。
+        """
+        try:
+            removed = 0
+            hashes = list(self.blob_store.iter_hashes())
+            for start in range(0, len(hashes), batch_size):
+                with self._transaction() as cursor:
+                    for blob_hash in hashes[start:start + batch_size]:
+                        cursor.execute('SELECT 1 FROM blob_refs WHERE blob_hash = ? AND refcount > 0', (blob_hash,))
+                        if cursor.fetchone() is None and self.blob_store.delete(blob_hash):
+                            removed += 1
             
+            if removed:
+                print(f"清理孤立的外部存储对象: {removed} 个")
+            return removed
+        
         except Exception as e:
-            print(f"清理旧记录失败: {e}")
+            print(f"清理孤立对象失败: {e}")
             return 0
     
+    def get_entry_count(self) -> int:
+        """读取触发器维护的记录总数，加上分区清单中各归档分区的记录数"""
+        row = self._get_connection().execute('''
+            SELECT (SELECT value FROM storage_counters WHERE name = 'row_count'),
+                   (SELECT COALESCE(SUM(row_count), 0) FROM partitions)
+        ''').fetchone()
+        return (row[0] or 0) + row[1]
+    
     def get_statistics(self) -> Dict:
-        """获取数据库统计信息"""
+        """获取数据库统计信息（读取触发器维护的计数器，开销与记录数无关）"""
+        # 今日计数随日期变化，日期作为缓存键的一部分
+        today = datetime.now().date().isoformat()
+        key = ('statistics', today)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            conn = self._get_connection()
             
-            # 总记录数
-            cursor.execute('SELECT COUNT(*) FROM clipboard_history')
-            total_count = cursor.fetchone()[0]
+            counters = dict(conn.execute('SELECT name, value FROM storage_counters').fetchall())
             
-            # 收藏记录数
-            cursor.execute('SELECT COUNT(*) FROM clipboard_history WHERE is_favorite = 1')
-            favorite_count = cursor.fetchone()[0]
+            # 归档分区的汇总保存在清单中，统计时无需附加分区文件
+            archive_count, archive_size = 0, 0
+            partitions = conn.execute('SELECT file_name, row_count, stats FROM partitions').fetchall()
+            for file_name, row_count, stats in partitions:
+                stats = json.loads(stats)
+                archive_count += row_count
+                for name in ('total_bytes', 'compressed_count', 'compressed_raw_bytes', 'compressed_bytes'):
+                    counters[name] = counters.get(name, 0) + stats.get(name, 0)
+                for content_type, count in stats.get('types', {}).items():
+                    counters['type:' + content_type] = counters.get('type:' + content_type, 0) + count
+                path = os.path.join(self.partition_dir, file_name)
+                if os.path.exists(path):
+                    archive_size += os.path.getsize(path)
             
-            # 今天的记录数
-            today = datetime.now().date()
-            cursor.execute(
-                'SELECT COUNT(*) FROM clipboard_history WHERE DATE(timestamp) = ?',
-                (today,)
-            )
-            today_count = cursor.fetchone()[0]
+            type_counts = {
+                name[len('type:'):]: value
+                for name, value in counters.items()
+                if name.startswith('type:') and value > 0
+            }
             
-            # 数据库文件大小
-            db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+            # 今天的记录数（按本地日期汇总）
+            row = conn.execute(
+                'SELECT entry_count, byte_count FROM daily_stats WHERE day = ?', (today,)
+            ).fetchone()
+            today_count, today_bytes = row if row else (0, 0)
             
-            conn.close()
+            # 压缩效果
+            raw_bytes = counters.get('compressed_raw_bytes', 0)
+            stored_bytes = counters.get('compressed_bytes', 0)
             
-            return {
-                'total_count': total_count,
-                'favorite_count': favorite_count,
+            # 数据库文件大小（WAL 模式下包含尚未检查点的日志）
+            db_size = 0
+            for path in (self.db_path, self.db_path + '-wal'):
+                if os.path.exists(path):
+                    db_size += os.path.getsize(path)
+            
+            return self.query_cache.put(key, generation, {
+                'total_count': counters.get('row_count', 0) + archive_count,
+                'favorite_count': counters.get('favorite_count', 0),
                 'today_count': today_count,
+                'today_bytes': today_bytes,
+                'total_bytes': counters.get('total_bytes', 0),
+                'type_counts': type_counts,
                 'db_size': db_size,
-                'db_size_mb': round(db_size / (1024 * 1024), 2)
-            }
-            
+                'db_size_mb': round(db_size / (1024 * 1024), 2),
+                'compressed_count': counters.get('compressed_count', 0),
+                'compression_ratio': round(raw_bytes / stored_bytes, 2) if stored_bytes else 1.0,
+                'compression_saved_bytes': raw_bytes - stored_bytes,
+                'compression_dict_version': self._zdict_version,
+                'partition_count': len(partitions),
+                'archived_count': archive_count,
+                'archive_size_mb': round(archive_size / (1024 * 1024), 2)
+            })
+        
         except Exception as e:
             print(f"获取统计信息失败: {e}")
             return {}
     
-    def export_data(self, output_file: str, format: str = 'json') -> bool:
-        """导出数据到文件"""
+    def get_daily_counts(self, days: int = 7) -> List[Dict]:
+        """获取最近若干天（本地日期）每天新增的记录数和字节数"""
+        today = datetime.now().date()
+        key = ('daily', days, today.isoformat())
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.query_cache.generation
+        
         try:
-            data = self.get_clipboard_history(limit=10000)  # 导出所有数据
+            first_day = today - timedelta(days=days - 1)
+            since = first_day.isoformat()
+            conn = self._get_connection()
+            totals = {}
+            for day, count, size in conn.execute(
+                'SELECT day, entry_count, byte_count FROM daily_stats WHERE day >= ?', (since,)
+            ):
+                totals[day] = [count, size]
             
-            if format.lower() == 'json':
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2, default=str)
-            else:
-                print(f"不支持的导出格式: {format}")
-                return False
-                
-            print(f"数据导出成功: {output_file}")
-            return True
+            # 归档分区的按天汇总在清单中，只需读取时间范围覆盖这些日期（自首日本地零点起）的分区
+            earliest = to_epoch_ms(datetime.combine(first_day, datetime.min.time()))
+            for (stats,) in conn.execute('SELECT stats FROM partitions WHERE max_ts >= ?', (earliest,)).fetchall():
+                for day, (count, size) in json.loads(stats).get('days', {}).items():
+                    if day >= since:
+                        total = totals.setdefault(day, [0, 0])
+                        total[0] += count
+                        total[1] += size
             
+            return self.query_cache.put(key, generation, [
+                {'day': day, 'count': count, 'bytes': size}
+                for day, (count, size) in sorted(totals.items(), reverse=True)
+                if count > 0
+            ])
+        
+        except Exception as e:
+            print(f"获取每日统计失败: {e}")
+            return []
+    
+    def get_query_cache_stats(self) -> Dict:
+        """查询缓存的命中、未命中和淘汰次数以及当前占用，用于调整缓存容量"""
+        return self.query_cache.get_stats()
+    
+    def get_profile_report(self) -> Optional[Dict]:
+        """耗时统计报告（方法和语句的延迟分布、慢查询及其查询计划），未启用 profile_queries 时返回 None"""
+        return self.profiler.get_report() if self.profiler else None
+    
+    def dump_profile_report(self, output_file: str) -> bool:
+        """将耗时统计报告写入 JSON 文件"""
+        report = self.get_profile_report()
+        if report is None:
+            print("未启用耗时统计（database.profile_queries）")
+            return False
+        
+        try:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"耗时统计报告已保存: {output_file}")
+            return True
+        
+        except Exception as e:
+            print(f"保存耗时统计报告失败: {e}")
+            return False
+    
+    def export_data(self, output_file: str, format: str = 'json', **options) -> bool:
+        """导出数据到文件，支持 json / ndjson / csv，其余参数见 ClipboardExporter.export"""
+        from clipboard_export import ClipboardExporter
+        
+        try:
+            count = ClipboardExporter(self).export(output_file, format, **options)
+            print(f"数据导出成功: {output_file}（{count} 条记录）")
+            return True
+        
         except Exception as e:
             print(f"数据导出失败: {e}")
             return False
+    
+    def import_data(self, input_file: str, format: Optional[str] = None, **options) -> Dict:
+        """从导出文件批量导入记录，返回导入统计，失败时返回空字典
+        
+        支持 json / ndjson / csv（可 gzip 压缩），其余参数见 ClipboardImporter.import_file。
+        """
+        from clipboard_import import ClipboardImporter
+        
+        try:
+            return ClipboardImporter(self).import_file(input_file, format, **options)
+        
+        except Exception as e:
+            print(f"数据导入失败: {e}")
+            return {}
+    
+    @contextmanager
+    def _backup_operation(self):
+        """登记一次备份或恢复，close 等待登记的操作全部结束；存储关闭后不再接受新的操作"""
+        with self._backup_condition:
+            if self._backup_cancel.is_set():
+                raise sqlite3.ProgrammingError("数据库存储已关闭")
+            self._backup_active += 1
+        try:
+            yield
+        finally:
+            with self._backup_condition:
+                self._backup_active -= 1
+                self._backup_condition.notify_all()
+    
+    def _check_backup_cancelled(self):
+        """存储正在关闭时中止备份"""
+        if self._backup_cancel.is_set():
+            raise InterruptedError("存储正在关闭，备份已中止")
+    
+    def backup_database(self, target_dir: str, pages_per_step: int = 256, step_pause_ms: int = 20,
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """用 SQLite 备份 API 将主库、归档分区和外部存储对象复制到 target_dir，返回备份清单
+        
+        复制在单独的连接上进行：先开启读事务固定快照，再每次复制 pages_per_step 页、
+        间隔 step_pause_ms 毫秒。WAL 模式下读事务不阻塞写入，快照固定后其他连接的写入
+        也不会让备份从头开始。先复制主库，再复制该快照清单中的归档分区：期间归档的记录
+        在备份中同时出现在两边（读取时以主库为准），不会丢失。
+        progress_callback(已复制页数, 总页数) 在每步之后调用，按主库和各分区依次累计。
+        存储关闭时备份在下一步中止并抛出 InterruptedError，close 等待其结束后才关闭连接。
+        """
+        with self._backup_operation():
+            return self._copy_to_backup(target_dir, pages_per_step, step_pause_ms, progress_callback)
+    
+    def _copy_to_backup(self, target_dir: str, pages_per_step: int, step_pause_ms: int,
+                        progress_callback: Optional[Callable[[int, int], None]]) -> Dict:
+        os.makedirs(target_dir, exist_ok=True)
+        pause = max(0, step_pause_ms) / 1000.0
+        
+        def copy_database(source: sqlite3.Connection, target_file: str) -> int:
+            state = {'pages': 0}
+            
+            def on_step(status, remaining, total):
+                state['pages'] = total
+                # 回调中抛出的异常使备份 API 中止本次复制
+                self._check_backup_cancelled()
+                if progress_callback:
+                    progress_callback(total - remaining, total)
+                if remaining and pause:
+                    self._backup_cancel.wait(pause)
+            
+            target = sqlite3.connect(target_file)
+            try:
+                source.backup(target, pages=max(1, pages_per_step), progress=on_step)
+                # 备份文件单独保存，不需要 WAL
+                target.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                target.close()
+            return state['pages']
+        
+        source = self._open_connection()
+        try:
+            source.execute('BEGIN')
+            partitions = source.execute('SELECT month, file_name FROM partitions ORDER BY month').fetchall()
+            db_file = os.path.basename(self.db_path)
+            pages = copy_database(source, os.path.join(target_dir, db_file))
+            blob_hashes = [row[0] for row in source.execute('SELECT blob_hash FROM blob_refs WHERE refcount > 0')]
+            source.execute('COMMIT')
+        finally:
+            source.close()
+        
+        partition_files = []
+        for month, file_name in partitions:
+            self._check_backup_cancelled()
+            path = os.path.join(self.partition_dir, file_name)
+            if not os.path.exists(path):
+                continue
+            os.makedirs(os.path.join(target_dir, 'partitions'), exist_ok=True)
+            source = sqlite3.connect(path, isolation_level=None, timeout=self.db_config['busy_timeout'] / 1000.0)
+            try:
+                source.execute('BEGIN')
+                source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                pages += copy_database(source, os.path.join(target_dir, 'partitions', file_name))
+                source.execute('COMMIT')
+            finally:
+                source.close()
+            partition_files.append(file_name)
+        
+        # 外部存储对象写入后不再修改，备份中建立硬链接即可
+        target_blobs = BlobStore(os.path.join(target_dir, 'blobs'))
+        missing_blobs = 0
+        for blob_hash in blob_hashes:
+            self._check_backup_cancelled()
+            try:
+                target_blobs.put_file(self.blob_store.path_for(blob_hash), blob_hash)
+            except FileNotFoundError:
+                missing_blobs += 1
+        if missing_blobs:
+            print(f"备份时有 {missing_blobs} 个外部存储对象已丢失")
+        
+        return {
+            'database': db_file,
+            'partitions': partition_files,
+            'blobs': len(blob_hashes) - missing_blobs,
+            'missing_blobs': missing_blobs,
+            'pages': pages
+        }
+    
+    def restore_database(self, source_dir: str, manifest: Dict) -> bool:
+        """用 backup_database 生成的备份替换当前数据（无需重启程序）
+        
+        恢复前停止写入线程和后台回填线程，并关闭当前线程以外的所有连接，其他线程下次访问时
+        重新打开连接；恢复期间捕获的记录暂存在新的写入队列中，恢复完成后写入。
+        后台清理等由调用方创建的线程须由调用方在恢复前停止。
+        主库通过备份 API 写入当前连接；归档分区逐个覆盖，备份中没有的分区文件在没有任何连接
+        附加时由初始化的残留清理删除。恢复后重新执行初始化，较旧的备份会按版本迁移。
+        """
+        try:
+            with self._backup_operation():
+                writer = self.writer
+                if writer is not None:
+                    # 新的写入线程先不启动，恢复期间提交的记录在其队列中等待；
+                    # 仍持有旧写入线程的调用方提交的记录由旧线程转交过来
+                    self.writer = self._create_writer(writer.on_committed)
+                    writer.close(successor=self.writer)
+                try:
+                    self._backfill_stop.set()
+                    if self.backfill_thread is not None and self.backfill_thread is not threading.current_thread():
+                        self.backfill_thread.join()
+                    self._close_other_connections()
+                    self._restore_files(source_dir, manifest)
+                finally:
+                    if writer is not None:
+                        self.writer.start()
+            
+            print(f"已从备份恢复: {source_dir}")
+            return True
+        
+        except Exception as e:
+            print(f"从备份恢复失败: {e}")
+            return False
+    
+    def _restore_files(self, source_dir: str, manifest: Dict):
+        """复制备份中的主库、归档分区和外部存储对象，然后重新初始化（须已停止其他线程的访问）"""
+        conn = self._get_connection()
+        for alias in list(self._local.attached.keys()):
+            self._detach_partition(self._local.attached[alias])
+        
+        source = sqlite3.connect(os.path.join(source_dir, manifest['database']))
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+        self.query_cache.invalidate()
+        
+        os.makedirs(self.partition_dir, exist_ok=True)
+        for file_name in manifest.get('partitions', []):
+            source = sqlite3.connect(os.path.join(source_dir, 'partitions', file_name))
+            target = sqlite3.connect(os.path.join(self.partition_dir, file_name))
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        
+        source_blobs = BlobStore(os.path.join(source_dir, 'blobs'))
+        for blob_hash in source_blobs.iter_hashes():
+            self.blob_store.put_file(source_blobs.path_for(blob_hash), blob_hash)
+        
+        self.init_database()
+        self.query_cache.invalidate()
+
+
+class ClipboardWriter:
+    """后台写入线程：剪贴板记录先进入有界队列，再按批合并为一个事务提交
+    
+    攒够 batch_size 条或等待超过 flush_interval_ms 毫秒即提交一次，
+    突发的连续复制只产生少量 fsync。submit 从不阻塞调用线程（剪贴板监控线程）：
+    队列满说明写入已远远跟不上，新记录直接丢弃并计入 dropped。
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, storage: ClipboardStorage, batch_size: int = 64, flush_interval_ms: int = 200,
+                 queue_size: int = 1000, on_committed: Optional[Callable] = None):
+        self.storage = storage
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        self.on_committed = on_committed
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.writer_thread = None
+        self.is_closing = False
+        self.dropped = 0
+        # 检查 is_closing 与入队在同一把锁内完成，close 置位后不会再有记录进入队列
+        self._submit_lock = threading.Lock()
+        # 关闭时指定的接替者，之后提交的记录和队列中剩余的记录转交给它
+        self.successor = None
+    
+    def start(self):
+        """启动写入线程"""
+        if self.writer_thread and self.writer_thread.is_alive():
+            return
+        self.is_closing = False
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="ClipboardWriter", daemon=True)
+        self.writer_thread.start()
+        print("存储写入线程已启动")
+    
+    def submit(self, content: str, content_type: str, metadata: dict) -> bool:
+        """提交一条记录，返回是否已入队或写入
+        
+        队列已满时丢弃该记录并返回 False，不等待。已关闭时转交给接替的写入线程，
+        没有接替者时退化为同步写入。
+        """
+        entry = (content, content_type, metadata)
+        with self._submit_lock:
+            if not self.is_closing:
+                try:
+                    self.queue.put_nowait(entry)
+                    return True
+                except queue.Full:
+                    self.dropped += 1
+                    print(f"写入队列已满，丢弃记录: {len(content)} 字符（累计丢弃 {self.dropped} 条）")
+                    return False
+            successor = self.successor
+        
+        if successor is not None:
+            return successor.submit(content, content_type, metadata)
+        written = self.storage.add_clipboard_entries([entry]) == 1
+        if written and self.on_committed:
+            self.on_committed([entry])
+        return written
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待当前已入队的记录全部提交，超时返回 False"""
+        if not (self.writer_thread and self.writer_thread.is_alive()):
+            return self.queue.empty()
+        
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    
+    def close(self, timeout: Optional[float] = None, successor: Optional['ClipboardWriter'] = None):
+        """停止接收新记录，排空队列后结束写入线程
+        
+        给定 successor 时，关闭后提交的记录和写入线程未处理完的记录转交给它，不在当前线程写入。
+        """
+        with self._submit_lock:
+            if self.is_closing:
+                return
+            self.is_closing = True
+            self.successor = successor
+        
+        if self.writer_thread and self.writer_thread.is_alive():
+            self.queue.put(self._STOP)
+            self.writer_thread.join(timeout)
+        
+        # 置位后不再有记录入队；写入线程未启动或等待超时时队列中可能还有剩余记录
+        leftover = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not self._STOP:
+                leftover.append(item)
+        if leftover and successor is not None:
+            for entry in leftover:
+                successor.submit(*entry)
+        elif leftover:
+            self.storage.add_clipboard_entries(leftover)
+        print("存储写入线程已停止")
+    
+    def _collect_batch(self):
+        """阻塞等待第一条记录，然后在时间窗口内继续攒批"""
+        batch, waiters, stop = [], [], False
+        item = self.queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        
+        while True:
+            if item is self._STOP:
+                stop = True
+                break
+            if isinstance(item, threading.Event):
+                # flush 请求：立即提交已攒的记录
+                waiters.append(item)
+                break
+            
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                break
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        
+        return batch, waiters, stop
+    
+    def _writer_loop(self):
+        """写入循环，在后台线程中运行"""
+        while True:
+            batch, waiters, stop = self._collect_batch()
+            
+            if batch:
+                try:
+                    if self.storage.add_clipboard_entries(batch) and self.on_committed:
+                        self.on_committed(batch)
+                except Exception as e:
+                    print(f"批量写入出错: {e}")
+            
+            for waiter in waiters:
+                waiter.set()
+            
+            if stop:
+                break
 
 
 def test_clipboard_storage():
@@ -317,7 +4695,7 @@ def test_clipboard_storage():
     print("\n测试获取历史记录...")
     history = storage.get_clipboard_history(5)
     for item in history:
-        print(f"ID: {item['id']}, 时间: {item['timestamp']}, 预览: {item['preview']}")
+        print(f"ID: {item.id}, 时间: {from_epoch_ms(item.timestamp)}, 预览: {item.preview}")
     
     # 测试搜索
     print("\n测试搜索功能...")
@@ -329,7 +4707,8 @@ def test_clipboard_storage():
     stats = storage.get_statistics()
     print(f"统计信息: {stats}")
     
-    # 清理测试数据库
+    # 关闭连接并清理测试数据库
+    storage.close()
     os.remove("test_clipboard.db")
     print("\n测试完成，清理测试数据库")
 
@@ -2,29 +2,44 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 import win32clipboard
 import win32con
-from datetime import datetime
 from typing import List, Dict, Optional, Callable
+import os
 import threading
+import re
+
+from clipboard_backup import ClipboardBackup
+from clipboard_export import ClipboardExporter
+from clipboard_storage import ClipEntry, TimestampFormatter, compile_regex
 
 
 class ClipboardUI:
     """剪贴板管理器的用户界面"""
     
+    SEARCH_MODES = ('普通', '模糊', '正则')
+    ALL_TAGS = '全部标签'
+    
     def __init__(self, config_manager, storage_manager):
         self.config = config_manager
         self.storage = storage_manager
         self.root = None
         self.current_items = []
         self.selected_item = None
+        self.next_page_token = None  # 历史列表下一页的续页令牌
+        self.time_formatter = TimestampFormatter()  # 按天缓存的时间格式化
         
         # 回调函数
         self.on_copy_callback = None
         self.on_delete_callback = None
         self.on_favorite_callback = None
         self.on_clear_callback = None
+        self.on_restore_callback = None
         
         # UI 组件
         self.search_var = None
+        self.search_mode_var = None
+        self.tag_var = None
+        self.favorites_only_var = None
+        self.tag_box = None
         self.tree = None
         self.status_label = None
         self.total_label = None
@@ -84,17 +99,24 @@ class ClipboardUI:
         # 文件菜单
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="文件", menu=file_menu)
+        file_menu.add_command(label="导入数据...", command=self.import_data)
         file_menu.add_command(label="导出数据...", command=self.export_data)
         file_menu.add_command(label="清理旧数据...", command=self.cleanup_old_data)
         file_menu.add_separator()
+        file_menu.add_command(label="立即备份", command=self.backup_now)
+        file_menu.add_command(label="从备份恢复...", command=self.restore_backup)
+        file_menu.add_separator()
         file_menu.add_command(label="退出", command=self.on_window_close)
         
         # 编辑菜单
         edit_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="编辑", menu=edit_menu)
         edit_menu.add_command(label="复制选中项", command=self.copy_selected, accelerator="Ctrl+C")
+        edit_menu.add_command(label="查看详情", command=self.show_detail, accelerator="Enter")
         edit_menu.add_command(label="删除选中项", command=self.delete_selected, accelerator="Delete")
         edit_menu.add_command(label="切换收藏", command=self.toggle_favorite, accelerator="Ctrl+F")
+        edit_menu.add_command(label="添加标签...", command=self.tag_selected)
+        edit_menu.add_command(label="移除标签...", command=self.untag_selected)
         edit_menu.add_separator()
         edit_menu.add_command(label="全部清除...", command=self.clear_all_data)
         
@@ -149,6 +171,41 @@ class ClipboardUI:
         
         # 搜索按钮
         ttk.Button(search_frame, text="搜索", command=self.search_data).pack(side=tk.RIGHT, padx=(5, 0))
+        
+        # 搜索方式：普通 / 模糊（容忍错字）/ 正则
+        self.search_mode_var = tk.StringVar(value=self.SEARCH_MODES[0])
+        mode_box = ttk.Combobox(search_frame, textvariable=self.search_mode_var, values=self.SEARCH_MODES,
+                                state='readonly', width=5)
+        mode_box.pack(side=tk.RIGHT, padx=(5, 0))
+        mode_box.bind('<<ComboboxSelected>>', lambda e: self.search_data())
+        
+        # 历史筛选：标签和仅收藏（浏览历史时生效）
+        self.favorites_only_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="仅收藏", variable=self.favorites_only_var,
+                        command=self.search_data).pack(side=tk.RIGHT, padx=(5, 0))
+        
+        self.tag_var = tk.StringVar(value=self.ALL_TAGS)
+        self.tag_box = ttk.Combobox(search_frame, textvariable=self.tag_var, values=(self.ALL_TAGS,),
+                                    state='readonly', width=10)
+        self.tag_box.pack(side=tk.RIGHT, padx=(5, 0))
+        self.tag_box.bind('<<ComboboxSelected>>', lambda e: self.search_data())
+        ttk.Label(search_frame, text="标签:").pack(side=tk.RIGHT, padx=(5, 0))
+        self.refresh_tags()
+    
+    def refresh_tags(self):
+        """重新加载标签筛选下拉框，已删除的标签回到全部"""
+        names = [tag['name'] for tag in self.storage.get_tags()]
+        self.tag_box.config(values=[self.ALL_TAGS] + names)
+        if self.tag_var.get() not in names:
+            self.tag_var.set(self.ALL_TAGS)
+    
+    def get_page_filter(self) -> Dict:
+        """当前的历史筛选条件，首页和续页须使用相同的条件"""
+        tag = self.tag_var.get()
+        return {
+            'tags': [tag] if tag != self.ALL_TAGS else None,
+            'favorites_only': self.favorites_only_var.get()
+        }
     
     def create_main_content(self):
         """创建主要内容区域"""
@@ -179,7 +236,14 @@ class ClipboardUI:
         # 创建滚动条
         scrollbar_v = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.tree.yview)
         scrollbar_h = ttk.Scrollbar(main_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=scrollbar_v.set, xscrollcommand=scrollbar_h.set)
+        
+        def on_tree_scroll(first, last):
+            scrollbar_v.set(first, last)
+            # 滚动到底部附近时加载下一页
+            if self.next_page_token and float(last) >= 0.95:
+                self.root.after_idle(self.load_more)
+        
+        self.tree.configure(yscrollcommand=on_tree_scroll, xscrollcommand=scrollbar_h.set)
         
         # 布局
         self.tree.grid(row=0, column=0, sticky='nsew')
@@ -208,6 +272,7 @@ class ClipboardUI:
     def setup_shortcuts(self):
         """设置键盘快捷键"""
         self.root.bind('<Control-c>', lambda e: self.copy_selected())
+        self.root.bind('<Return>', lambda e: self.show_detail())
         self.root.bind('<Delete>', lambda e: self.delete_selected())
         self.root.bind('<Control-f>', lambda e: self.toggle_favorite())
         self.root.bind('<F5>', lambda e: self.refresh_data())
@@ -220,50 +285,86 @@ class ClipboardUI:
             # 清空当前显示
             for item in self.tree.get_children():
                 self.tree.delete(item)
+            self.current_items = []
+            self.next_page_token = None
             
-            # 获取数据
-            if search_query:
+            # 获取数据：搜索按相关度一次返回，浏览历史按页加载
+            mode = self.search_mode_var.get()
+            if search_query and mode == '模糊':
+                items = self.storage.fuzzy_search_clipboard_history(search_query, 200)
+            elif search_query and mode == '正则':
+                items = self.storage.regex_search_clipboard_history(search_query, 200)
+            elif search_query:
                 items = self.storage.search_clipboard_history(search_query, 1000)
             else:
-                items = self.storage.get_clipboard_history(1000)
+                page_size = self.config.get('display.items_per_page', 50)
+                items, self.next_page_token = self.storage.get_history_page(
+                    page_size=page_size, **self.get_page_filter()
+                )
             
-            self.current_items = items
-            
-            # 填充数据
-            for item in items:
-                # 格式化时间
-                timestamp = item['timestamp']
-                if isinstance(timestamp, str):
-                    try:
-                        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    except:
-                        timestamp = datetime.now()
-                
-                formatted_time = timestamp.strftime('%m-%d %H:%M:%S')
-                
-                # 格式化大小
-                size_text = f"{item['size']} 字符"
-                
-                # 收藏标记
-                favorite_icon = "★" if item['is_favorite'] else ""
-                
-                # 插入项目
-                self.tree.insert('', tk.END, 
-                               text=favorite_icon,
-                               values=(formatted_time, item['content_type'], size_text, item['preview']),
-                               tags=('favorite' if item['is_favorite'] else 'normal',))
+            self.append_items(items)
             
             # 配置标签样式
             self.tree.tag_configure('favorite', foreground='gold')
             self.tree.tag_configure('normal', foreground='black')
             
-            # 更新状态栏
-            self.total_label.config(text=f"总计: {len(items)} 项")
             self.status_label.config(text="数据已刷新")
             
         except Exception as e:
             messagebox.showerror("错误", f"刷新数据失败: {str(e)}")
     
+    def load_more(self):
+        """加载历史记录的下一页"""
+        token = self.next_page_token
+        if not token:
+            return
+        
+        try:
+            # 先清空令牌，避免滚动事件重复触发同一页的加载
+            self.next_page_token = None
+            page_size = self.config.get('display.items_per_page', 50)
+            items, self.next_page_token = self.storage.get_history_page(
+                token, page_size, **self.get_page_filter()
+            )
+            self.append_items(items)
+            
+        except Exception as e:
+            messagebox.showerror("错误", f"加载更多记录失败: {str(e)}")
+    
+    def append_items(self, items: List[ClipEntry]):
+        """将记录追加到列表末尾"""
+        self.current_items.extend(items)
+        
+        # 填充数据
+        for item in items:
+            # 格式化时间（毫秒时间戳，按本地时间显示）
+            formatted_time = self.time_formatter.format(item.timestamp)
+            
+            # 格式化大小
+            size_text = f"{item.size} 字符"
+            if item.line_count > 1:
+                size_text += f" / {item.line_count} 行"
+            
+            # 近似重复折叠成一行，显示组内条数
+            preview = item.preview
+            if item.near_duplicates > 0:
+                preview = f"[{item.near_duplicates + 1} 条相似] {preview}"
+            
+            # 收藏标记
+            favorite_icon = "★" if item.is_favorite else ""
+            
+            # 插入项目
+            self.tree.insert('', tk.END, 
+                           text=favorite_icon,
+                           values=(formatted_time, item.content_type, size_text, preview),
+                           tags=('favorite' if item.is_favorite else 'normal',))
+        
+        # 更新状态栏
+        if self.next_page_token:
+            self.total_label.config(text=f"已加载: {len(self.current_items)} 项（滚动加载更多）")
+        else:
+            self.total_label.config(text=f"总计: {len(self.current_items)} 项")
+    
     def on_search_changed(self, *args):
         """搜索框内容变化事件"""
         # 延迟搜索以避免频繁查询
@@ -275,10 +376,19 @@ class ClipboardUI:
     def search_data(self):
         """执行搜索"""
         query = self.search_var.get().strip()
+        mode = self.search_mode_var.get()
+        if query and mode == '正则':
+            try:
+                compile_regex(query)
+            except re.error as e:
+                self.status_label.config(text=f"正则表达式无效: {e}")
+                return
+        
         self.refresh_data(query)
         
         if query:
-            self.status_label.config(text=f"搜索: {query}")
+            label = "搜索" if mode == '普通' else f"{mode}搜索"
+            self.status_label.config(text=f"{label}: {query}")
         else:
             self.status_label.config(text="显示所有记录")
     
@@ -306,7 +416,11 @@ class ClipboardUI:
             return
         
         try:
-            content = self.selected_item['content']
+            # 列表只包含预览，复制时才按 ID 读取完整内容
+            content = self.storage.get_entry_content(self.selected_item.id)
+            if content is None:
+                messagebox.showerror("错误", "记录内容已丢失")
+                return
             
             # 复制到剪贴板
             win32clipboard.OpenClipboard()
@@ -323,6 +437,40 @@ class ClipboardUI:
         except Exception as e:
             messagebox.showerror("错误", f"复制失败: {str(e)}")
     
+    def show_detail(self):
+        """在新窗口中查看选中项目的完整内容"""
+        if not self.selected_item:
+            messagebox.showwarning("警告", "请先选择一个项目")
+            return
+        
+        try:
+            # 分块读取正文逐段插入，超大记录不必先在内存中组装完整字符串
+            stream = self.storage.open_entry_content(self.selected_item.id)
+            if stream is None:
+                messagebox.showerror("错误", "记录内容已丢失")
+                return
+            
+            window = tk.Toplevel(self.root)
+            window.title(f"记录详情 - ID {self.selected_item.id}")
+            window.geometry("600x400")
+            
+            text = tk.Text(window, wrap=tk.WORD)
+            scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=text.yview)
+            text.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            text.pack(fill=tk.BOTH, expand=True)
+            
+            with stream:
+                while True:
+                    chunk = stream.read(65536)
+                    if not chunk:
+                        break
+                    text.insert(tk.END, chunk)
+            text.configure(state=tk.DISABLED)
+            
+        except Exception as e:
+            messagebox.showerror("错误", f"查看详情失败: {str(e)}")
+    
     def delete_selected(self):
         """删除选中的项目"""
         if not self.selected_item:
@@ -331,7 +479,7 @@ class ClipboardUI:
         
         if messagebox.askyesno("确认删除", "确定要删除选中的项目吗？"):
             try:
-                if self.storage.delete_clipboard_entry(self.selected_item['id']):
+                if self.storage.delete_clipboard_entry(self.selected_item.id):
                     self.refresh_data(self.search_var.get())
                     self.status_label.config(text="项目已删除")
                     
@@ -351,9 +499,9 @@ class ClipboardUI:
             return
         
         try:
-            if self.storage.toggle_favorite(self.selected_item['id']):
+            if self.storage.toggle_favorite(self.selected_item.id):
                 self.refresh_data(self.search_var.get())
-                status = "已收藏" if not self.selected_item['is_favorite'] else "已取消收藏"
+                status = "已收藏" if not self.selected_item.is_favorite else "已取消收藏"
                 self.status_label.config(text=status)
                 
                 # 调用回调函数
@@ -365,6 +513,53 @@ class ClipboardUI:
         except Exception as e:
             messagebox.showerror("错误", f"操作失败: {str(e)}")
     
+    def get_selected_ids(self) -> List[int]:
+        """获取所有选中记录的 ID"""
+        return [self.current_items[self.tree.index(item_id)].id for item_id in self.tree.selection()]
+    
+    def ask_tag_names(self, title: str) -> List[str]:
+        """询问标签名，多个标签以逗号分隔"""
+        text = simpledialog.askstring(title, "标签名（多个以逗号分隔）:", parent=self.root)
+        return [name.strip() for name in re.split(r'[,，]', text or '') if name.strip()]
+    
+    def tag_selected(self):
+        """为选中的项目添加标签"""
+        entry_ids = self.get_selected_ids()
+        if not entry_ids:
+            messagebox.showwarning("警告", "请先选择一个项目")
+            return
+        
+        names = self.ask_tag_names("添加标签")
+        if not names:
+            return
+        
+        try:
+            count = self.storage.tag_entries(entry_ids, names)
+            self.refresh_tags()
+            self.refresh_data(self.search_var.get())
+            self.status_label.config(text=f"已为 {len(entry_ids)} 个项目添加标签（新增 {count} 个关联）")
+        except Exception as e:
+            messagebox.showerror("错误", f"添加标签失败: {str(e)}")
+    
+    def untag_selected(self):
+        """移除选中项目的标签"""
+        entry_ids = self.get_selected_ids()
+        if not entry_ids:
+            messagebox.showwarning("警告", "请先选择一个项目")
+            return
+        
+        names = self.ask_tag_names("移除标签")
+        if not names:
+            return
+        
+        try:
+            count = self.storage.untag_entries(entry_ids, names)
+            self.refresh_tags()
+            self.refresh_data(self.search_var.get())
+            self.status_label.config(text=f"已移除 {count} 个标签关联")
+        except Exception as e:
+            messagebox.showerror("错误", f"移除标签失败: {str(e)}")
+    
     def clear_all_data(self):
         """清空所有数据"""
         if messagebox.askyesno("确认清空", "确定要清空所有剪贴板历史记录吗？\n此操作不可恢复！"):
@@ -394,43 +589,247 @@ class ClipboardUI:
             except Exception as e:
                 messagebox.showerror("错误", f"清理失败: {str(e)}")
     
+    def _create_progress_window(self, title: str):
+        """创建导入导出使用的进度窗口，返回 (窗口, 文字标签, 进度条)"""
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title(title)
+        progress_window.geometry("320x90")
+        progress_window.resizable(False, False)
+        progress_window.transient(self.root)
+        
+        progress_label = ttk.Label(progress_window, text="正在准备...")
+        progress_label.pack(padx=10, pady=(10, 5), anchor=tk.W)
+        progress_bar = ttk.Progressbar(progress_window, mode='determinate', maximum=1)
+        progress_bar.pack(fill=tk.X, padx=10, pady=5)
+        
+        return progress_window, progress_label, progress_bar
+    
+    def import_data(self):
+        """导入数据（在后台线程中分批写入，界面显示进度）"""
+        filename = filedialog.askopenfilename(
+            title="导入数据",
+            filetypes=[
+                ("导出文件", "*.json *.ndjson *.jsonl *.csv *.gz"),
+                ("所有文件", "*.*")
+            ]
+        )
+        if not filename:
+            return
+        
+        progress_window, progress_label, progress_bar = self._create_progress_window("正在导入")
+        
+        def update_progress(result: Dict):
+            if progress_window.winfo_exists():
+                progress_bar.configure(maximum=max(result['total_bytes'], 1), value=result['bytes_read'])
+                progress_label.config(text=f"已处理 {result['processed']} 条（{result['batch_rate']:.0f} 条/秒）")
+        
+        def on_finished(result: Dict):
+            if progress_window.winfo_exists():
+                progress_window.destroy()
+            if result:
+                self.refresh_data(self.search_var.get())
+                self.status_label.config(text=f"数据导入成功: 新增 {result['imported']} 条记录")
+                messagebox.showinfo(
+                    "导入完成",
+                    f"新增 {result['imported']} 条，重复 {result['duplicates']} 条，无效 {result['skipped']} 条\n"
+                    f"耗时 {result['elapsed']} 秒"
+                )
+            else:
+                messagebox.showerror("错误", "数据导入失败")
+        
+        def run_import():
+            try:
+                result = self.storage.import_data(
+                    filename,
+                    progress_callback=lambda progress: self.root.after(0, update_progress, progress)
+                )
+            finally:
+                self.storage.release_connection()
+            self.root.after(0, on_finished, result)
+        
+        threading.Thread(target=run_import, name="ClipboardImport", daemon=True).start()
+    
     def export_data(self):
-        """导出数据"""
+        """导出数据（在后台线程中流式写入，界面显示进度）"""
         filename = filedialog.asksaveasfilename(
             title="导出数据",
             defaultextension=".json",
-            filetypes=[("JSON 文件", "*.json"), ("所有文件", "*.*")]
+            filetypes=[
+                ("JSON 文件", "*.json"),
+                ("NDJSON 文件", "*.ndjson *.jsonl"),
+                ("CSV 文件", "*.csv"),
+                ("gzip 压缩文件", "*.gz"),
+                ("所有文件", "*.*")
+            ]
         )
+        if not filename:
+            return
         
-        if filename:
+        favorites_only = messagebox.askyesno("导出范围", "是否只导出收藏的记录？")
+        export_format = ClipboardExporter.detect_format(filename, self.config.get('data_management.export_format', 'json'))
+        
+        progress_window, progress_label, progress_bar = self._create_progress_window("正在导出")
+        
+        def update_progress(count: int, total: int):
+            if progress_window.winfo_exists():
+                progress_bar.configure(maximum=max(total, 1), value=count)
+                progress_label.config(text=f"已导出 {count} / {total} 条记录")
+        
+        def on_finished(count: Optional[int], error: Optional[Exception]):
+            if progress_window.winfo_exists():
+                progress_window.destroy()
+            if error is None:
+                self.status_label.config(text=f"数据导出成功: {count} 条记录")
+                messagebox.showinfo("导出成功", f"已导出 {count} 条记录到: {filename}")
+            else:
+                messagebox.showerror("错误", f"导出失败: {str(error)}")
+        
+        def run_export():
+            count, error = None, None
             try:
-                if self.storage.export_data(filename):
-                    self.status_label.config(text="数据导出成功")
-                    messagebox.showinfo("导出成功", f"数据已导出到: {filename}")
-                else:
-                    messagebox.showerror("错误", "数据导出失败")
-                    
+                exporter = ClipboardExporter(self.storage)
+                count = exporter.export(
+                    filename,
+                    export_format,
+                    favorites_only=favorites_only,
+                    progress_callback=lambda done, total: self.root.after(0, update_progress, done, total)
+                )
             except Exception as e:
-                messagebox.showerror("错误", f"导出失败: {str(e)}")
+                error = e
+            finally:
+                self.storage.release_connection()
+            self.root.after(0, on_finished, count, error)
+        
+        threading.Thread(target=run_export, name="ClipboardExport", daemon=True).start()
+    
+    def backup_now(self):
+        """立即创建一代备份（在后台线程中分步复制，界面显示进度）"""
+        backup = ClipboardBackup.from_config(self.storage, self.config)
+        progress_window, progress_label, progress_bar = self._create_progress_window("正在备份")
+        
+        def update_progress(done: int, total: int):
+            if progress_window.winfo_exists():
+                progress_bar.configure(maximum=max(total, 1), value=done)
+                progress_label.config(text=f"已复制 {done} / {total} 页")
+        
+        def on_finished(manifest: Optional[Dict]):
+            if progress_window.winfo_exists():
+                progress_window.destroy()
+            if manifest:
+                self.status_label.config(text=f"备份完成: {manifest['name']}")
+            else:
+                messagebox.showerror("错误", "备份失败，详见日志")
+        
+        def run_backup():
+            manifest = backup.create(
+                progress_callback=lambda done, total: self.root.after(0, update_progress, done, total)
+            )
+            self.root.after(0, on_finished, manifest)
+        
+        threading.Thread(target=run_backup, name="ClipboardBackup", daemon=True).start()
+    
+    def restore_backup(self):
+        """选择一代备份并恢复，当前数据会被替换"""
+        backup = ClipboardBackup.from_config(self.storage, self.config)
+        backups = backup.list_backups()
+        if not backups:
+            messagebox.showinfo("从备份恢复", f"备份目录中没有可用的备份:\n{backup.backup_dir}")
+            return
+        
+        path = filedialog.askdirectory(title="选择要恢复的备份", initialdir=backup.backup_dir, mustexist=True)
+        if not path:
+            return
+        
+        name = os.path.basename(os.path.normpath(path))
+        manifest = next((item for item in backups if item['name'] == name), None)
+        if manifest is None:
+            messagebox.showerror("错误", "所选目录不是有效的备份")
+            return
+        
+        if not messagebox.askyesno("确认恢复", f"将恢复到 {manifest['created_at']} 的备份，\n"
+                                               f"当前的剪贴板历史会被替换。确定继续吗？"):
+            return
+        
+        restore = self.on_restore_callback or backup.restore
+        if restore(name):
+            self.refresh_tags()
+            self.refresh_data()
+            self.status_label.config(text=f"已从备份恢复: {name}")
+        else:
+            messagebox.showerror("错误", "恢复失败，详见日志")
     
     def show_statistics(self):
-        """显示统计信息"""
+        """显示统计信息，启用耗时统计时附带最慢的方法并可导出报告"""
         try:
             stats = self.storage.get_statistics()
+            type_text = '，'.join(f"{name} {count}" for name, count in stats.get('type_counts', {}).items()) or '无'
+            cache = self.storage.get_query_cache_stats()
+            report = self.storage.get_profile_report()
             
             stats_text = f"""剪贴板管理器统计信息
             
 总记录数: {stats.get('total_count', 0)}
 收藏记录数: {stats.get('favorite_count', 0)}
 今日记录数: {stats.get('today_count', 0)}
+内容总量: {round(stats.get('total_bytes', 0) / (1024 * 1024), 2)} MB
+按类型: {type_text}
 数据库大小: {stats.get('db_size_mb', 0)} MB
+压缩比: {stats.get('compression_ratio', 1.0)}（节省 {round(stats.get('compression_saved_bytes', 0) / 1024, 1)} KB）
+查询缓存: 命中 {cache['hits']} 次，未命中 {cache['misses']} 次（命中率 {cache['hit_rate']:.0%}），{cache['entries']} 条 / {round(cache['bytes'] / 1024, 1)} KB
 """
             
-            messagebox.showinfo("统计信息", stats_text)
+            if report is None:
+                stats_text += "\n耗时统计未启用（配置 database.profile_queries）\n"
+            else:
+                stats_text += f"\n耗时统计（自 {report['started_at']}，慢查询阈值 {report['slow_query_ms']} ms）\n"
+                for method in report['methods'][:8]:
+                    stats_text += (f"  {method['name']}: {method['count']} 次，平均 {method['mean_ms']} ms，"
+                                   f"p95 {method['p95_ms']} ms，最长 {method['max_ms']} ms\n")
+                stats_text += f"慢查询: {len(report['slow_queries'])} 条\n"
+                for query in report['slow_queries'][-5:]:
+                    flags = '；'.join(query['flags']) or '无全表扫描'
+                    stats_text += f"  {query['elapsed_ms']} ms [{query['method']}] {query['sql'][:60]}…（{flags}）\n"
+            
+            window = tk.Toplevel(self.root)
+            window.title("统计信息")
+            window.geometry("560x420")
+            
+            button_frame = ttk.Frame(window)
+            button_frame.pack(fill=tk.X, side=tk.BOTTOM, padx=5, pady=5)
+            ttk.Button(button_frame, text="关闭", command=window.destroy).pack(side=tk.RIGHT)
+            export_button = ttk.Button(button_frame, text="导出耗时报告...", command=self.export_profile_report)
+            export_button.pack(side=tk.RIGHT, padx=(0, 5))
+            if report is None:
+                export_button.configure(state=tk.DISABLED)
+            
+            text = tk.Text(window, wrap=tk.WORD)
+            scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=text.yview)
+            text.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            text.pack(fill=tk.BOTH, expand=True)
+            
+            text.insert('1.0', stats_text)
+            text.configure(state=tk.DISABLED)
             
         except Exception as e:
             messagebox.showerror("错误", f"获取统计信息失败: {str(e)}")
     
+    def export_profile_report(self):
+        """将耗时统计报告（延迟直方图、慢查询及查询计划）保存为 JSON 文件"""
+        filename = filedialog.asksaveasfilename(
+            title="导出耗时报告",
+            defaultextension=".json",
+            initialfile="clipboard_profile.json",
+            filetypes=[("JSON 文件", "*.json"), ("所有文件", "*.*")]
+        )
+        if not filename:
+            return
+        
+        if self.storage.dump_profile_report(filename):
+            self.status_label.config(text=f"耗时报告已导出: {filename}")
+        else:
+            messagebox.showerror("错误", "导出耗时报告失败")
+    
     def show_about(self):
         """显示关于对话框"""
         about_text = """剪贴板管理器 v1.0
@@ -466,8 +865,11 @@ class ClipboardUI:
         # 创建右键菜单
         context_menu = tk.Menu(self.root, tearoff=0)
         context_menu.add_command(label="复制", command=self.copy_selected)
+        context_menu.add_command(label="查看详情", command=self.show_detail)
         context_menu.add_command(label="删除", command=self.delete_selected)
         context_menu.add_command(label="切换收藏", command=self.toggle_favorite)
+        context_menu.add_command(label="添加标签...", command=self.tag_selected)
+        context_menu.add_command(label="移除标签...", command=self.untag_selected)
         
         try:
             context_menu.tk_popup(event.x_root, event.y_root)
@@ -516,12 +918,13 @@ class ClipboardUI:
         """隐藏窗口"""
         self.root.withdraw()
     
-    def set_callbacks(self, on_copy=None, on_delete=None, on_favorite=None, on_clear=None):
-        """设置回调函数"""
+    def set_callbacks(self, on_copy=None, on_delete=None, on_favorite=None, on_clear=None, on_restore=None):
+        """设置回调函数；on_restore(备份名) 负责在恢复前后停止和重启后台线程"""
         self.on_copy_callback = on_copy
         self.on_delete_callback = on_delete
         self.on_favorite_callback = on_favorite
         self.on_clear_callback = on_clear
+        self.on_restore_callback = on_restore
     
     def run(self):
         """运行主循环"""
@@ -12,8 +12,45 @@ class ConfigManager:
         # 数据库配置
         "database": {
             "path": "clipboard_history.db",
-            "auto_cleanup_days": 30,
-            "max_entries": 10000
+            "auto_cleanup_days": 30,  # 自动清理多少天前的记录（保留收藏），0 表示不清理
+            "auto_cleanup_interval_minutes": 60,  # 后台清理的执行间隔（分钟）
+            "cleanup_time_budget_ms": 200,  # 每轮清理删除记录的时间预算（毫秒）
+            "cleanup_chunk_size": 500,  # 清理时每个事务删除的记录数
+            "vacuum_pages_per_step": 512,  # 每轮增量回收的空闲页数
+            "incremental_vacuum_upgrade": False,  # 空闲时为旧版本创建的数据库启用增量回收（重写整个文件一次，期间暂停写入）
+            "near_duplicate_policy": "keep",  # 近似重复内容：merge 替换旧记录 / link 折叠为一组 / keep 保留
+            "near_duplicate_distance": 6,  # 判定为近似重复的最大 SimHash 汉明距离（0-7）
+            "near_duplicate_window": 1000,  # 只在最近多少条记录中查找近似重复
+            "fuzzy_max_distance": 2,  # 模糊搜索容许的最大编辑距离（按查询长度自动收紧）
+            "fuzzy_candidate_limit": 200,  # 模糊搜索每个查询片段最多取的候选数
+            "fuzzy_index_chars": 1024,  # 每条记录建立模糊索引的字符数
+            "regex_time_budget_ms": 300,  # 单次正则搜索的时间预算（毫秒），超时返回已找到的结果
+            "regex_max_chars": 16384,  # 正则只匹配每条记录开头的字符数，限制单条记录的最坏耗时
+            "backfill_batch_size": 500,  # 升级后后台回填每批处理的记录 ID 范围
+            "backfill_pause_ms": 50,  # 后台回填每批之间的间隔（毫秒）
+            "partition_by_month": False,  # 将当月之前的记录按月份移入只读的归档分区文件，已归档的内容再次复制时另存一条
+            "partition_attach_limit": 8,  # 每个连接同时附加的归档分区数
+            "query_cache_entries": 64,  # 查询结果缓存的条目数，0 表示禁用
+            "query_cache_bytes": 16777216,  # 查询结果缓存的内存上限（字节）
+            "stream_threshold": 262144,  # 超过该字节数的正文在导出时分块读取，0 表示总是整条读取
+            "stream_chunk_size": 65536,  # 分块读取正文的块大小（字节）
+            "profile_queries": False,  # 统计存储方法和 SQL 语句的耗时，可在统计信息中导出报告
+            "slow_query_ms": 50,  # 超过该耗时（毫秒）的语句连同查询计划记入慢查询日志
+            "slow_query_log_size": 100,  # 慢查询日志保留的条数
+            "max_entries": 10000,  # 历史记录上限（不含收藏，含归档分区），0 表示不限制
+            "eviction_batch_size": 16,  # 每次写入最多淘汰的旧记录数
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",  # WAL 模式下 NORMAL 已可保证一致性
+            "cache_size": -8000,  # 页缓存大小，负数表示 KB
+            "mmap_size": 67108864,  # 内存映射大小（字节）
+            "busy_timeout": 5000,  # 锁等待超时（毫秒）
+            "cached_statements": 128,  # 每个连接缓存的预编译语句数
+            "write_batch_size": 64,  # 后台写入每批最多记录数
+            "write_flush_interval_ms": 200,  # 后台写入最长攒批时间（毫秒）
+            "write_queue_size": 1000,  # 写入队列容量，写满时丢弃新记录而不阻塞剪贴板监控
+            "blob_threshold": 65536,  # 超过该字节数的内容存入外部存储，0 表示禁用
+            "compression": True,  # 使用预置字典压缩存储正文
+            "compression_min_size": 256  # 小于该字节数的内容不压缩
         },
         
         # 监听配置
@@ -60,6 +97,10 @@ class ConfigManager:
         "data_management": {
             "auto_backup": True,
             "backup_interval_days": 7,
+            "backup_dir": "",  # 备份目录，留空时使用应用数据目录下的 backups
+            "backup_keep": 5,  # 保留的备份代数
+            "backup_pages_per_step": 256,  # 备份每步复制的页数，越小越不影响剪贴板写入
+            "backup_step_pause_ms": 20,  # 备份每步之间的间隔（毫秒）
             "export_format": "json"
         },
         
@@ -162,6 +203,14 @@ class ConfigManager:
         """获取数据库路径"""
         return self.get('database.path', 'clipboard_history.db')
     
+    def get_backup_dir(self) -> str:
+        """获取备份目录，未配置时使用应用数据目录下的 backups"""
+        return self.get('data_management.backup_dir') or os.path.join(self.get_app_data_dir(), 'backups')
+    
+    def get_database_config(self) -> Dict:
+        """获取数据库配置"""
+        return self.get('database', {})
+    
     def get_window_config(self) -> Dict:
         """获取窗口配置"""
         return self.get('window', {})
@@ -21,7 +21,8 @@ sys.path.insert(0, current_dir)
 # 导入应用程序模块
 try:
     from config import ConfigManager
-    from clipboard_storage import ClipboardStorage
+    from clipboard_storage import ClipboardStorage, ClipEntry
+    from clipboard_backup import ClipboardBackup
     from clipboard_monitor import ClipboardMonitor
     from clipboard_ui import ClipboardUI
     from system_tray import SystemTray
@@ -36,11 +37,20 @@ class ClipboardManagerApp:
     def __init__(self):
         self.config = None
         self.storage = None
+        self.backup = None
         self.monitor = None
         self.ui = None
         self.tray = None
         self.running = False
         
+        # 后台自动清理线程
+        self.cleanup_thread = None
+        self.cleanup_stop_event = threading.Event()
+        
+        # 后台自动备份线程，与清理线程分开，关闭时由 storage.close() 中止进行中的备份
+        self.backup_thread = None
+        self.backup_stop_event = threading.Event()
+        
         # 初始化应用程序
         self.initialize()
     
@@ -58,7 +68,10 @@ class ClipboardManagerApp:
             
             # 初始化数据存储
             db_path = self.config.get_database_path()
-            self.storage = ClipboardStorage(db_path)
+            blob_dir = os.path.join(self.config.get_app_data_dir(), 'blobs')
+            self.storage = ClipboardStorage(db_path, self.config.get_database_config(), blob_dir)
+            self.storage.start_writer(on_committed=self.on_entries_saved)
+            self.backup = ClipboardBackup.from_config(self.storage, self.config)
             print("数据存储初始化完成")
             
             # 初始化剪贴板监听器
@@ -74,7 +87,8 @@ class ClipboardManagerApp:
                 on_copy=self.on_item_copied,
                 on_delete=self.on_item_deleted,
                 on_favorite=self.on_item_favorited,
-                on_clear=self.on_data_cleared
+                on_clear=self.on_data_cleared,
+                on_restore=self.on_restore_backup
             )
             
             # 设置UI窗口关闭回调
@@ -130,23 +144,31 @@ class ClipboardManagerApp:
                     'timestamp': data['timestamp'].isoformat()
                 }
                 
-                if self.storage.add_clipboard_entry(content, content_type, metadata):
-                    print(f"新剪贴板记录已保存: {len(content)} 字符")
-                    
-                    # 刷新UI显示（在主线程中执行）
-                    if self.ui and self.ui.root:
-                        self.ui.root.after(0, self.refresh_ui)
-                    
-                    # 系统托盘通知
-                    if self.tray and self.config.get('system_tray.show_notifications', True):
-                        preview = content[:30] + '...' if len(content) > 30 else content
-                        self.tray.show_notification("剪贴板记录", f"已保存: {preview}")
-                else:
+                # 交给后台写入线程批量落盘，提交后在 on_entries_saved 中刷新界面
+                if not self.storage.enqueue_clipboard_entry(content, content_type, metadata):
                     print("保存剪贴板记录失败")
                     
         except Exception as e:
             print(f"处理剪贴板变化失败: {e}")
     
+    def on_entries_saved(self, entries: list):
+        """后台写入线程提交一批记录后的回调"""
+        try:
+            print(f"新剪贴板记录已保存: {len(entries)} 条")
+            
+            # 刷新UI显示（在主线程中执行）
+            if self.ui and self.ui.root:
+                self.ui.root.after(0, self.refresh_ui)
+            
+            # 系统托盘通知（只提示最新一条）
+            if self.tray and self.config.get('system_tray.show_notifications', True):
+                content = entries[-1][0]
+                preview = content[:30] + '...' if len(content) > 30 else content
+                self.tray.show_notification("剪贴板记录", f"已保存: {preview}")
+                
+        except Exception as e:
+            print(f"处理保存结果失败: {e}")
+    
     def refresh_ui(self):
         """刷新用户界面"""
         try:
@@ -157,23 +179,34 @@ class ClipboardManagerApp:
         except Exception as e:
             print(f"刷新UI失败: {e}")
     
-    def on_item_copied(self, item: dict):
+    def on_item_copied(self, item: ClipEntry):
         """项目被复制回调"""
-        print(f"项目已复制: ID {item['id']}")
+        print(f"项目已复制: ID {item.id}")
     
-    def on_item_deleted(self, item: dict):
+    def on_item_deleted(self, item: ClipEntry):
         """项目被删除回调"""
-        print(f"项目已删除: ID {item['id']}")
+        print(f"项目已删除: ID {item.id}")
     
-    def on_item_favorited(self, item: dict):
+    def on_item_favorited(self, item: ClipEntry):
         """项目收藏状态改变回调"""
-        status = "收藏" if not item['is_favorite'] else "取消收藏"
-        print(f"项目{status}: ID {item['id']}")
+        status = "收藏" if not item.is_favorite else "取消收藏"
+        print(f"项目{status}: ID {item.id}")
     
     def on_data_cleared(self):
         """数据被清空回调"""
         print("所有数据已清空")
     
+    def on_restore_backup(self, name: str) -> bool:
+        """从备份恢复：先停止自动清理和自动备份线程，恢复完成后重新启动"""
+        self.stop_auto_cleanup(timeout=None)
+        self.stop_auto_backup(timeout=None)
+        try:
+            return self.backup.restore(name)
+        finally:
+            if self.running:
+                self.start_auto_cleanup()
+                self.start_auto_backup()
+    
     def on_window_close(self):
         """窗口关闭回调"""
         try:
@@ -207,6 +240,93 @@ class ClipboardManagerApp:
         except Exception as e:
             print(f"停止监听失败: {e}")
     
+    def start_auto_cleanup(self):
+        """启动后台自动清理线程"""
+        if self.cleanup_thread and self.cleanup_thread.is_alive():
+            return
+        
+        self.cleanup_stop_event.clear()
+        self.cleanup_thread = threading.Thread(target=self._auto_cleanup_loop, name="AutoCleanup", daemon=True)
+        self.cleanup_thread.start()
+        print("后台自动清理已启动")
+    
+    def stop_auto_cleanup(self, timeout: Optional[float] = 2):
+        """停止后台自动清理线程，timeout 为 None 时等待当前一轮清理完成"""
+        self.cleanup_stop_event.set()
+        if self.cleanup_thread and self.cleanup_thread.is_alive():
+            self.cleanup_thread.join(timeout=timeout)
+    
+    def _auto_cleanup_loop(self):
+        """后台清理循环：按 auto_cleanup_days 分批删除旧记录、将往月记录移入归档分区、
+        淘汰超出 max_entries 的记录并逐步回收文件空间
+        
+        每轮只在时间预算内删除一部分记录、回收有限的空闲页；
+        还有剩余工作时短暂间隔后继续，全部完成后按配置的间隔休眠。
+        开启 incremental_vacuum_upgrade 时，在空闲时将旧数据库切换为增量回收模式。
+        每次启动后第一次空闲时清理一次没有引用的外部存储对象（上次异常退出可能留下）。
+        """
+        # 启动后稍等片刻，避免与界面初始化争抢资源
+        wait_seconds = 30
+        orphans_swept = False
+        while not self.cleanup_stop_event.wait(wait_seconds):
+            try:
+                days = self.config.get('database.auto_cleanup_days', 30)
+                time_budget_ms = self.config.get('database.cleanup_time_budget_ms', 200)
+                
+                deleted = self.storage.clear_old_entries(days, time_budget_ms) if days > 0 else 0
+                archived = self.storage.rollover_partitions(time_budget_ms)
+                evicted = self.storage.evict_overflow(time_budget_ms)
+                reclaimed = self.storage.reclaim_free_pages()
+                
+                if (deleted or evicted) and self.ui and self.ui.root:
+                    self.ui.root.after(0, self.refresh_ui)
+                
+                if deleted or archived or evicted or reclaimed:
+                    wait_seconds = 1
+                else:
+                    if not orphans_swept:
+                        self.storage.sweep_orphan_blobs()
+                        orphans_swept = True
+                    if self.config.get('database.incremental_vacuum_upgrade', False):
+                        self.storage.enable_incremental_vacuum()
+                    wait_seconds = self.config.get('database.auto_cleanup_interval_minutes', 60) * 60
+                    
+            except Exception as e:
+                print(f"自动清理失败: {e}")
+                wait_seconds = 60
+    
+    def start_auto_backup(self):
+        """启动后台自动备份线程"""
+        if self.backup_thread and self.backup_thread.is_alive():
+            return
+        
+        self.backup_stop_event.clear()
+        self.backup_thread = threading.Thread(target=self._auto_backup_loop, name="AutoBackup", daemon=True)
+        self.backup_thread.start()
+        print("后台自动备份已启动")
+    
+    def stop_auto_backup(self, timeout: Optional[float] = 2):
+        """停止后台自动备份线程；退出时进行中的备份由随后的 storage.close() 中止并等待其结束"""
+        self.backup_stop_event.set()
+        if self.backup_thread and self.backup_thread.is_alive():
+            self.backup_thread.join(timeout=timeout)
+    
+    def _auto_backup_loop(self):
+        """后台备份循环：启用 auto_backup 且距上次备份超过 backup_interval_days 天时创建一代备份
+        
+        每小时检查一次。备份分步复制，不影响剪贴板写入和清理线程。
+        """
+        # 启动后稍等片刻，避开界面初始化和首轮清理
+        wait_seconds = 60
+        while not self.backup_stop_event.wait(wait_seconds):
+            try:
+                if (self.config.get('data_management.auto_backup', True)
+                        and self.backup.is_due(self.config.get('data_management.backup_interval_days', 7))):
+                    self.backup.create()
+            except Exception as e:
+                print(f"自动备份失败: {e}")
+            wait_seconds = 3600
+    
     def run(self):
         """运行应用程序"""
         try:
@@ -216,6 +336,10 @@ class ClipboardManagerApp:
             # 启动剪贴板监听
             self.start_monitoring()
             
+            # 启动后台自动清理和自动备份
+            self.start_auto_cleanup()
+            self.start_auto_backup()
+            
             # 启动系统托盘
             if self.tray:
                 if self.tray.start():
@@ -260,6 +384,10 @@ class ClipboardManagerApp:
             # 停止剪贴板监听
             self.stop_monitoring()
             
+            # 停止后台自动清理和自动备份
+            self.stop_auto_cleanup()
+            self.stop_auto_backup()
+            
             # 停止系统托盘
             if self.tray:
                 self.tray.stop()
@@ -270,10 +398,9 @@ class ClipboardManagerApp:
                 self.config.save_config()
                 print("配置已保存")
             
-            # 关闭数据库连接
+            # 排空写入队列并关闭数据库连接
             if self.storage:
-                # 这里可以添加清理数据库连接的代码
-                print("数据库连接已关闭")
+                self.storage.close()
             
             # 关闭UI
             if self.ui and self.ui.root:
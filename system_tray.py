@@ -120,12 +120,16 @@ class SystemTray:
         try:
             if self.app and hasattr(self.app, 'storage'):
                 stats = self.app.storage.get_statistics()
+                type_text = '，'.join(f"{name} {count}" for name, count in stats.get('type_counts', {}).items()) or '无'
                 stats_text = f"""剪贴板管理器统计信息
 
 总记录数: {stats.get('total_count', 0)}
 收藏记录数: {stats.get('favorite_count', 0)}
 今日记录数: {stats.get('today_count', 0)}
+内容总量: {round(stats.get('total_bytes', 0) / (1024 * 1024), 2)} MB
+按类型: {type_text}
 数据库大小: {stats.get('db_size_mb', 0)} MB
+压缩比: {stats.get('compression_ratio', 1.0)}（节省 {round(stats.get('compression_saved_bytes', 0) / 1024, 1)} KB）
 """
                 self.show_simple_message("统计信息", stats_text)
             else:
@@ -57,7 +57,8 @@ def test_imports():
     
     # 应用程序模块
     app_modules = [
-        'config', 'clipboard_storage', 'clipboard_monitor',
+        'config', 'blob_store', 'clipboard_storage', 'clipboard_export',
+        'clipboard_import', 'clipboard_backup', 'clipboard_monitor',
         'clipboard_ui', 'system_tray'
     ]
     
@@ -17,6 +17,10 @@ def test_imports():
     
     modules_to_test = [
         'config',
+        'blob_store',
+        'clipboard_backup',
+        'clipboard_export',
+        'clipboard_import',
         'clipboard_storage',
         'clipboard_monitor',
         'clipboard_ui',
@@ -103,7 +107,8 @@ def test_clipboard_storage():
         stats = storage.get_statistics()
         print(f"✓ 总记录数: {stats.get('total_count', 0)}")
         
-        # 清理测试数据库
+        # 关闭连接并清理测试数据库
+        storage.close()
         if os.path.exists("test_clipboard.db"):
             os.remove("test_clipboard.db")
         
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储层测试
+覆盖结构升级与后台回填、导出导入、近似重复、记录数上限、备份恢复和各类搜索
+"""
+
+import json
+import sqlite3
+
+import pytest
+
+from clipboard_backup import ClipboardBackup
+from clipboard_storage import ClipboardStorage, ClipboardWriter, now_ms
+
+
+def open_storage(tmp_path, name='clipboard.db', **config):
+    """在临时目录中创建存储，测试结束前由调用方关闭"""
+    return ClipboardStorage(str(tmp_path / name), config)
+
+
+def contents(entries):
+    return [entry.content for entry in entries]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = open_storage(tmp_path)
+    yield storage
+    storage.close()
+
+
+def create_v0_database(path, rows):
+    """按最初版本的表结构创建数据库：UTC 文本时间戳，user_version 为 0"""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE clipboard_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            content_type TEXT DEFAULT 'text',
+            content_hash TEXT UNIQUE,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            size INTEGER DEFAULT 0,
+            is_favorite BOOLEAN DEFAULT 0,
+            metadata TEXT DEFAULT '{}'
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_timestamp ON clipboard_history(timestamp)')
+    for index, (content, timestamp) in enumerate(rows):
+        conn.execute(
+            'INSERT INTO clipboard_history (content, content_hash, timestamp, size) VALUES (?, ?, ?, ?)',
+            (content, f'hash-{index}', timestamp, len(content))
+        )
+    conn.commit()
+    conn.close()
+
+
+def test_migration_from_v0_resumes_interrupted_backfill(tmp_path):
+    """旧库升级到当前版本，回填中途关闭后重新打开能从中断处继续完成"""
+    path = str(tmp_path / 'legacy.db')
+    rows = [(f'旧记录 {index} hello', f'2024-01-{index + 1:02d} 08:00:00') for index in range(12)]
+    create_v0_database(path, rows)
+
+    storage = ClipboardStorage(path, {'backfill_batch_size': 3})
+    conn = storage._get_connection()
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(storage.MIGRATIONS)
+    assert storage.legacy_timestamps
+
+    # 换算完成前按两种格式取值，列表顺序仍按时间倒序
+    assert contents(storage.get_clipboard_history(3)) == ['旧记录 11 hello', '旧记录 10 hello', '旧记录 9 hello']
+
+    # 只执行几批就关闭，模拟回填中途退出
+    for _ in range(3):
+        assert storage.run_backfill_batch()
+    storage.close()
+
+    storage = ClipboardStorage(path, {'backfill_batch_size': 3})
+    try:
+        conn = storage._get_connection()
+        assert conn.execute('SELECT COUNT(*) FROM schema_backfills').fetchone()[0] > 0
+        while storage.run_backfill_batch():
+            pass
+
+        assert conn.execute('SELECT COUNT(*) FROM schema_backfills').fetchone()[0] == 0
+        assert not storage.legacy_timestamps
+        assert conn.execute(
+            "SELECT COUNT(*) FROM clipboard_history WHERE typeof(timestamp) != 'integer' OR digest IS NULL"
+        ).fetchone()[0] == 0
+
+        first = storage.get_clipboard_history(100)[-1]
+        assert first.content == '旧记录 0 hello'
+        assert first.timestamp == 1704096000000  # 2024-01-01 08:00:00 UTC
+        assert storage.get_entry_count() == 12
+        assert len(storage.search_clipboard_history('hello', 50)) == 12
+    finally:
+        storage.close()
+
+
+@pytest.mark.parametrize('export_format', ['json', 'ndjson', 'csv'])
+def test_export_import_round_trip(tmp_path, export_format):
+    """导出后导入到新库，内容、类型、时间戳、收藏和元数据保持一致，重复导入不新增记录"""
+    source = open_storage(tmp_path, 'source.db')
+    target = open_storage(tmp_path, 'target.db')
+    try:
+        source.add_clipboard_entry('第一条\n多行内容', 'text', {'app': 'editor'})
+        source.add_clipboard_entry('print("hello")', 'code', {'lang': 'python'})
+        source.add_clipboard_entry('逗号, "引号" 和 换行\r\n都要保留')
+        favorite = source.get_clipboard_history(1)[0]
+        source.toggle_favorite(favorite.id)
+
+        export_file = str(tmp_path / f'export.{export_format}')
+        assert source.export_data(export_file, export_format)
+
+        result = target.import_data(export_file)
+        assert result['imported'] == 3 and result['skipped'] == 0
+        assert target.import_data(export_file)['duplicates'] == 3
+
+        def snapshot(storage):
+            return sorted(
+                (entry.content, entry.content_type, entry.timestamp, entry.is_favorite, entry.metadata)
+                for entry in storage.get_clipboard_history(10)
+            )
+        assert snapshot(target) == snapshot(source)
+    finally:
+        source.close()
+        target.close()
+
+
+def test_json_import_stops_at_malformed_record():
+    """文件中间的损坏记录立即报错并给出位置，不会把文件剩余部分全部读入缓冲区"""
+    import io
+
+    from clipboard_import import ClipboardImporter
+
+    text = '[{"content": "ok"}, {"content": "bad" "x": 1}, ' + '{"content": "tail"}, ' * 100000 + ']'
+    source = io.StringIO(text)
+    importer = ClipboardImporter(None)
+    importer.READ_CHUNK_SIZE = 16
+
+    with pytest.raises(ValueError, match='第 2 条记录（字符偏移 20）'):
+        list(importer._read_json(source))
+    assert source.tell() < 1000
+
+
+def test_import_naive_timestamps_as_local_time(tmp_path, storage):
+    """不带时区的 ISO 时间按本地时间导入，旧版本的 UTC 文本按 UTC 导入"""
+    from datetime import datetime, timezone
+
+    import_file = tmp_path / 'naive.json'
+    import_file.write_text(json.dumps([
+        {'content': 'local', 'timestamp': '2024-05-01T12:00:00'},
+        {'content': 'legacy', 'timestamp': '2024-05-01 12:00:00'},
+    ]), encoding='utf-8')
+    storage.import_data(str(import_file))
+
+    timestamps = {entry.content: entry.timestamp for entry in storage.get_clipboard_history(10)}
+    assert timestamps['local'] == round(datetime(2024, 5, 1, 12).timestamp() * 1000)
+    assert timestamps['legacy'] == round(datetime(2024, 5, 1, 12, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def test_near_duplicate_link_and_merge(tmp_path):
+    """link 将只有空白差异的记录折叠为一组，merge 用新记录替换旧记录，keep 各自保留"""
+    linked = open_storage(tmp_path, 'link.db', near_duplicate_policy='link')
+    merged = open_storage(tmp_path, 'merge.db', near_duplicate_policy='merge')
+    kept = open_storage(tmp_path, 'keep.db')
+    try:
+        for storage in (linked, merged, kept):
+            storage.add_clipboard_entry('def main():\n    return 1')
+            storage.add_clipboard_entry('def main():\n\treturn 1')
+
+        history = linked.get_clipboard_history(10)
+        assert len(history) == 1
+        assert history[0].content == 'def main():\n\treturn 1'
+        assert history[0].near_duplicates == 1
+        assert contents(linked.get_near_duplicates(history[0].id)) == [
+            'def main():\n\treturn 1', 'def main():\n    return 1'
+        ]
+
+        assert contents(merged.get_clipboard_history(10)) == ['def main():\n\treturn 1']
+        assert merged.get_entry_count() == 1
+
+        assert kept.near_duplicate_policy == 'keep'
+        assert len(kept.get_clipboard_history(10)) == 2
+    finally:
+        for storage in (linked, merged, kept):
+            storage.close()
+
+
+@pytest.mark.parametrize('policy', ['link', 'merge'])
+def test_exact_duplicate_without_fingerprint(tmp_path, policy):
+    """再次复制尚未回填归一化摘要和指纹的记录时只更新该记录，不牵连其他记录"""
+    storage = open_storage(tmp_path)
+    try:
+        storage.add_clipboard_entry('foo bar baz qux')
+        storage.add_clipboard_entry('foo  bar baz qux')
+        storage.add_clipboard_entry('last inserted row zzz')
+        favorite = storage.get_clipboard_history(3)[-1]
+        storage.toggle_favorite(favorite.id)
+        conn = storage._get_connection()
+        conn.execute("UPDATE clipboard_history SET norm_digest = NULL, simhash = NULL "
+                     "WHERE content = 'foo  bar baz qux'")
+        conn.commit()
+
+        storage.near_duplicate_policy = policy
+        storage.add_clipboard_entry('foo  bar baz qux')
+
+        history = storage.get_clipboard_history(10)
+        assert contents(history) == ['foo  bar baz qux', 'last inserted row zzz', 'foo bar baz qux']
+        assert [entry.near_duplicates for entry in history] == [0, 0, 0]
+        assert [entry.is_favorite for entry in history] == [False, False, True]
+    finally:
+        storage.close()
+
+
+def test_near_duplicate_window(tmp_path):
+    """超出 near_duplicate_window 的旧记录不参与近似重复合并"""
+    storage = open_storage(tmp_path, near_duplicate_policy='link', near_duplicate_window=2)
+    try:
+        storage.add_clipboard_entry('alpha  beta gamma')
+        for index in range(3):
+            storage.add_clipboard_entry(f'unrelated filler {index} {index * 31}')
+        storage.add_clipboard_entry('alpha beta gamma')
+        assert all(entry.near_duplicates == 0 for entry in storage.get_clipboard_history(10))
+    finally:
+        storage.close()
+
+
+def test_eviction_keeps_favorites_and_newest(tmp_path):
+    """超出 max_entries 时淘汰最旧的非收藏记录，收藏不计入上限"""
+    storage = open_storage(tmp_path, max_entries=3, eviction_batch_size=2)
+    try:
+        storage.add_clipboard_entry('favorite')
+        storage.toggle_favorite(storage.get_clipboard_history(1)[0].id)
+        for index in range(6):
+            storage.add_clipboard_entry(f'entry {index}')
+        storage.evict_overflow()
+
+        assert contents(storage.get_clipboard_history(10)) == ['entry 5', 'entry 4', 'entry 3', 'favorite']
+    finally:
+        storage.close()
+
+
+def test_eviction_after_import(tmp_path):
+    """导入完成后按上限淘汰，淘汰的是时间最早的记录"""
+    storage = open_storage(tmp_path, max_entries=2)
+    try:
+        storage.add_clipboard_entry('existing')
+        import_file = tmp_path / 'import.ndjson'
+        import_file.write_text('\n'.join(
+            json.dumps({'content': f'imported {index}', 'timestamp': 1700000000000 + index})
+            for index in range(5)
+        ), encoding='utf-8')
+
+        result = storage.import_data(str(import_file))
+        assert result['imported'] == 5 and result['evicted'] == 4
+        assert contents(storage.get_clipboard_history(10)) == ['existing', 'imported 4']
+    finally:
+        storage.close()
+
+
+def test_eviction_counts_archived_entries(tmp_path):
+    """max_entries 包含归档分区中的记录，先淘汰最早的归档分区"""
+    storage = open_storage(tmp_path, partition_by_month=True, max_entries=0)
+    try:
+        for index in range(4):
+            storage.add_clipboard_entry(f'archived {index}')
+        conn = storage._get_connection()
+        conn.execute('UPDATE clipboard_history SET timestamp = ? - (10 - id) * 1000',
+                     (now_ms() - 90 * 86400000,))
+        conn.commit()
+        assert storage.rollover_partitions() == 4
+
+        storage.add_clipboard_entry('current')
+        storage.max_entries = 3
+        assert storage.evict_overflow() == 2
+        assert storage.get_entry_count() == 3
+        assert contents(storage.get_clipboard_history(10)) == ['current', 'archived 3', 'archived 2']
+    finally:
+        storage.close()
+
+
+def test_backup_and_restore(tmp_path):
+    """备份后修改数据，从备份恢复回到备份时的状态，外部存储的大内容一并恢复"""
+    storage = open_storage(tmp_path, blob_threshold=1024)
+    try:
+        large = 'x' * 5000
+        storage.add_clipboard_entry('kept')
+        storage.add_clipboard_entry(large)
+
+        backup = ClipboardBackup(storage, str(tmp_path / 'backups'), keep=2)
+        manifest = backup.create()
+        assert manifest is not None
+        assert backup.verify(manifest['path']) == []
+
+        storage.add_clipboard_entry('added after backup')
+        for entry in storage.get_clipboard_history(10):
+            if entry.content in ('kept', large):
+                storage.delete_clipboard_entry(entry.id)
+
+        assert backup.restore(manifest['name'])
+        assert sorted(contents(storage.get_clipboard_history(10))) == sorted(['kept', large])
+
+        # 恢复后仍可继续写入
+        assert storage.add_clipboard_entry('after restore')
+        assert storage.get_entry_count() == 3
+    finally:
+        storage.close()
+
+
+def test_closed_writer_forwards_to_successor(storage):
+    """关闭时指定接替者后，旧写入线程队列中剩余的和之后提交的记录都转交给接替者"""
+    old = ClipboardWriter(storage)
+    successor = ClipboardWriter(storage)
+    assert old.submit('queued before close', 'text', {})
+
+    old.close(successor=successor)
+    assert old.submit('submitted after close', 'text', {})
+    assert storage.get_entry_count() == 0
+
+    successor.start()
+    assert successor.flush(5)
+    successor.close()
+    assert sorted(contents(storage.get_clipboard_history(10))) == ['queued before close', 'submitted after close']
+
+
+def test_backup_names_are_unique_and_rotated(tmp_path, storage):
+    """同一秒内的多次备份各自成代，超出保留代数的旧备份被删除"""
+    storage.add_clipboard_entry('data')
+    backup = ClipboardBackup(storage, str(tmp_path / 'backups'), keep=2)
+    names = [backup.create()['name'] for _ in range(3)]
+    assert len(set(names)) == 3
+    assert [manifest['name'] for manifest in backup.list_backups()] == names[:0:-1]
+
+
+def test_fuzzy_search_edge_cases(storage):
+    """容错搜索：拼写错误可命中，过短的查询退回普通搜索，空查询返回最新记录"""
+    storage.add_clipboard_entry('the quick brown fox jumps over the lazy dog')
+    storage.add_clipboard_entry('configuration_manager.load_settings()')
+    storage.add_clipboard_entry('完全无关的内容')
+
+    assert contents(storage.fuzzy_search_clipboard_history('quikc brown', 10)) == [
+        'the quick brown fox jumps over the lazy dog'
+    ]
+    assert contents(storage.fuzzy_search_clipboard_history('configuraton', 10)) == [
+        'configuration_manager.load_settings()'
+    ]
+    assert storage.fuzzy_search_clipboard_history('zzzzzzzzzz', 10) == []
+    assert contents(storage.fuzzy_search_clipboard_history('fox', 10)) == [
+        'the quick brown fox jumps over the lazy dog'
+    ]
+    assert len(storage.fuzzy_search_clipboard_history('   ', 10)) == 3
+
+    # 查询中的 % 和 _ 按字面匹配，不作为通配符
+    storage.add_clipboard_entry('progress 100% done')
+    assert contents(storage.fuzzy_search_clipboard_history('100% done', 10)) == ['progress 100% done']
+
+
+def test_regex_search_edge_cases(tmp_path):
+    """正则搜索：无效表达式返回空结果，超出索引长度的记录仍能匹配，时间预算为 0 时不缓存结果"""
+    storage = open_storage(tmp_path, fuzzy_index_chars=32)
+    try:
+        storage.add_clipboard_entry('error code 404 not found')
+        storage.add_clipboard_entry('error code 500 server')
+        storage.add_clipboard_entry('padding ' * 20 + 'needle_token at the end')
+
+        assert contents(storage.regex_search_clipboard_history(r'code \d{3} not', 10)) == ['error code 404 not found']
+        assert len(storage.regex_search_clipboard_history(r'error code \d+', 10)) == 2
+        assert storage.regex_search_clipboard_history('(unclosed', 10) == []
+        assert len(storage.regex_search_clipboard_history('', 10)) == 3
+
+        # 字面量片段位于索引范围之外，三元组预筛不能排除该记录
+        assert len(storage.regex_search_clipboard_history(r'needle_\w+ at', 10)) == 1
+
+        # 没有可提取片段的表达式逐条确认
+        assert len(storage.regex_search_clipboard_history(r'^\w', 10)) == 3
+
+        storage.regex_search_clipboard_history(r'\d', 10, time_budget_ms=0)
+        assert ('regex', r'\d', 10) not in storage.query_cache._entries
+    finally:
+        storage.close()
+
+
+def test_search_deduplicates_across_partitions(tmp_path):
+    """归档后再次复制的内容在两个分区各有一条，搜索只返回最新的一条"""
+    storage = open_storage(tmp_path, partition_by_month=True)
+    try:
+        storage.add_clipboard_entry('repeated content')
+        conn = storage._get_connection()
+        conn.execute('UPDATE clipboard_history SET timestamp = ?', (now_ms() - 90 * 86400000,))
+        conn.commit()
+        assert storage.rollover_partitions() == 1
+
+        storage.add_clipboard_entry('repeated content')
+        assert len(storage.get_clipboard_history(10)) == 2
+        for search in (storage.search_clipboard_history, storage.fuzzy_search_clipboard_history,
+                       storage.regex_search_clipboard_history):
+            results = search('repeated', 10)
+            assert len(results) == 1
+            assert results[0].timestamp > now_ms() - 60000
+    finally:
+        storage.close()
+
+
+def test_clip_entry_copy_has_independent_metadata(storage):
+    """修改副本的元数据不影响原记录"""
+    storage.add_clipboard_entry('with metadata', 'text', {'nested': {'value': 1}})
+    entry = storage.get_clipboard_history(1)[0]
+    assert entry.metadata == {'nested': {'value': 1}}
+
+    duplicate = entry.copy()
+    duplicate.metadata['nested']['value'] = 2
+    assert entry.metadata == {'nested': {'value': 1}}